@@ -1,23 +1,221 @@
+import gzip
 import os
+import re
 import shutil
-from datetime import datetime
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
 from django.conf import settings
 
-def backup_sqlite_db(reason="manual"):
-    db_path = settings.DATABASES["default"]["NAME"]
+# Páginas copiadas por paso del backup online: entre pasos se suelta el
+# lock de lectura para que los escritores no queden bloqueados.
+DEFAULT_PAGES_PER_STEP = 1024
+DEFAULT_STEP_SLEEP = 0.01
+
+# Política de retención por defecto (nº de huecos que se conservan)
+DEFAULT_RETENTION = {"hourly": 24, "daily": 7, "weekly": 4}
+
+# <bd>.<AAAAMMDD_HHMMSS>[-n].<motivo>.bak[.gz]; -n distingue backups del
+# mismo motivo creados en el mismo segundo
+BACKUP_RE = re.compile(
+    r"^(?P<db>.+)\.(?P<ts>\d{8}_\d{6})(?:-(?P<seq>\d+))?\.(?P<reason>[\w-]+)\.bak(?P<gz>\.gz)?$"
+)
+
 
+class BackupError(RuntimeError):
+    pass
+
+
+def _db_path():
+    db_path = settings.DATABASES["default"]["NAME"]
     if not db_path or not os.path.exists(db_path):
-        raise RuntimeError("No se ha encontrado la base de datos SQLite.")
+        raise BackupError("No se ha encontrado la base de datos SQLite.")
+    return str(db_path)
+
+
+def integrity_check(path):
+    """
+    Ejecuta PRAGMA integrity_check sobre un fichero SQLite (.bak o .bak.gz).
+    Devuelve True si SQLite responde 'ok'.
+    """
+    tmp = None
+    if str(path).endswith(".gz"):
+        fd, tmp = tempfile.mkstemp(suffix=".sqlite3")
+        with os.fdopen(fd, "wb") as out, gzip.open(path, "rb") as src:
+            shutil.copyfileobj(src, out)
+        path = tmp
+
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("PRAGMA integrity_check").fetchall()
+        finally:
+            conn.close()
+        return rows == [("ok",)]
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        if tmp:
+            os.remove(tmp)
+
+
+def _reserve_backup_path(backups_dir, db_name, timestamp, reason):
+    """
+    (backup_path, partial_path) con un nombre libre. El .part se crea con
+    O_EXCL: dos backups simultáneos nunca comparten fichero temporal ni
+    uno reemplaza al otro al renombrar.
+    """
+    seq = 1
+    while True:
+        stamp = timestamp if seq == 1 else f"{timestamp}-{seq}"
+        backup_path = os.path.join(backups_dir, f"{db_name}.{stamp}.{reason}.bak")
+        partial_path = backup_path + ".part"
+        seq += 1
+        if os.path.exists(backup_path) or os.path.exists(backup_path + ".gz"):
+            continue
+        try:
+            os.close(os.open(partial_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return backup_path, partial_path
+
+
+def backup_sqlite_db(
+    reason="manual",
+    backup_dir=None,
+    compress=False,
+    verify=True,
+    pages=DEFAULT_PAGES_PER_STEP,
+    sleep=DEFAULT_STEP_SLEEP,
+    progress=None,
+):
+    """
+    Copia online de la BD con la API de backup de SQLite
+    (sqlite3.Connection.backup), consistente aunque haya escrituras.
 
-    backups_dir = os.path.join(os.path.dirname(db_path), "backups")
+    - backup_dir: carpeta destino (por defecto <carpeta de la BD>/backups).
+    - compress: guarda el resultado como .bak.gz.
+    - verify: comprueba PRAGMA integrity_check antes de darlo por bueno.
+    - progress(remaining, total): se llama tras cada paso de `pages` páginas.
+
+    Devuelve la ruta del backup creado.
+    """
+    db_path = _db_path()
+
+    backups_dir = str(backup_dir or os.path.join(os.path.dirname(db_path), "backups"))
     os.makedirs(backups_dir, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     db_name = os.path.basename(db_path)
 
-    backup_name = f"{db_name}.{timestamp}.{reason}.bak"
-    backup_path = os.path.join(backups_dir, backup_name)
+    backup_path, partial_path = _reserve_backup_path(backups_dir, db_name, timestamp, reason)
+    backup_name = os.path.basename(backup_path)
+
+    def _step(status, remaining, total):
+        if progress:
+            progress(remaining, total)
+
+    try:
+        src = sqlite3.connect(db_path)
+        try:
+            dst = sqlite3.connect(partial_path)
+            try:
+                src.backup(dst, pages=pages, progress=_step, sleep=sleep)
+                # La copia hereda journal_mode=WAL; como fichero suelto es mejor DELETE
+                dst.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                dst.close()
+        finally:
+            src.close()
 
-    shutil.copy2(db_path, backup_path)
+        if verify and not integrity_check(partial_path):
+            raise BackupError(f"El backup no ha pasado integrity_check: {backup_name}")
+    except BaseException:
+        # Copia fallida o interrumpida: no dejar el .part a medias en la carpeta
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
 
+    if compress:
+        # También con nombre temporal: un .bak.gz a medias (disco lleno,
+        # proceso interrumpido) no debe parecer un backup bueno
+        gz_path = backup_path + ".gz"
+        gz_partial = gz_path + ".part"
+        try:
+            with open(partial_path, "rb") as raw, gzip.open(gz_partial, "wb") as gz:
+                shutil.copyfileobj(raw, gz)
+            os.replace(gz_partial, gz_path)
+        except BaseException:
+            if os.path.exists(gz_partial):
+                os.remove(gz_partial)
+            raise
+        finally:
+            os.remove(partial_path)
+        return gz_path
+
+    os.replace(partial_path, backup_path)
     return backup_path
+
+
+def list_backups(backup_dir, db_name=None):
+    """
+    [(datetime, reason, ruta)] de los backups de la carpeta, del más
+    reciente al más antiguo.
+    """
+    found = []
+    if not os.path.isdir(backup_dir):
+        return found
+    for fname in os.listdir(backup_dir):
+        m = BACKUP_RE.match(fname)
+        if not m or (db_name and m.group("db") != db_name):
+            continue
+        ts = datetime.strptime(m.group("ts"), "%Y%m%d_%H%M%S")
+        found.append((ts, int(m.group("seq") or 1), m.group("reason"), os.path.join(backup_dir, fname)))
+    # En el mismo segundo, el de mayor -n es el más reciente
+    found.sort(reverse=True)
+    return [(ts, reason, path) for ts, _, reason, path in found]
+
+
+def rotate_backups(backup_dir, hourly=24, daily=7, weekly=4, now=None, dry_run=False):
+    """
+    Retención tipo abuelo-padre-hijo: conserva el backup más reciente de
+    cada una de las últimas `hourly` horas, `daily` días y `weekly` semanas
+    ISO, y el último de cada motivo (p. ej. pre_migrate). Borra el resto.
+
+    Devuelve la lista de rutas eliminadas.
+    """
+    now = now or datetime.now()
+    backups = list_backups(backup_dir)
+
+    windows = (
+        (hourly, timedelta(hours=hourly), lambda ts: ts.strftime("%Y%m%d%H")),
+        (daily, timedelta(days=daily), lambda ts: ts.strftime("%Y%m%d")),
+        (weekly, timedelta(weeks=weekly), lambda ts: "%d-%02d" % ts.isocalendar()[:2]),
+    )
+
+    keep = set()
+    seen_reasons = set()
+    for ts, reason, path in backups:
+        if reason not in seen_reasons:
+            seen_reasons.add(reason)
+            keep.add(path)
+
+    for count, span, bucket_of in windows:
+        if count <= 0:
+            continue
+        buckets = set()
+        for ts, _, path in backups:
+            if now - ts > span:
+                continue
+            bucket = bucket_of(ts)
+            if bucket not in buckets:
+                buckets.add(bucket)
+                keep.add(path)
+
+    removed = []
+    for _, _, path in backups:
+        if path not in keep:
+            if not dry_run:
+                os.remove(path)
+            removed.append(path)
+    return removed
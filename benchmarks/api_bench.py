@@ -0,0 +1,420 @@
+"""
+Benchmark de los endpoints de escaneo, búsqueda, auditoría y árbol.
+
+Lanza las peticiones en proceso con el cliente de pruebas de Django
+(middleware, DRF y ORM completos, sin red) contra la BD de benchmarks
+que deja `benchmarks.datagen`. Por escenario mide latencia p50/p95/p99,
+consultas SQL por petición y peticiones por segundo.
+
+Escenarios: in, out (FIFO), open_consume (abrir + consumir unidad
+abierta), aud (subárbol), audtotal, search, tree.
+
+Los resultados se pueden guardar como JSON (--output) y comparar con una
+línea base (--baseline): con --max-regression 20 falla (exit 1) si el
+p95 de algún escenario empeora más de un 20 % o si hace más consultas.
+benchmarks/baseline.json es la referencia del repositorio (escala small,
+en serie): las latencias solo son comparables en la misma máquina, las
+consultas por petición en cualquiera.
+
+Uso:
+    python -m benchmarks.datagen --scale small
+    python -m benchmarks.api_bench --output bench.json
+    python -m benchmarks.api_bench --baseline bench.json --max-regression 20
+    python -m benchmarks.api_bench --scenarios out,search --concurrency 4 -n 500
+    python -m benchmarks.api_bench --connection-lifecycle   # cierra/reutiliza la conexión por petición
+    CACHE_BACKEND=dummy python -m benchmarks.api_bench       # sin la caché de lecturas
+"""
+import argparse
+import itertools
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks import datagen
+
+SCENARIOS = ("in", "out", "open_consume", "aud", "audtotal", "search", "tree")
+# AUDTOTAL recorre todo el inventario: pocas iteraciones por defecto
+MAX_ITERATIONS = {"audtotal": 5}
+DEFAULT_ITERATIONS = 200
+DEFAULT_WARMUP = 10
+SAMPLE_SIZE = 500
+QUERY_TOLERANCE = 0.5
+
+
+# =========================
+#  Contador de consultas
+# =========================
+
+class QueryCounter:
+    """
+    Cuenta las consultas de todas las conexiones (también las del hilo
+    escritor, que no es el de la petición).
+    """
+
+    def __init__(self):
+        self._count = itertools.count()
+        self.value = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.value = next(self._count) + 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        def _on_created(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        self._receiver = _on_created
+        connection_created.connect(_on_created, weak=False)
+        for conn in connections.all(initialized_only=True):
+            _on_created(None, conn)
+        return self
+
+
+# =========================
+#  Datos de los escenarios
+# =========================
+
+class Fixtures:
+    """Muestra fija (por semilla) de productos, ubicaciones y términos de búsqueda."""
+
+    def __init__(self, user, seed):
+        from inventory.models import Location, Product
+
+        self.user = user
+        tenant_id = user.organization.id
+        rng = random.Random(seed)
+
+        products = list(
+            Product.objects.filter(tenant_id=tenant_id)
+            .order_by("id")
+            .values_list("id", "name", "location__public_id")[: SAMPLE_SIZE * 4]
+        )
+        if not products:
+            raise SystemExit(
+                f"{user.username} no tiene productos: ejecuta antes `python -m benchmarks.datagen`."
+            )
+        rng.shuffle(products)
+        self.products = products[:SAMPLE_SIZE]
+        # Productos propios de open_consume (una unidad abierta a la vez)
+        self.open_products = products[SAMPLE_SIZE:] or products
+
+        # Ubicaciones internas (con hijos) para auditar subárboles
+        inner = list(
+            Location.objects.filter(tenant_id=tenant_id, children__isnull=False)
+            .distinct()
+            .values_list("public_id", flat=True)
+        )
+        self.subtrees = inner or list(
+            Location.objects.filter(tenant_id=tenant_id).values_list("public_id", flat=True)
+        )
+
+        # Prefijos de nombres reales: "Producto 0012"
+        self.search_terms = sorted({name[:13] for _, name, _ in self.products})
+
+
+def prepare(scenario, fx):
+    """Deja los datos en un estado conocido antes del escenario."""
+    if scenario == "open_consume":
+        from inventory.models import Batch
+
+        # Una ejecución interrumpida puede dejar unidades abiertas
+        # (la siguiente apertura fallaría con already_open)
+        Batch.objects.filter(
+            product_id__in=[pid for pid, _, _ in fx.open_products], opened_units__gt=0
+        ).update(opened_units=0, opened_at=None, open_expires_at=None)
+
+
+def _scan_request(data):
+    return ("post", "/api/scan/", data)
+
+
+def build_requests(scenario, fx, n, rng):
+    """Lista de (método, ruta, datos) para `n` iteraciones."""
+    if scenario == "in":
+        return [
+            _scan_request({
+                "type": "IN",
+                "payload": f"PRD:{pid}",
+                "quantity": 1,
+                "unit": "ud",
+                "location": str(loc),
+            })
+            for pid, _, loc in (rng.choice(fx.products) for _ in range(n))
+        ]
+    if scenario == "out":
+        return [
+            _scan_request({"type": "OUT", "payload": f"PRD:{pid}", "quantity": 1, "location": str(loc)})
+            for pid, _, loc in (rng.choice(fx.products) for _ in range(n))
+        ]
+    if scenario == "open_consume":
+        # Pares abrir → consumir sobre el mismo producto
+        reqs = []
+        for i in range((n + 1) // 2):
+            pid, _, loc = fx.open_products[i % len(fx.open_products)]
+            base = {"type": "OUT", "payload": f"PRD:{pid}", "quantity": 1, "location": str(loc)}
+            reqs.append(_scan_request(dict(base, mark_open=True, open_days=3)))
+            reqs.append(_scan_request(base))
+        return reqs[:n]
+    if scenario == "aud":
+        return [
+            _scan_request({"type": "AUD", "location": str(rng.choice(fx.subtrees))})
+            for _ in range(n)
+        ]
+    if scenario == "audtotal":
+        return [_scan_request({"type": "AUDTOTAL"}) for _ in range(n)]
+    if scenario == "search":
+        return [
+            ("get", "/api/products/search/", {"q": rng.choice(fx.search_terms)})
+            for _ in range(n)
+        ]
+    if scenario == "tree":
+        return [("get", "/api/locations/tree/", None) for _ in range(n)]
+    raise ValueError(scenario)
+
+
+# =========================
+#  Ejecución
+# =========================
+
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano."""
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def _send(client, method, path, data):
+    if method == "get":
+        return client.get(path, data or {})
+    return client.post(path, data, content_type="application/json")
+
+
+def run_scenario(scenario, fx, iterations, warmup, concurrency, seed, counter, lifecycle=False):
+    from django.db import close_old_connections, connection
+    from django.test import Client
+
+    rng = random.Random(f"{seed}:{scenario}")
+    prepare(scenario, fx)
+    requests = build_requests(scenario, fx, warmup + iterations, rng)
+    warm, measured = requests[:warmup], requests[warmup:]
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = Client()
+            local.client.force_login(fx.user)
+        return local.client
+
+    def one(req):
+        q0 = counter.value
+        t0 = time.perf_counter()
+        if lifecycle:
+            # Como un servidor WSGI (request_started): el cliente de pruebas no lo hace
+            close_old_connections()
+        response = _send(client(), *req)
+        if lifecycle:
+            # request_finished: cierra o devuelve al pool según CONN_MAX_AGE / pool
+            close_old_connections()
+        elapsed = (time.perf_counter() - t0) * 1000
+        return elapsed, counter.value - q0, response.status_code
+
+    for req in warm:
+        one(req)
+
+    q_start = counter.value
+    t_start = time.perf_counter()
+    if concurrency <= 1:
+        results = [one(req) for req in measured]
+    else:
+        def worker(chunk):
+            try:
+                return [one(req) for req in chunk]
+            finally:
+                connection.close()
+
+        # Bloques contiguos de tamaño par: cada pareja abrir → consumir
+        # queda en el mismo hilo
+        size = math.ceil(len(measured) / concurrency / 2) * 2
+        chunks = [measured[i:i + size] for i in range(0, len(measured), size)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = [r for part in pool.map(worker, chunks) for r in part]
+    wall = time.perf_counter() - t_start
+    total_queries = counter.value - q_start
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if r[2] >= 400)
+    stats = {
+        "n": len(results),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "rps": round(len(results) / wall, 1) if wall else None,
+        "queries_per_request": round(total_queries / len(results), 2),
+    }
+    if concurrency <= 1:
+        # En serie el recuento por petición es exacto
+        stats["queries_max"] = max(r[1] for r in results)
+    return stats
+
+
+def environment(concurrency):
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    from inventory.models import Batch, Location, Product
+
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "concurrency": concurrency,
+        "data": {
+            "products": Product.objects.count(),
+            "batches": Batch.objects.count(),
+            "locations": Location.objects.count(),
+        },
+    }
+
+
+# =========================
+#  Línea base
+# =========================
+
+def compare(current, baseline, max_regression):
+    """Devuelve las líneas del informe y si hay regresión."""
+    lines, regressed = [], False
+    base_concurrency = baseline.get("meta", {}).get("concurrency")
+    if base_concurrency != current["meta"]["concurrency"]:
+        lines.append(
+            f"  (aviso: la línea base se midió con concurrencia {base_concurrency}, "
+            f"esta con {current['meta']['concurrency']})"
+        )
+    for name, cur in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            lines.append(f"  {name:<13} (sin línea base)")
+            continue
+        delta = (cur["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        # Con concurrencia la media varía un poco (reintentos, cachés)
+        more_queries = cur["queries_per_request"] > base["queries_per_request"] + QUERY_TOLERANCE
+        flag = ""
+        if max_regression is not None and (delta > max_regression or more_queries):
+            flag = "  ← REGRESIÓN"
+            regressed = True
+        lines.append(
+            f"  {name:<13} p95 {base['p95_ms']:.1f} → {cur['p95_ms']:.1f} ms ({delta:+.1f} %), "
+            f"consultas {base['queries_per_request']} → {cur['queries_per_request']}{flag}"
+        )
+    return lines, regressed
+
+
+def print_table(results):
+    header = f"{'escenario':<13} {'n':>5} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'SQL/req':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, s in results.items():
+        print(
+            f"{name:<13} {s['n']:>5} {s['errors']:>4} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+            f"{s['p99_ms']:>8.2f} {s['rps'] or 0:>8.1f} {s['queries_per_request']:>8}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tenant", type=int, default=0, help="Índice del tenant bench-N.")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument(
+        "--connection-lifecycle",
+        action="store_true",
+        help="Cierra/recicla la conexión en cada petición como un servidor WSGI "
+        "(necesario para medir CONN_MAX_AGE y el pool, ver benchmarks/pg_pooling.py).",
+    )
+    parser.add_argument("--output", help="Guarda los resultados en este JSON.")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para comparar.")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=None,
+        help="Con --baseline: falla si el p95 empeora más de este %% o sube el nº de consultas.",
+    )
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    datagen.setup(args.database_url)
+    users = datagen.bench_users()
+    if len(users) <= args.tenant:
+        raise SystemExit("No hay datos de benchmark: ejecuta antes `python -m benchmarks.datagen`.")
+
+    fx = Fixtures(users[args.tenant], args.seed)
+    counter = QueryCounter().install()
+
+    results = {}
+    for scenario in scenarios:
+        iterations = min(args.iterations, MAX_ITERATIONS.get(scenario, args.iterations))
+        warmup = min(args.warmup, iterations)
+        results[scenario] = run_scenario(
+            scenario, fx, iterations, warmup, args.concurrency, args.seed, counter,
+            lifecycle=args.connection_lifecycle,
+        )
+
+    report = {"meta": environment(args.concurrency), "scenarios": results}
+    data = report["meta"]["data"]
+    print(
+        f"BD {report['meta']['database']}: {data['products']} productos, {data['batches']} lotes, "
+        f"{data['locations']} ubicaciones · concurrencia {args.concurrency}\n"
+    )
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(report, baseline, args.max_regression)
+        print(f"\nComparación con {args.baseline} ({baseline.get('meta', {}).get('commit')}):")
+        print("\n".join(lines))
+        if regressed:
+            print("FALLO: regresión respecto a la línea base")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
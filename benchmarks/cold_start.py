@@ -0,0 +1,112 @@
+"""
+Presupuesto de arranque en frío.
+
+Lanza N intérpretes nuevos que hacen django.setup() y cargan las URLs
+(lo que paga el primer arranque del lanzador y su primera petición) con
+el perfil de producción (DEBUG desactivado). Falla si:
+
+- la mediana supera el presupuesto (--budget-ms), o
+- se ha importado alguna dependencia pesada que debe cargarse solo al
+  usarla (numpy, scipy, sklearn, ... ver HEAVY_MODULES).
+
+Uso:
+    python -m benchmarks.cold_start --runs 5 --budget-ms 1200
+    python -m benchmarks.cold_start --profile     # top de imports
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    "numpy",
+    "scipy",
+    "sklearn",
+    "joblib",
+    "pandas",
+    "pyarrow",
+    "openpyxl",
+    "PIL",
+    "qrcode",
+    "django_extensions",
+)
+
+DEFAULT_BUDGET_MS = int(os.getenv("SMARTINV_COLD_START_BUDGET_MS", "1200"))
+
+CHILD = """
+import json, os, sys, time
+t0 = time.perf_counter()
+profiler = None
+if {profile!r}:
+    from smart_inventory.importprofile import ImportProfiler
+    profiler = ImportProfiler().install()
+import django
+django.setup()
+t1 = time.perf_counter()
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver(settings.ROOT_URLCONF).url_patterns
+t2 = time.perf_counter()
+out = {{
+    "setup_ms": (t1 - t0) * 1000,
+    "urls_ms": (t2 - t1) * 1000,
+    "total_ms": (t2 - t0) * 1000,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}
+if profiler:
+    out["report"] = profiler.uninstall().report(top=25)
+print(json.dumps(out))
+"""
+
+
+def run_once(profile=False):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "smart_inventory.settings")
+    env["DEBUG"] = "false"
+    code = CHILD.format(profile=profile, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--profile", action="store_true", help="Muestra el top de imports.")
+    args = parser.parse_args(argv)
+
+    results = [run_once() for _ in range(args.runs)]
+    total = statistics.median(r["total_ms"] for r in results)
+    setup = statistics.median(r["setup_ms"] for r in results)
+    urls = statistics.median(r["urls_ms"] for r in results)
+    heavy = sorted({m for r in results for m in r["heavy"]})
+
+    print(
+        f"Arranque en frío (mediana de {args.runs}): {total:.0f} ms "
+        f"(django.setup {setup:.0f} ms, urls {urls:.0f} ms) / presupuesto {args.budget_ms:.0f} ms"
+    )
+
+    if args.profile:
+        print()
+        print(run_once(profile=True)["report"])
+
+    failed = False
+    if heavy:
+        print(f"FALLO: dependencias pesadas importadas al arrancar: {', '.join(heavy)}")
+        failed = True
+    if total > args.budget_ms:
+        print(f"FALLO: el arranque supera el presupuesto en {total - args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Generador de datos sintéticos para los benchmarks de la API.
+
+Crea tenants (un usuario "bench-N" con su Organization), un árbol de
+ubicaciones profundo por tenant y productos con varios lotes cada uno.
+Las filas pasan por inventory.importer (la misma ruta que la importación
+masiva), así que cada lote lleva su movimiento IN.
+
+Es determinista: misma escala y semilla → mismos nombres, rutas y
+cantidades. Nunca toca la base de datos de la app: usa
+SMARTINV_BENCH_DATABASE_URL o, si no está, un SQLite en el directorio
+temporal.
+
+Uso:
+    python -m benchmarks.datagen --scale small
+    python -m benchmarks.datagen --scale large --reset       # 100k productos, 1M lotes
+    python -m benchmarks.datagen --database-url postgres://localhost/smartinv_bench
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BENCH_PASSWORD = "bench"
+USER_PREFIX = "bench-"
+
+# tenants, productos por tenant, lotes por producto, profundidad y ramas del árbol
+SCALES = {
+    "tiny": {"tenants": 1, "products": 300, "batches": 2, "depth": 3, "fanout": 3},
+    "small": {"tenants": 1, "products": 2_000, "batches": 3, "depth": 4, "fanout": 4},
+    "medium": {"tenants": 2, "products": 10_000, "batches": 5, "depth": 5, "fanout": 4},
+    "large": {"tenants": 2, "products": 50_000, "batches": 10, "depth": 6, "fanout": 4},
+}
+
+CATEGORIES = (
+    "Alimentación", "Bebidas", "Limpieza", "Higiene", "Ferretería",
+    "Papelería", "Electrónica", "Textil", "Jardín", "Farmacia",
+)
+UNITS = ("ud", "kg", "l", "caja", "paquete")
+BRANDS = ("Acme", "Nórdica", "Solera", "Bravo", "Delta", "Kappa", "", "")
+ROOTS = ("Almacén", "Casa", "Oficina", "Garaje")
+LEVEL_NAMES = ("Zona", "Pasillo", "Estantería", "Balda", "Caja", "Hueco", "Fila", "Nivel")
+
+
+def default_database_url():
+    return os.getenv(
+        "SMARTINV_BENCH_DATABASE_URL",
+        "sqlite:///" + os.path.join(tempfile.gettempdir(), "smartinv_bench.sqlite3"),
+    )
+
+
+def setup(database_url=None, migrate=True):
+    """
+    Configura Django contra la BD de benchmarks (antes de importar modelos)
+    con el perfil de producción (DEBUG desactivado).
+    """
+    os.environ["DATABASE_URL"] = database_url or default_database_url()
+    os.environ["DEBUG"] = "false"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smart_inventory.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+
+    if "testserver" not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+    if migrate:
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0, interactive=False)
+
+
+# =========================
+#  Árbol de ubicaciones
+# =========================
+
+def leaf_paths(depth, fanout, root):
+    """Rutas de las hojas de un árbol completo: fanout**depth hojas."""
+    paths = [[root]]
+    for level in range(depth):
+        label = LEVEL_NAMES[level % len(LEVEL_NAMES)]
+        paths = [p + [f"{label} {i + 1}"] for p in paths for i in range(fanout)]
+    return [" > ".join(p) for p in paths]
+
+
+# =========================
+#  Filas
+# =========================
+
+def iter_rows(tenant_index, scale, seed):
+    """
+    Filas para inventory.importer: una por lote. Las de un mismo producto
+    van seguidas (mismo nombre y ubicación → un producto, varios lotes).
+    """
+    rng = random.Random(f"{seed}:{tenant_index}")
+    root = ROOTS[tenant_index % len(ROOTS)]
+    leaves = leaf_paths(scale["depth"], scale["fanout"], root)
+    today = date.today()
+
+    for p in range(scale["products"]):
+        name = f"Producto {p:06d} {rng.choice(CATEGORIES)}"
+        location = leaves[p % len(leaves)]
+        category = CATEGORIES[p % len(CATEGORIES)]
+        unit = UNITS[p % len(UNITS)]
+        brand = rng.choice(BRANDS)
+        value = f"{rng.uniform(0.5, 80):.2f}"
+        for _ in range(scale["batches"]):
+            expiration = today + timedelta(days=rng.randint(-30, 720))
+            yield {
+                "name": name,
+                "location": location,
+                # Stock de sobra para que las salidas del benchmark no lo agoten
+                "quantity": str(rng.randint(500, 2_000)),
+                "unit": unit,
+                "category": category,
+                "min_stock": str(rng.randint(0, 20)),
+                "expiration_date": expiration.isoformat(),
+                "brand": brand,
+                "estimated_value": value,
+            }
+
+
+# =========================
+#  Tenants
+# =========================
+
+def bench_user(index):
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    username = f"{USER_PREFIX}{index}"
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        # La señal post_save crea su Organization (= tenant)
+        user = User.objects.create_user(username=username, password=BENCH_PASSWORD)
+    return user
+
+
+def bench_users():
+    from django.contrib.auth import get_user_model
+
+    return list(
+        get_user_model()
+        .objects.filter(username__startswith=USER_PREFIX)
+        .select_related("organization")
+        .order_by("username")
+    )
+
+
+def reset_tenant(tenant_id):
+    from inventory.models import (
+        Batch,
+        CatalogTombstone,
+        IdempotencyRecord,
+        Location,
+        Movement,
+        MovementDaily,
+        Product,
+        ProductForecast,
+    )
+    from inventory import valuation
+
+    # DELETE directo, sin señales (tombstones, rollup...) y en orden por
+    # las FK PROTECT (Movement → Location)
+    for model in (
+        Movement, MovementDaily, ProductForecast, Batch, Product, Location,
+        CatalogTombstone, IdempotencyRecord,
+    ):
+        model.objects.filter(tenant_id=tenant_id)._raw_delete(model.objects.db)
+    valuation.invalidate(tenant_id)
+
+
+def generate(scale_name="small", seed=42, reset=False, chunk_size=2_000, out=sys.stdout):
+    from inventory.importer import import_rows
+    from inventory.models import Product
+
+    scale = SCALES[scale_name]
+    summary = []
+    for index in range(scale["tenants"]):
+        user = bench_user(index)
+        tenant_id = user.organization.id
+
+        if reset:
+            reset_tenant(tenant_id)
+        elif Product.objects.filter(tenant_id=tenant_id).exists():
+            out.write(f"[datagen] {user.username}: ya tiene datos (usa --reset para regenerar)\n")
+            continue
+
+        t0 = time.perf_counter()
+
+        def progress(result, username=user.username):
+            if result["rows"] % (chunk_size * 25) == 0:
+                out.write(f"[datagen] {username}: {result['rows']} filas…\n")
+
+        result = import_rows(
+            iter_rows(index, scale, seed),
+            tenant_id,
+            user=user,
+            chunk_size=chunk_size,
+            source="bench",
+            on_progress=progress,
+        )
+        elapsed = time.perf_counter() - t0
+        out.write(
+            f"[datagen] {user.username}: {result['products_created']} productos, "
+            f"{result['batches_created']} lotes, {result['locations_created']} ubicaciones "
+            f"en {elapsed:.1f} s\n"
+        )
+        summary.append(result)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Borra y regenera los tenants de benchmark.")
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args(argv)
+
+    setup(args.database_url)
+    generate(args.scale, seed=args.seed, reset=args.reset)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
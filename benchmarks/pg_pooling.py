@@ -0,0 +1,127 @@
+"""
+Latencia de escaneo en PostgreSQL con y sin reutilización de conexiones.
+
+Ejecuta benchmarks.api_bench (con --connection-lifecycle, como un servidor
+WSGI: la conexión se cierra o se devuelve al pool tras cada petición) una
+vez por perfil, cada uno en su propio proceso:
+
+- sin persistencia: DB_CONN_MAX_AGE=0, una conexión nueva por petición
+- persistentes: DB_CONN_MAX_AGE=600 + CONN_HEALTH_CHECKS
+- pool: POSTGRES_POOL=on (psycopg_pool)
+
+y compara p50/p95 y peticiones por segundo por escenario. Con una
+PostgreSQL local la diferencia es el coste de conexión (TCP, autenticación
+y arranque del backend); con la BD en otra máquina crece con la latencia
+de red.
+
+Uso:
+    python -m benchmarks.datagen --scale small --database-url postgres://u:p@localhost/bench
+    python -m benchmarks.pg_pooling --database-url postgres://u:p@localhost/bench
+    python -m benchmarks.pg_pooling --scenarios in,out --concurrency 8 --output pg.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import datagen
+
+PROFILES = {
+    "sin persistencia": {"DB_CONN_MAX_AGE": "0", "POSTGRES_POOL": "off"},
+    "persistentes": {"DB_CONN_MAX_AGE": "600", "POSTGRES_POOL": "off"},
+    "pool": {"POSTGRES_POOL": "on"},
+}
+DEFAULT_SCENARIOS = "in,out,search"
+
+
+def run_profile(name, env_vars, args):
+    """Lanza api_bench con el perfil y devuelve sus resultados por escenario."""
+    env = dict(os.environ, **env_vars)
+    if args.concurrency > 1:
+        # Una conexión por hilo del benchmark como mínimo
+        env.setdefault("POSTGRES_POOL_MAX_SIZE", str(max(args.concurrency, 4)))
+
+    fd, output = tempfile.mkstemp(prefix="pg_pooling-", suffix=".json")
+    os.close(fd)
+    try:
+        cmd = [
+            sys.executable, "-m", "benchmarks.api_bench",
+            "--database-url", args.database_url,
+            "--scenarios", args.scenarios,
+            "-n", str(args.iterations),
+            "--concurrency", str(args.concurrency),
+            "--connection-lifecycle",
+            "--output", output,
+        ]
+        print(f"[{name}] {' '.join(f'{k}={v}' for k, v in env_vars.items())}", flush=True)
+        completed = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stdout + completed.stderr)
+            raise SystemExit(f"api_bench falló con el perfil «{name}»")
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)["scenarios"]
+    finally:
+        os.remove(output)
+
+
+def print_comparison(results):
+    names = list(results)
+    reference = results[names[0]]
+    header = f"{'escenario':<10} {'perfil':<18} {'p50':>8} {'p95':>8} {'req/s':>8} {'vs ' + names[0]:>22}"
+    print("\n" + header)
+    print("-" * len(header))
+    for scenario in reference:
+        for name in names:
+            stats = results[name][scenario]
+            base = reference[scenario]["p50_ms"]
+            delta = (stats["p50_ms"] - base) / base * 100 if base else 0
+            print(
+                f"{scenario:<10} {name:<18} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                f"{stats['rps'] or 0:>8.1f} {delta:>+21.1f}%"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("SMARTINV_BENCH_DATABASE_URL"),
+        help="BD PostgreSQL con los datos de benchmarks.datagen.",
+    )
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Perfiles a comparar.")
+    parser.add_argument("--output", help="Guarda los resultados de todos los perfiles en este JSON.")
+    args = parser.parse_args(argv)
+
+    if not args.database_url or not args.database_url.startswith(("postgres://", "postgresql://")):
+        parser.error("--database-url debe apuntar a una BD PostgreSQL (postgres://...)")
+
+    # Comprueba la conexión y los datos antes de lanzar los perfiles
+    datagen.setup(args.database_url)
+    if not datagen.bench_users():
+        raise SystemExit("No hay datos de benchmark: ejecuta antes `python -m benchmarks.datagen`.")
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"perfiles desconocidos: {', '.join(sorted(unknown))}")
+
+    results = {name: run_profile(name, PROFILES[name], args) for name in profiles}
+    print_comparison(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"concurrency": args.concurrency, "profiles": PROFILES, "results": results},
+                f, indent=2, ensure_ascii=False,
+            )
+        print(f"\nResultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Comprobación de presupuestos de consultas (guardia contra N+1).
+
+Recorre los endpoints de inventory/api.py, inventory/locations_api.py y
+los listados del admin con los datos de `benchmarks.datagen` y falla
+(exit 1) si alguno:
+
+- no declara `query_budget` (ver inventory/querycount.py),
+- hace más consultas que su presupuesto, o
+- repite la misma consulta (misma huella) más de --max-repeats veces.
+
+Los presupuestos son constantes: con --scale tiny y --scale large deben
+cumplirse igual. Si un cambio introduce una consulta por fila, se rompe
+con la escala small.
+
+Uso:
+    python -m benchmarks.datagen --scale small
+    python -m benchmarks.query_budgets
+    python -m benchmarks.query_budgets --only scan,admin -v
+"""
+import argparse
+import sys
+
+from benchmarks import datagen
+
+# Fuera del prefijo "bench-" para no contar como tenant de datagen
+ADMIN_USERNAME = "budget-admin"
+DEFAULT_MAX_REPEATS = 10
+
+
+# =========================
+#  Endpoints
+# =========================
+
+def _fixtures(user):
+    from inventory.models import Location, Product
+
+    tenant_id = user.organization.id
+    product = (
+        Product.objects.filter(tenant_id=tenant_id, location__isnull=False)
+        .select_related("location")
+        .order_by("name")
+        .first()
+    )
+    if product is None:
+        raise SystemExit(
+            f"{user.username} no tiene productos: ejecuta antes `python -m benchmarks.datagen`."
+        )
+    root = Location.objects.filter(tenant_id=tenant_id, parent__isnull=True).order_by("name").first()
+    return product, root
+
+
+def checks(user):
+    """
+    (grupo, etiqueta, método, ruta, datos). Los datos pueden ser una
+    función que recibe las respuestas anteriores (por etiqueta).
+    """
+    product, root = _fixtures(user)
+    prd = f"PRD:{product.id}"
+    loc = str(product.location.public_id)
+
+    def scan(data):
+        return ("post", "/api/scan/", data)
+
+    def created_id(responses):
+        return responses["locations create"].json()["id"]
+
+    return [
+        # --- inventory/api.py ---
+        ("api", "products list", "get", "/api/products/", None),
+        ("api", "products detail", "get", f"/api/products/{product.id}/", None),
+        ("api", "locations list", "get", "/api/locations/", None),
+        ("api", "movements list", "get", "/api/movements/", None),
+        ("api", "search", "get", "/api/products/search/", {"q": "Producto 00"}),
+        ("api", "search async", "get", "/api/products/search/async/", {"q": "Producto 00"}),
+        ("scan", "scan IN", *scan({"type": "IN", "payload": prd, "quantity": 1, "location": loc})),
+        ("scan", "scan OUT", *scan({"type": "OUT", "payload": prd, "quantity": 1, "location": loc})),
+        ("scan", "scan AUD subárbol", *scan({"type": "AUD", "location": str(root.public_id)})),
+        ("scan", "scan AUD filtros", *scan({"type": "AUD", "audit_filters": {"name": "Producto"}})),
+        ("scan", "scan AUDTOTAL", *scan({"type": "AUDTOTAL"})),
+        ("scan", "scan async IN", "post", "/api/scan/async/",
+         {"type": "IN", "payload": prd, "quantity": 1, "location": loc}),
+        # Pocas operaciones: cada una repite las consultas de un escaneo
+        ("scan", "scan bulk", "post", "/api/scan/bulk/", {
+            "operations": [
+                {"idempotency_key": f"budget-{i}", "type": "IN", "payload": prd,
+                 "quantity": 1, "location": loc}
+                for i in range(5)
+            ]
+        }),
+        ("api", "catalog sync", "get", "/api/catalog/sync/", None),
+        ("api", "valuation", "get", "/api/reports/valuation/", None),
+        ("api", "valuation export", "get", "/api/reports/valuation/export/", {"by": "location"}),
+        ("api", "forecasts", "get", "/api/reports/forecasts/", None),
+        ("api", "consumption", "get", "/api/analytics/consumption/", None),
+        ("api", "consumption top", "get", "/api/analytics/consumption/top/", None),
+        ("api", "export products", "get", "/api/export/products.csv", None),
+        ("api", "import (dry run)", "multipart", "/api/import/", {"file": _import_file(), "dry_run": "1"}),
+        # --- inventory/locations_api.py ---
+        ("locations", "locations tree", "get", "/api/locations/tree/", None),
+        ("locations", "locations create", "post", "/api/locations/create/",
+         {"name": "budget-check", "parent_id": root.id}),
+        ("locations", "locations update", "post",
+         lambda r: f"/api/locations/update/{created_id(r)}/", {"name": "budget-check-2"}),
+        ("locations", "locations delete", "post",
+         lambda r: f"/api/locations/delete/{created_id(r)}/", {}),
+        # --- admin ---
+        ("admin", "admin products", "get", "/admin/inventory/product/", None),
+        ("admin", "admin locations", "get", "/admin/inventory/location/", None),
+        ("admin", "admin movements", "get", "/admin/inventory/movement/", None),
+        ("admin", "admin batches", "get", "/admin/inventory/batch/", None),
+    ]
+
+
+def _import_file(rows=50):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    lines = ["name,location,quantity,unit,category"]
+    lines += [f"Budget {i:03d},Budget > Zona {i % 5},{i + 1},ud,Prueba" for i in range(rows)]
+    return SimpleUploadedFile("budget.csv", "\n".join(lines).encode(), content_type="text/csv")
+
+
+def _admin_user():
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    user = User.objects.filter(username=ADMIN_USERNAME).first()
+    if user is None:
+        user = User.objects.create_superuser(ADMIN_USERNAME, password=datagen.BENCH_PASSWORD)
+    return user
+
+
+def _cleanup(tenant_id):
+    from inventory.models import IdempotencyRecord, Location
+
+    Location.objects.filter(tenant_id=tenant_id, name__startswith="budget-check").delete()
+    IdempotencyRecord.objects.filter(tenant_id=tenant_id, key__startswith="budget-").delete()
+
+
+# =========================
+#  Ejecución
+# =========================
+
+def run(user, groups=None, max_repeats=DEFAULT_MAX_REPEATS, verbose=False, out=sys.stdout):
+    from django.conf import settings
+    from django.test import Client
+
+    from inventory.querycount import QueryRecorder
+
+    # Cabeceras X-Query-* también con DEBUG desactivado
+    settings.QUERY_COUNT_HEADERS = True
+
+    api_client = Client()
+    api_client.force_login(user)
+    admin_client = Client()
+    admin_client.force_login(_admin_user())
+
+    _cleanup(user.organization.id)
+    responses = {}
+    failures = []
+
+    out.write(f"{'endpoint':<22} {'status':>6} {'SQL':>5} {'budget':>6} {'dup':>5}  \n")
+    out.write("-" * 52 + "\n")
+    try:
+        for group, label, method, path, data in checks(user):
+            if groups and group not in groups:
+                continue
+            if callable(path):
+                if "locations create" not in responses:
+                    continue
+                path = path(responses)
+            client = admin_client if group == "admin" else api_client
+
+            with QueryRecorder() as recorder:
+                if method == "get":
+                    response = client.get(path, data or {})
+                elif method == "multipart":
+                    response = client.post(path, data)
+                else:
+                    response = client.post(path, data or {}, content_type="application/json")
+                if getattr(response, "streaming", False):
+                    # Consume el cuerpo: sus consultas también cuentan
+                    for _ in response.streaming_content:
+                        pass
+            responses[label] = response
+
+            budget = response.get("X-Query-Budget")
+            problems = []
+            if response.status_code >= 400:
+                problems.append(f"HTTP {response.status_code}")
+            if budget is None:
+                problems.append("sin query_budget")
+            elif recorder.count > int(budget):
+                problems.append(f"{recorder.count} consultas > presupuesto {budget}")
+            repeated = recorder.repeated()
+            if repeated and repeated[0][1] > max_repeats:
+                problems.append(f"consulta repetida {repeated[0][1]} veces")
+
+            out.write(
+                f"{label:<22} {response.status_code:>6} {recorder.count:>5} "
+                f"{budget or '-':>6} {recorder.duplicates:>5}  {'; '.join(problems)}\n"
+            )
+            if problems or verbose:
+                for sql, n in repeated:
+                    out.write(f"    {n}x {sql[:160]}\n")
+            if problems:
+                failures.append(label)
+    finally:
+        _cleanup(user.organization.id)
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--tenant", type=int, default=0, help="Índice del usuario bench-N.")
+    parser.add_argument("--only", default="", help="Grupos: api,scan,locations,admin.")
+    parser.add_argument("--max-repeats", type=int, default=DEFAULT_MAX_REPEATS)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    datagen.setup(args.database_url)
+    users = datagen.bench_users()
+    if len(users) <= args.tenant:
+        raise SystemExit("No hay datos de benchmark: ejecuta antes `python -m benchmarks.datagen`.")
+
+    groups = {g.strip() for g in args.only.split(",") if g.strip()}
+    failures = run(users[args.tenant], groups, args.max_repeats, args.verbose)
+    if failures:
+        print(f"\nFALLO: {len(failures)} endpoint(s) fuera de presupuesto: {', '.join(failures)}")
+        return 1
+    print("\nOK: todos los endpoints dentro de presupuesto")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Benchmark de escritores concurrentes sobre SQLite.
+
+Compara la configuración por defecto de SQLite (journal DELETE,
+synchronous FULL, BEGIN diferido) con el perfil de settings.SQLITE_PRAGMAS
+(WAL, synchronous NORMAL, BEGIN IMMEDIATE, busy_timeout).
+
+Cada transacción imita una salida FIFO: lee el lote, lo descuenta e
+inserta un movimiento. Con BEGIN diferido, dos transacciones que ya han
+leído no pueden pasar a escritura a la vez y una falla con
+"database is locked" aunque haya timeout.
+
+Uso:
+    python -m benchmarks.sqlite_writers --threads 8 --tx 300
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from inventory.db import apply_pragmas
+
+BASELINE = {
+    "label": "por defecto (DELETE, FULL, BEGIN diferido)",
+    "begin": "BEGIN",
+    "pragmas": {"journal_mode": "DELETE", "synchronous": "FULL"},
+}
+PROFILE = {
+    "label": "perfil (WAL, NORMAL, BEGIN IMMEDIATE)",
+    "begin": "BEGIN IMMEDIATE",
+    "pragmas": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def _setup(path, batches):
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE batch (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL);
+        CREATE TABLE movement (
+            id INTEGER PRIMARY KEY,
+            batch_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    conn.executemany(
+        "INSERT INTO batch (id, quantity) VALUES (?, ?)",
+        [(i, 10**9) for i in range(batches)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _worker(path, config, n_tx, batches, seed, stats, lock):
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    apply_pragmas(conn.cursor(), config["pragmas"])
+
+    ok = failed = 0
+    for i in range(n_tx):
+        batch_id = (seed * 7919 + i) % batches
+        try:
+            conn.execute(config["begin"])
+            (qty,) = conn.execute(
+                "SELECT quantity FROM batch WHERE id = ?", (batch_id,)
+            ).fetchone()
+            conn.execute(
+                "UPDATE batch SET quantity = ? WHERE id = ?", (qty - 1, batch_id)
+            )
+            conn.execute(
+                "INSERT INTO movement (batch_id, quantity, created_at) "
+                "VALUES (?, -1, datetime('now'))",
+                (batch_id,),
+            )
+            conn.execute("COMMIT")
+            ok += 1
+        except sqlite3.OperationalError:
+            failed += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+
+    with lock:
+        stats["ok"] += ok
+        stats["failed"] += failed
+
+
+def run(config, threads, n_tx, batches):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        _setup(path, batches)
+
+        stats = {"ok": 0, "failed": 0}
+        lock = threading.Lock()
+        workers = [
+            threading.Thread(
+                target=_worker,
+                args=(path, config, n_tx, batches, seed, stats, lock),
+            )
+            for seed in range(threads)
+        ]
+
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+
+    stats["elapsed"] = elapsed
+    stats["tx_per_s"] = stats["ok"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--tx", type=int, default=300, help="Transacciones por hilo.")
+    parser.add_argument("--batches", type=int, default=50)
+    args = parser.parse_args()
+
+    total = args.threads * args.tx
+    results = {}
+    for config in (BASELINE, PROFILE):
+        r = run(config, args.threads, args.tx, args.batches)
+        results[config["label"]] = r
+        print(
+            f"{config['label']:<45} "
+            f"{r['ok']:>6}/{total} ok  {r['failed']:>5} fallidas  "
+            f"{r['elapsed']:6.2f}s  {r['tx_per_s']:8.1f} tx/s"
+        )
+
+    base, prof = results[BASELINE["label"]], results[PROFILE["label"]]
+    if base["tx_per_s"]:
+        print(f"Mejora de throughput: x{prof['tx_per_s'] / base['tx_per_s']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
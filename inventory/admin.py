@@ -2,9 +2,72 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Sum, Min
 from .models import Product, Location, Movement, Batch, Organization
+from .exporter import build_paths
 
 admin.site.register(Organization)
 
+
+# -------------------------------------------------------------------
+#  UBICACIONES PRECARGADAS (sin N+1 en los listados)
+# -------------------------------------------------------------------
+def _linked_locations(tenant_ids):
+    """
+    Ubicaciones de esos tenants con el padre ya enlazado en memoria:
+    str() y full_path() no hacen una consulta por nivel.
+    """
+    locations = {loc.pk: loc for loc in Location.objects.filter(tenant_id__in=tenant_ids)}
+    parent_field = Location._meta.get_field("parent")
+    for loc in locations.values():
+        if loc.parent_id is None or loc.parent_id in locations:
+            parent_field.set_cached_value(loc, locations.get(loc.parent_id))
+    return locations
+
+
+def _link(obj, field_name, locations):
+    """Enlaza obj.<field_name> (FK a Location) con la instancia precargada."""
+    field = obj._meta.get_field(field_name)
+    loc_id = getattr(obj, field.attname)
+    if loc_id is None or loc_id in locations:
+        field.set_cached_value(obj, locations.get(loc_id))
+
+
+class LocationTreeMixin:
+    """
+    Antes de pintar la página del listado carga las ubicaciones de sus
+    tenants en una consulta y las enlaza con las filas (link_locations).
+    """
+
+    # Presupuesto de consultas del listado (inventory/querycount.py)
+    query_budget = 12
+
+    def link_locations(self, obj, locations):
+        _link(obj, "location", locations)
+
+    def get_changelist_instance(self, request):
+        cl = super().get_changelist_instance(request)
+        objs = list(cl.result_list)  # evalúa y cachea el queryset de la página
+        if objs:
+            locations = _linked_locations({obj.tenant_id for obj in objs})
+            for obj in objs:
+                self.link_locations(obj, locations)
+        return cl
+
+
+class LocationPathListFilter(admin.RelatedFieldListFilter):
+    """Filtro por ubicación con las rutas en una consulta (str() recorre los padres)."""
+
+    def field_choices(self, field, request, model_admin):
+        paths = build_paths(
+            {
+                loc_id: (parent_id, name)
+                for loc_id, parent_id, name in Location.objects.values_list(
+                    "id", "parent_id", "name"
+                )
+            },
+            sep=" / ",
+        )
+        return sorted(paths.items(), key=lambda item: item[1])
+
 # -------------------------------------------------------------------
 #  INLINE: LOTES (BATCHES) DENTRO DE CADA PRODUCTO
 # -------------------------------------------------------------------
@@ -21,11 +84,14 @@ class BatchInline(admin.TabularInline):
 #  LOCATION ADMIN
 # -------------------------------------------------------------------
 @admin.register(Location)
-class LocationAdmin(admin.ModelAdmin):
+class LocationAdmin(LocationTreeMixin, admin.ModelAdmin):
     list_display = ("full_path", "parent")
     search_fields = ("name",)
     ordering = ("parent", "name")
 
+    def link_locations(self, obj, locations):
+        _link(obj, "parent", locations)
+
     def full_path(self, obj):
         """Muestra la jerarquía completa (ej: Salón / Estantería / Caja Roja)."""
         return obj.full_path()
@@ -37,7 +103,7 @@ class LocationAdmin(admin.ModelAdmin):
 #  PRODUCT ADMIN
 # -------------------------------------------------------------------
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LocationTreeMixin, admin.ModelAdmin):
     list_display = (
         "name",
         "category",
@@ -47,7 +113,7 @@ class ProductAdmin(admin.ModelAdmin):
         "nearest_expiration",
         "status_color",
     )
-    list_filter = ("category", "unit", "location")
+    list_filter = ("category", "unit", ("location", LocationPathListFilter))
     search_fields = ("name", "category", "location__name")
     ordering = ("name",)
     readonly_fields = ("qr_payload", "qr_image")
@@ -64,9 +130,22 @@ class ProductAdmin(admin.ModelAdmin):
         "nfc_tag_uid",
     )
 
+    def get_queryset(self, request):
+        # Stock y caducidad anotados en la consulta del listado
+        # (antes: tres aggregate() por fila)
+        return super().get_queryset(request).annotate(
+            _stock_total=Sum("batches__quantity"),
+            _nearest_expiration=Min("batches__expiration_date"),
+        )
+
+    def _stock(self, obj):
+        if hasattr(obj, "_stock_total"):
+            return obj._stock_total or 0
+        return obj.batches.aggregate(Sum("quantity"))["quantity__sum"] or 0
+
     # ---- CALCULA EL STOCK TOTAL A PARTIR DE LOS LOTES ----
     def stock_total(self, obj):
-        total = obj.batches.aggregate(Sum("quantity"))["quantity__sum"] or 0
+        total = self._stock(obj)
         color = "red" if total < (obj.min_stock or 0) else "green"
         return format_html('<b style="color:{};">{}</b>', color, total)
     stock_total.short_description = "Stock total"
@@ -82,7 +161,10 @@ class ProductAdmin(admin.ModelAdmin):
 
     # ---- MUESTRA LA CADUCIDAD MÁS PRÓXIMA ENTRE LOTES ----
     def nearest_expiration(self, obj):
-        nearest = obj.batches.aggregate(Min("expiration_date"))["expiration_date__min"]
+        if hasattr(obj, "_nearest_expiration"):
+            nearest = obj._nearest_expiration
+        else:
+            nearest = obj.batches.aggregate(Min("expiration_date"))["expiration_date__min"]
         if not nearest:
             return "-"
         return nearest.strftime("%d/%m/%Y")
@@ -90,7 +172,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     # ---- COLOR DE ESTADO SEGÚN STOCK ----
     def status_color(self, obj):
-        total = obj.batches.aggregate(Sum("quantity"))["quantity__sum"] or 0
+        total = self._stock(obj)
         if total <= 0:
             return format_html('<span style="color:red;">❌ Sin stock</span>')
         elif total < (obj.min_stock or 0):
@@ -104,13 +186,20 @@ class ProductAdmin(admin.ModelAdmin):
 #  MOVEMENT ADMIN (Solo lectura - auditoría)
 # -------------------------------------------------------------------
 @admin.register(Movement)
-class MovementAdmin(admin.ModelAdmin):
+class MovementAdmin(LocationTreeMixin, admin.ModelAdmin):
     list_display = ("movement_type", "product", "location_path", "quantity", "created_at", "created_by")
-    list_filter = ("movement_type", "location", "created_at")
+    list_select_related = ("product", "created_by")
+    list_filter = ("movement_type", ("location", LocationPathListFilter), "created_at")
     search_fields = ("product__name", "location__name")
     ordering = ("-created_at",)
     readonly_fields = ("movement_type", "product", "location", "quantity", "created_at", "created_by")
 
+    def link_locations(self, obj, locations):
+        _link(obj, "location", locations)
+        if obj.product:
+            # str(product) incluye la ruta de su ubicación
+            _link(obj.product, "location", locations)
+
     def location_path(self, obj):
         """Ruta completa de la ubicación."""
         return obj.location.full_path() if obj.location else "(sin ubicación)"
@@ -133,7 +222,7 @@ from .models import Batch
 
 
 @admin.register(Batch)
-class BatchAdmin(admin.ModelAdmin):
+class BatchAdmin(LocationTreeMixin, admin.ModelAdmin):
     # --- Listado ---
     list_display = (
         "product",
@@ -146,6 +235,7 @@ class BatchAdmin(admin.ModelAdmin):
         "origin",
         "estimated_value",
     )
+    list_select_related = ("product",)
     list_filter = ("expiration_date",)
     search_fields = ("product__name", "product__location__name")
     ordering = ("-entry_date",)
@@ -171,6 +261,10 @@ class BatchAdmin(admin.ModelAdmin):
     )
 
     # --- Utilidades ---
+    def link_locations(self, obj, locations):
+        if obj.product:
+            _link(obj.product, "location", locations)
+
     def location_path(self, obj):
         """Ruta completa de la ubicación del producto asociado al lote."""
         if obj.product and obj.product.location:
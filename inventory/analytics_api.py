@@ -0,0 +1,142 @@
+import uuid
+from datetime import date, timedelta
+
+from django.utils import timezone
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from .locations_api import get_tenant_from_request
+from .reports_api import resolve_location_param
+from . import rollups
+from .replicas import ReplicaReadMixin
+
+MAX_RANGE_DAYS = 731
+
+
+def _parse_range(request):
+    """
+    Rango de días a partir de ?from=YYYY-MM-DD&to=YYYY-MM-DD o ?days=N
+    (por defecto los últimos 90 días hasta hoy).
+    """
+    end = timezone.localdate()
+    raw_to = request.GET.get("to")
+    raw_from = request.GET.get("from")
+
+    if raw_to:
+        end = date.fromisoformat(raw_to)
+    if raw_from:
+        start = date.fromisoformat(raw_from)
+    else:
+        days = int(request.GET.get("days") or 90)
+        start = end - timedelta(days=max(days, 1) - 1)
+
+    if start > end:
+        raise ValueError("from > to")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        start = end - timedelta(days=MAX_RANGE_DAYS - 1)
+    return start, end
+
+
+class _RollupView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    query_budget = 6
+
+    def _filtered(self, request):
+        tenant_id = get_tenant_from_request(request)
+
+        try:
+            start, end = _parse_range(request)
+        except ValueError:
+            return None, None, None, Response(
+                {"ok": False, "error": "invalid_range", "detail": "Rango de fechas inválido."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        location_id, error = resolve_location_param(request, tenant_id)
+        if error:
+            return None, None, None, error
+
+        product_id = (request.GET.get("product") or "").strip() or None
+        if product_id:
+            try:
+                product_id = uuid.UUID(product_id)
+            except ValueError:
+                return None, None, None, Response(
+                    {"ok": False, "error": "invalid_product", "detail": "Producto inválido."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        qs = rollups.filtered(
+            tenant_id,
+            start,
+            end,
+            product_id=product_id,
+            category=(request.GET.get("category") or "").strip() or None,
+            location_id=location_id,
+        )
+        return qs, start, end, None
+
+
+class ConsumptionSeriesView(_RollupView):
+    """
+    GET /api/analytics/consumption/?days=90&category=&location=&product=
+    Serie diaria de entradas/salidas/ajustes leída del rollup diario.
+    """
+
+    def get(self, request):
+        qs, start, end, error = self._filtered(request)
+        if error:
+            return error
+
+        points = rollups.series(qs, start, end)
+        total_out = sum(p["out_qty"] for p in points)
+        total_in = sum(p["in_qty"] for p in points)
+
+        return Response(
+            {
+                "ok": True,
+                "from": start.isoformat(),
+                "to": end.isoformat(),
+                "days": len(points),
+                "total_in": total_in,
+                "total_out": total_out,
+                "avg_out_per_day": round(total_out / len(points), 3) if points else 0,
+                "series": points,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ConsumptionTopView(_RollupView):
+    """
+    GET /api/analytics/consumption/top/?days=90&limit=20
+    Productos con más consumo en el rango (mismos filtros que la serie).
+    """
+
+    def get(self, request):
+        qs, start, end, error = self._filtered(request)
+        if error:
+            return error
+
+        try:
+            # Un límite negativo haría un slice negativo del queryset (error 500)
+            limit = max(1, min(int(request.GET.get("limit") or 20), 200))
+        except ValueError:
+            limit = 20
+
+        items = [
+            {
+                "product_id": str(row["product_id"]),
+                "product": row["product__name"],
+                "category": row["product__category"],
+                "in_qty": row["in_qty"],
+                "out_qty": row["out_qty"],
+            }
+            for row in rollups.top_products(qs, limit=limit)
+        ]
+        return Response(
+            {"ok": True, "from": start.isoformat(), "to": end.isoformat(), "items": items},
+            status=status.HTTP_200_OK,
+        )
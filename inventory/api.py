@@ -1,8 +1,13 @@
+import asyncio
+import time
 import uuid
+from functools import partial
+
 from django.utils import timezone
 
 from django.urls import path, include
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 
@@ -19,6 +24,10 @@ from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import IsAuthenticated
 
 from .utils import available_stock
+from . import idempotency, metrics, querycount, tenant_cache, writer
+from .replicas import ReplicaReadMixin, read_only
+from .profiling import span
+from .exporter import build_paths, location_paths
 from .models import Batch, Product, Location, Movement, AppMeta
 from .serializers import ProductSerializer, LocationSerializer, MovementSerializer
 
@@ -29,6 +38,12 @@ from .locations_api import (
     LocationUpdateView,
     LocationDeleteView,
 )
+from .reports_api import ValuationReportView, ValuationExportView, ForecastListView
+from .analytics_api import ConsumptionSeriesView, ConsumptionTopView
+from .import_api import InventoryImportView
+from .export_api import InventoryExportView
+from .async_api import scan_async, product_search_async
+from .catalog_api import CatalogSyncView
 
 DEFAULT_TENANT = uuid.UUID(
     getattr(settings, "DEFAULT_TENANT", "00000000-0000-0000-0000-000000000001")
@@ -65,6 +80,14 @@ class TenantScopedMixin:
         tenant_id = get_tenant_from_request(request)
         serializer.save(tenant_id=tenant_id)
 
+    def get_serializer_context(self):
+        # Rutas de ubicación del tenant en una consulta (LocationPathMixin)
+        context = super().get_serializer_context()
+        context["location_paths"] = location_paths(
+            get_tenant_from_request(getattr(self, "request", None))
+        )
+        return context
+
 
 # -------------------------------------------------------------------
 #  Routers para vistas estándar (admin / API REST)
@@ -72,8 +95,10 @@ class TenantScopedMixin:
 router = DefaultRouter()
 
 
-class BaseViewSet(TenantScopedMixin, viewsets.ModelViewSet):
+class BaseViewSet(ReplicaReadMixin, TenantScopedMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    # Constante con cualquier volumen de datos (ver inventory/querycount.py)
+    query_budget = 8
 
 
 class ProductViewSet(BaseViewSet):
@@ -87,7 +112,7 @@ class LocationViewSet(BaseViewSet):
 
 
 class MovementViewSet(BaseViewSet):
-    queryset = Movement.objects.all()
+    queryset = Movement.objects.select_related("product")
     serializer_class = MovementSerializer
 
 
@@ -99,8 +124,9 @@ router.register(r"movements", MovementViewSet)
 # -------------------------------------------------------------------
 #  BUSCADOR RÁPIDO
 # -------------------------------------------------------------------
-class ProductQuickSearch(APIView):
+class ProductQuickSearch(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 6
 
     def get(self, request):
         q = (request.GET.get("q") or "").strip()
@@ -108,19 +134,25 @@ class ProductQuickSearch(APIView):
             return Response({"results": []})
 
         tenant_id = get_tenant_from_request(request)
-        
+        data, hit = tenant_cache.get_or_compute(
+            "search", tenant_id, (q,), lambda: self._search(tenant_id, q)
+        )
+        return tenant_cache.mark(Response({"results": data}), hit)
 
+    def _search(self, tenant_id, q):
         qs = (
             Product.objects.filter(
                 tenant_id=tenant_id,
                 name__icontains=q,
             )
-            .select_related("location")
             .order_by("name")[:20]
         )
 
+        products = list(qs)
+        paths = location_paths(tenant_id) if products else {}
+
         data = []
-        for p in qs:
+        for p in products:
             data.append(
                 {
                     "id": str(p.id),
@@ -128,20 +160,94 @@ class ProductQuickSearch(APIView):
                     "sku": p.sku,
                     "payload": f"PRD:{p.id}",
                     "category": p.category,
-                    "location": p.location.full_path() if p.location else None,
+                    "location": paths.get(p.location_id),
                 }
             )
+        return data
 
-        return Response({"results": data})
+
+# -------------------------------------------------------------------
+#  LOTES PARA AUDITORÍAS (AUD / AUDTOTAL)
+# -------------------------------------------------------------------
+AUDIT_BATCH_FIELDS = (
+    "id",
+    "quantity",
+    "expiration_date",
+    "opened_units",
+    "opened_at",
+    "open_expires_at",
+
+    # 🔽 metadatos por LOTE
+    "brand",
+    "origin",
+    "primary_color",
+    "dimensions",
+    "estimated_value",
+    "notes",
+)
+
+
+def _audit_batches(products):
+    """
+    Lotes con stock de los productos del queryset, agrupados por producto
+    y ordenados por caducidad. Una sola consulta (el queryset va como
+    subconsulta) en lugar de una por producto.
+    """
+    grouped = {}
+    rows = (
+        Batch.objects.filter(product__in=products.values("id"), quantity__gt=0)
+        .order_by("expiration_date")
+        .values("product_id", *AUDIT_BATCH_FIELDS)
+    )
+    for row in rows:
+        grouped.setdefault(row.pop("product_id"), []).append(row)
+    return grouped
+
+
+def _stock_summary(batches):
+    """(cantidad total, caducidad más próxima) de una lista de lotes con stock."""
+    total_qty = sum(int(b["quantity"]) for b in batches)
+    nearest_exp = min(
+        (b["expiration_date"] for b in batches if b.get("expiration_date")),
+        default=None,
+    )
+    return total_qty, nearest_exp
 
 
 # -------------------------------------------------------------------
 #  ENDPOINT PRINCIPAL DE ESCANEO
 # -------------------------------------------------------------------
+class PendingWrite(Response):
+    """
+    Escritura IN/OUT enviada al hilo escritor sin esperar su resultado
+    (ScanEndpoint con defer_writes, ver inventory/async_api.py). Recorre el
+    dispatch de DRF como cualquier respuesta; la respuesta real se obtiene
+    con `await view.finish_write(pending)`.
+    """
+
+    def __init__(self, view, future):
+        super().__init__(status=status.HTTP_202_ACCEPTED)
+        self.view = view
+        self.future = future
+        self.started = None
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class ScanEndpoint(APIView):
     permission_classes = [IsAuthenticated]
 
+    # Presupuesto de consultas por tipo (inventory/querycount.py). OUT
+    # sube un nivel por consulta para devolver la ruta de la ubicación.
+    query_budget = 32
+    query_budgets = {"IN": 20, "OUT": 32, "AUD": 12, "AUDTOTAL": 10}
+
+    # Tipo del escaneo en curso, para las métricas (inventory/metrics.py)
+    scan_type = None
+
+    # Vista asíncrona: IN/OUT se envían al escritor y devuelven PendingWrite
+    # en lugar de bloquear el hilo hasta que se apliquen
+    defer_writes = False
+
     # Mapeo centralizado de tipos de movimiento
     TYPE_MAP = {
         "ENTRADA": "IN",
@@ -204,6 +310,7 @@ class ScanEndpoint(APIView):
         """
         Formato uniforme de error, compatible con el frontend actual.
         """
+        metrics.SCAN_ERRORS.inc(type=metrics.scan_label(self.scan_type), code=code)
         meta = meta or {}
         data = {
             "ok": False,
@@ -218,6 +325,113 @@ class ScanEndpoint(APIView):
                     data[key] = meta[key]
         return Response(data, status=status_code)
 
+    def _write(self, request, tenant_id, handler, *args):
+        """
+        Ejecuta un handler que modifica stock. Con SCAN_WRITER activo se
+        aplica en el hilo escritor (inventory/writer.py): orden FIFO por
+        tenant y sin competir por el lock de SQLite.
+
+        Si la petición trae Idempotency-Key, un reintento devuelve la
+        respuesta guardada sin repetir el escaneo (inventory/idempotency.py).
+        """
+        try:
+            key = idempotency.key_from_request(request)
+        except idempotency.InvalidKey:
+            return self._error(
+                "invalid_idempotency_key",
+                f"La clave de idempotencia debe tener entre 1 y {idempotency.MAX_KEY_LENGTH} caracteres.",
+            )
+
+        call = partial(handler, request, *args)
+        if key:
+            fp = idempotency.fingerprint(request.data)
+            call = partial(idempotency.run_once, tenant_id, key, fp, call)
+
+        try:
+            # Incluye la espera en la cola del hilo escritor
+            with span("scan.write"):
+                if not writer.enabled():
+                    return call()
+                if self.defer_writes and not writer.writer.runs_inline():
+                    return PendingWrite(self, writer.writer.submit(tenant_id, call))
+                return writer.writer.run(tenant_id, call, timeout=settings.SCAN_WRITER_TIMEOUT)
+        except idempotency.KeyReused:
+            return self._key_reused()
+        except (writer.WriterBusy, writer.WriterTimeout):
+            return self._busy()
+
+    async def finish_write(self, pending):
+        """
+        Espera, sin ocupar un hilo, la escritura de un PendingWrite y
+        devuelve la respuesta final renderizada. Mismas respuestas que
+        _write: 422 si la clave de idempotencia ya se usó con otros datos y
+        503 (busy) si el comando no empezó a aplicarse en
+        SCAN_WRITER_TIMEOUT segundos (se cancela sin aplicarse).
+        """
+        future = pending.future
+        waiting = asyncio.wrap_future(future)
+        try:
+            try:
+                # shield: el timeout no debe cancelar un comando que ya se aplica
+                response = await asyncio.wait_for(
+                    asyncio.shield(waiting), settings.SCAN_WRITER_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                if future.cancel():
+                    response = self._busy()
+                else:
+                    # Ya se está aplicando: su resultado es el que vale
+                    response = await waiting
+        except idempotency.KeyReused:
+            response = self._key_reused()
+        except Exception:
+            response = self._server_error()
+
+        metrics.observe_scan(self.scan_type, response, time.perf_counter() - pending.started)
+
+        # Mismo renderer y cabeceras que DRF negoció para la petición
+        response.accepted_renderer = pending.accepted_renderer
+        response.accepted_media_type = pending.accepted_media_type
+        response.renderer_context = dict(pending.renderer_context, response=response)
+        for header, value in pending.items():
+            if header not in response:
+                response[header] = value
+        return response.render()
+
+    def _key_reused(self):
+        return self._error(
+            "idempotency_key_reused",
+            "Esta clave de idempotencia ya se usó con otros datos.",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    def _server_error(self):
+        # Hardening de seguridad:
+        # - No devolvemos trazas ni nombres de excepciones al cliente.
+        # - Mensaje genérico para el usuario.
+        return Response(
+            {
+                "ok": False,
+                "error": "server_error",
+                "detail": "Ha ocurrido un error interno. Inténtalo de nuevo más tarde.",
+            },
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    def _busy(self):
+        """
+        503 con Retry-After: cola del tenant llena o comando cancelado por
+        timeout antes de aplicarse (WriterTimeout). En ambos casos no se ha
+        escrito nada y el cliente puede reintentar.
+        """
+        response = self._error(
+            "busy",
+            "Hay demasiados escaneos pendientes. Inténtalo de nuevo en unos segundos.",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response["Retry-After"] = "2"
+        return response
+
     # -------------------------
     # Handlers por tipo
     # -------------------------
@@ -262,7 +476,7 @@ class ScanEndpoint(APIView):
                     "Debe indicar una ubicación o el producto debe tener una ubicación asignada.",
                 )
 
-            with transaction.atomic():
+            with transaction.atomic(), span("scan.movement"):
                 batch = Batch.objects.create(
                     product=product,
                     quantity=abs(qty),
@@ -290,7 +504,7 @@ class ScanEndpoint(APIView):
                 payload_str = product.qr_payload or f"PRD:{product.id}"
                 if not product.qr_payload:
                     product.qr_payload = payload_str
-                    product.save(update_fields=["qr_payload"])
+                    product.save(update_fields=["qr_payload", "updated_at"])
 
             return Response(
                 {
@@ -322,7 +536,7 @@ class ScanEndpoint(APIView):
                 "Debes seleccionar una ubicación para crear un producto nuevo.",
             )
 
-        with transaction.atomic():
+        with transaction.atomic(), span("scan.movement"):
             product, created = Product.objects.get_or_create(
                 name=name,
                 location=location,
@@ -369,7 +583,7 @@ class ScanEndpoint(APIView):
             payload_str = product.qr_payload or f"PRD:{product.id}"
             if not product.qr_payload:
                 product.qr_payload = payload_str
-                product.save(update_fields=["qr_payload"])
+                product.save(update_fields=["qr_payload", "updated_at"])
 
         return Response(
             {
@@ -467,14 +681,15 @@ class ScanEndpoint(APIView):
                         "Debe indicar una ubicación o el producto debe tener una ubicación asignada.",
                     )
 
-                Movement.objects.create(
-                    product=opened_batch.product,
-                    location=loc_final,
-                    quantity=-1,
-                    movement_type="OUT",
-                    metadata={"opened_batch": opened_batch.id},
-                    tenant_id=tenant_id,
-                )
+                with span("scan.movement"):
+                    Movement.objects.create(
+                        product=opened_batch.product,
+                        location=loc_final,
+                        quantity=-1,
+                        movement_type="OUT",
+                        metadata={"opened_batch": opened_batch.id},
+                        tenant_id=tenant_id,
+                    )
 
                 return Response(
                     {
@@ -542,12 +757,13 @@ class ScanEndpoint(APIView):
 
         need = abs(qty)
 
-        batch_total = (
-            Batch.objects.filter(product=product, tenant_id=tenant_id).aggregate(
-                t=Coalesce(Sum("quantity"), 0)
-            )["t"]
-            or 0
-        )
+        with span("scan.stock"):
+            batch_total = (
+                Batch.objects.filter(product=product, tenant_id=tenant_id).aggregate(
+                    t=Coalesce(Sum("quantity"), 0)
+                )["t"]
+                or 0
+            )
 
         if need > int(batch_total):
             return self._error(
@@ -559,51 +775,52 @@ class ScanEndpoint(APIView):
 
         consumed = []
         with transaction.atomic():
-            fifo_batches = (
-                Batch.objects.select_for_update()
-                .filter(
-                    product=product,
-                    tenant_id=tenant_id,
-                    quantity__gt=0,
-                )
-                .order_by(
-                    models.F("expiration_date").asc(nulls_last=True),
-                    "entry_date",
-                    "id",
+            with span("scan.fifo"):
+                fifo_batches = (
+                    Batch.objects.select_for_update()
+                    .filter(
+                        product=product,
+                        tenant_id=tenant_id,
+                        quantity__gt=0,
+                    )
+                    .order_by(
+                        models.F("expiration_date").asc(nulls_last=True),
+                        "entry_date",
+                        "id",
+                    )
                 )
-            )
-
-            remaining = need
-            for b in fifo_batches:
-                if remaining <= 0:
-                    break
-
-                prev_qty = int(b.quantity)
-                take = min(prev_qty, remaining)
-                if take <= 0:
-                    continue
 
-                b.quantity = prev_qty - take
-                if b.quantity == 0 and not b.is_depleted:
-                    b.is_depleted = True
-                    b.depleted_at = now()
-                b.save(update_fields=["quantity", "is_depleted", "depleted_at"])
-
-                consumed.append(
-                    {
-                        "batch_id": b.id,
-                        "prev_qty": prev_qty,
-                        "taken": take,
-                        "new_qty": int(b.quantity),
-                        "expiration_date": (
-                            b.expiration_date.isoformat()
-                            if getattr(b, "expiration_date", None)
-                            else None
-                        ),
-                    }
-                )
+                remaining = need
+                for b in fifo_batches:
+                    if remaining <= 0:
+                        break
+
+                    prev_qty = int(b.quantity)
+                    take = min(prev_qty, remaining)
+                    if take <= 0:
+                        continue
+
+                    b.quantity = prev_qty - take
+                    if b.quantity == 0 and not b.is_depleted:
+                        b.is_depleted = True
+                        b.depleted_at = now()
+                    b.save(update_fields=["quantity", "is_depleted", "depleted_at"])
+
+                    consumed.append(
+                        {
+                            "batch_id": b.id,
+                            "prev_qty": prev_qty,
+                            "taken": take,
+                            "new_qty": int(b.quantity),
+                            "expiration_date": (
+                                b.expiration_date.isoformat()
+                                if getattr(b, "expiration_date", None)
+                                else None
+                            ),
+                        }
+                    )
 
-                remaining -= take
+                    remaining -= take
 
             if remaining > 0:
                 return self._error(
@@ -619,56 +836,58 @@ class ScanEndpoint(APIView):
                     "Debe indicar una ubicación o el producto debe tener una ubicación asignada.",
                 )
 
-            Movement.objects.create(
-                product=product,
-                location=loc_final,
-                quantity=-need,
-                movement_type="OUT",
-                metadata={"consumed_batches": consumed},
-                tenant_id=tenant_id,
-            )
+            with span("scan.movement"):
+                Movement.objects.create(
+                    product=product,
+                    location=loc_final,
+                    quantity=-need,
+                    movement_type="OUT",
+                    metadata={"consumed_batches": consumed},
+                    tenant_id=tenant_id,
+                )
 
-        stock_remaining = (
-            Batch.objects.filter(product=product, tenant_id=tenant_id).aggregate(
-                t=Coalesce(Sum("quantity"), 0)
-            )["t"]
-            or 0
-        )
+        with span("scan.response"):
+            stock_remaining = (
+                Batch.objects.filter(product=product, tenant_id=tenant_id).aggregate(
+                    t=Coalesce(Sum("quantity"), 0)
+                )["t"]
+                or 0
+            )
 
-        remaining_qs = Batch.objects.filter(
-            product=product,
-            tenant_id=tenant_id,
-            quantity__gt=0,
-        ).exclude(expiration_date__isnull=True).order_by("expiration_date")
+            remaining_qs = Batch.objects.filter(
+                product=product,
+                tenant_id=tenant_id,
+                quantity__gt=0,
+            ).exclude(expiration_date__isnull=True).order_by("expiration_date")
 
-        exp_dates = list(remaining_qs.values_list("expiration_date", flat=True))
-        if exp_dates:
-            nearest = exp_dates[0]
-            farthest = exp_dates[-1]
-        else:
-            nearest = None
-            farthest = None
+            exp_dates = list(remaining_qs.values_list("expiration_date", flat=True))
+            if exp_dates:
+                nearest = exp_dates[0]
+                farthest = exp_dates[-1]
+            else:
+                nearest = None
+                farthest = None
 
-        return Response(
-            {
-                "ok": True,
-                "product": {
-                    "id": str(product.id),
-                    "name": product.name,
-                    "location": product.location.full_path()
-                    if product.location
-                    else None,
+            return Response(
+                {
+                    "ok": True,
+                    "product": {
+                        "id": str(product.id),
+                        "name": product.name,
+                        "location": product.location.full_path()
+                        if product.location
+                        else None,
+                    },
+                    "requested": need,
+                    "stock_remaining": int(stock_remaining),
+                    "consumed_batches": consumed,
+                    "payload": product.qr_payload,
+                    "detail": "Salida registrada correctamente",
+                    "nearest_expiration": nearest.isoformat() if nearest else None,
+                    "farthest_expiration": farthest.isoformat() if farthest else None,
                 },
-                "requested": need,
-                "stock_remaining": int(stock_remaining),
-                "consumed_batches": consumed,
-                "payload": product.qr_payload,
-                "detail": "Salida registrada correctamente",
-                "nearest_expiration": nearest.isoformat() if nearest else None,
-                "farthest_expiration": farthest.isoformat() if farthest else None,
-            },
-            status=200,
-        )
+                status=200,
+            )
 
     def _handle_aud(self, request, location, tenant_id):
         # --- Lectura de filtros opcionales ---
@@ -697,12 +916,19 @@ class ScanEndpoint(APIView):
                 "Debes indicar una ubicación o al menos un filtro de búsqueda.",
             )
 
-        # --- Base queryset (siempre tenant-scoped) ---
-        products = (
-            Product.objects.filter(tenant_id=tenant_id)
-            .select_related("location")
-            .prefetch_related("batches")
+        # Resultado cacheado por ubicación y filtros (inventory/tenant_cache.py)
+        filters = (f_name, f_category, f_brand, f_origin, f_color, f_dimensions)
+        body, hit = tenant_cache.get_or_compute(
+            "audit",
+            tenant_id,
+            (location.id if location else None, filters),
+            lambda: self._audit(tenant_id, location, *filters),
         )
+        return tenant_cache.mark(Response(body, status=200), hit)
+
+    def _audit(self, tenant_id, location, f_name, f_category, f_brand, f_origin, f_color, f_dimensions):
+        # --- Base queryset (siempre tenant-scoped) ---
+        products = Product.objects.filter(tenant_id=tenant_id)
 
         # --- Filtro por ubicación (si existe) ---
         if location:
@@ -723,43 +949,15 @@ class ScanEndpoint(APIView):
         if f_dimensions:
             products = products.filter(dimensions__icontains=f_dimensions)
 
+        # Lotes y rutas de todos los productos de golpe (sin N+1)
+        batches_by_product = _audit_batches(products)
+        paths = location_paths(tenant_id)
+
         data = []
 
         for p in products:
-            # --- Lotes (LO QUE YA TENÍAS) ---
-            all_batches = list(
-                p.batches.values(
-                    "id",
-                    "quantity",
-                    "expiration_date",
-                    "opened_units",
-                    "opened_at",
-                    "open_expires_at",
-
-                    # 🔽 metadatos por LOTE
-                    "brand",
-                    "origin",
-                    "primary_color",
-                    "dimensions",
-                    "estimated_value",
-                    "notes",
-                ).order_by("expiration_date")
-            )
-
-            non_empty_batches = [
-                b for b in all_batches if int(b.get("quantity") or 0) > 0
-            ]
-
-            total_qty = sum(int(b["quantity"]) for b in non_empty_batches)
-
-            nearest_exp = min(
-                (
-                    b["expiration_date"]
-                    for b in non_empty_batches
-                    if b.get("expiration_date")
-                ),
-                default=None,
-            )
+            non_empty_batches = batches_by_product.get(p.id, [])
+            total_qty, nearest_exp = _stock_summary(non_empty_batches)
 
             # --- Respuesta ampliada ---
             data.append(
@@ -785,9 +983,7 @@ class ScanEndpoint(APIView):
                     if p.estimated_value is not None
                     else None,
 
-                    "location": p.location.full_path()
-                    if hasattr(p.location, "full_path")
-                    else p.location.name,
+                    "location": paths.get(p.location_id),
 
                     # Stock / lotes (sin tocar lógica)
                     "total_quantity": total_qty,
@@ -796,77 +992,56 @@ class ScanEndpoint(APIView):
                 }
             )
 
-        return Response(
-            {
-                "ok": True,
-                "location": location.full_path()
-                if location and hasattr(location, "full_path")
-                else location.name if location else None,
-                "filters": {
-                    "name": f_name or None,
-                    "category": f_category or None,
-                    "brand": f_brand or None,
-                    "origin": f_origin or None,
-                    "primary_color": f_color or None,
-                    "dimensions": f_dimensions or None,
-                },
-                "total_products": len(data),
-                "items": data,
+        return {
+            "ok": True,
+            "location": paths.get(location.id, location.name)
+            if location
+            else None,
+            "filters": {
+                "name": f_name or None,
+                "category": f_category or None,
+                "brand": f_brand or None,
+                "origin": f_origin or None,
+                "primary_color": f_color or None,
+                "dimensions": f_dimensions or None,
             },
-            status=200,
-        )
+            "total_products": len(data),
+            "items": data,
+        }
 
 
     def _handle_audtotal(self, request, tenant_id):
-        all_locations = Location.objects.filter(
-            tenant_id=tenant_id
-        ).order_by("name")
+        body, hit = tenant_cache.get_or_compute(
+            "audtotal", tenant_id, (), lambda: self._audtotal(tenant_id)
+        )
+        return tenant_cache.mark(Response(body, status=200), hit)
+
+    def _audtotal(self, tenant_id):
+        # Tres consultas en total: ubicaciones, productos y lotes
+        all_locations = list(
+            Location.objects.filter(tenant_id=tenant_id)
+            .order_by("name")
+            .values_list("id", "parent_id", "name")
+        )
+        paths = build_paths({loc_id: (parent_id, name) for loc_id, parent_id, name in all_locations})
+
+        products = Product.objects.filter(tenant_id=tenant_id, location__isnull=False)
+        products_by_location = {}
+        for p in products.order_by("name").only("id", "name", "category", "unit", "location_id"):
+            products_by_location.setdefault(p.location_id, []).append(p)
+        batches_by_product = _audit_batches(products)
+
         inventory = []
 
-        for loc in all_locations:
-            products = (
-                Product.objects.filter(location=loc, tenant_id=tenant_id)
-                .select_related("location")
-                .prefetch_related("batches")
-            )
-            if not products.exists():
+        for loc_id, _parent_id, name in all_locations:
+            loc_products = products_by_location.get(loc_id)
+            if not loc_products:
                 continue
 
             items = []
-            for p in products:
-                all_batches = list(
-                    p.batches.values(
-                        "id",
-                        "quantity",
-                        "expiration_date",
-                        "opened_units",
-                        "opened_at",
-                        "open_expires_at",
-
-                        # 🔽 metadatos por LOTE (para que salgan en AUDTOTAL)
-                        "brand",
-                        "origin",
-                        "primary_color",
-                        "dimensions",
-                        "estimated_value",
-                        "notes",
-                    ).order_by("expiration_date")
-                )
-
-                non_empty_batches = [
-                    b for b in all_batches if int(b.get("quantity") or 0) > 0
-                ]
-
-                total_qty = sum(int(b["quantity"]) for b in non_empty_batches)
-
-                nearest_exp = min(
-                    (
-                        b["expiration_date"]
-                        for b in non_empty_batches
-                        if b.get("expiration_date")
-                    ),
-                    default=None,
-                )
+            for p in loc_products:
+                non_empty_batches = batches_by_product.get(p.id, [])
+                total_qty, nearest_exp = _stock_summary(non_empty_batches)
 
                 items.append(
                     {
@@ -881,34 +1056,35 @@ class ScanEndpoint(APIView):
 
             inventory.append(
                 {
-                    "location": loc.full_path()
-                    if hasattr(loc, "full_path")
-                    else loc.name,
+                    "location": paths.get(loc_id, name),
                     "total_products": len(items),
                     "items": items,
                 }
             )
 
-        return Response(
-            {"ok": True, "total_locations": len(inventory), "inventory": inventory},
-            status=200,
-        )
+        return {"ok": True, "total_locations": len(inventory), "inventory": inventory}
 
-    # -------------------------
-    # POST principal (router)
-    # -------------------------
-    def post(self, request):
+    def _scan(self, request, tenant_id):
+        """
+        Valida y enruta un escaneo según su tipo. Solo usa request.data,
+        request.META y request.user (ver también ScanBulkEndpoint).
+        """
+        self.scan_type = None
+        t0 = time.perf_counter()
         try:
-            tenant_id = get_tenant_from_request(request)
-
-            AppMeta.objects.get_or_create(
-                tenant_id=tenant_id,
-                defaults={
-                    "schema_version": 1,
-                    "app_version": "0.1-alpha (tester-local)",
-                },
-            )
-
+            response = self._route_scan(request, tenant_id)
+        except Exception:
+            metrics.observe_scan(self.scan_type, None, time.perf_counter() - t0)
+            raise
+        if isinstance(response, PendingWrite):
+            # Se mide al terminar la escritura (finish_write)
+            response.started = t0
+            return response
+        metrics.observe_scan(self.scan_type, response, time.perf_counter() - t0)
+        return response
+
+    def _route_scan(self, request, tenant_id):
+        with span("scan.parse"):
             try:
                 (
                     payload,
@@ -925,7 +1101,11 @@ class ScanEndpoint(APIView):
                     "La cantidad debe ser un número entero válido.",
                 )
 
-            # Ubicación (opcional)
+        querycount.set_budget(request, self.query_budgets.get(mtype, self.query_budget))
+        self.scan_type = mtype
+
+        # Ubicación (opcional)
+        with span("scan.location"):
             location = None
             if loc_id_raw:
                 try:
@@ -947,44 +1127,224 @@ class ScanEndpoint(APIView):
                         status_code=status.HTTP_404_NOT_FOUND,
                     )
 
-            # Enrutado por tipo
-            if mtype == "IN":
-                return self._handle_in(request, payload, qty, location, tenant_id)
+        # Enrutado por tipo
+        if mtype == "IN":
+            return self._write(
+                request, tenant_id, self._handle_in, payload, qty, location, tenant_id
+            )
 
-            if mtype == "OUT":
-                return self._handle_out(
-                    request,
-                    payload,
-                    qty,
-                    location,
-                    mark_open,
-                    open_days,
-                    tenant_id,
-                )
+        if mtype == "OUT":
+            return self._write(
+                request,
+                tenant_id,
+                self._handle_out,
+                payload,
+                qty,
+                location,
+                mark_open,
+                open_days,
+                tenant_id,
+            )
 
-            if mtype == "AUD":
+        # Las auditorías solo leen: réplica (inventory/replicas.py)
+        if mtype == "AUD":
+            with span("scan.audit"), read_only():
                 return self._handle_aud(request, location, tenant_id)
 
-            if mtype == "AUDTOTAL":
+        if mtype == "AUDTOTAL":
+            with span("scan.audit"), read_only():
                 return self._handle_audtotal(request, tenant_id)
 
+        return self._error(
+            "unknown_type",
+            f"Tipo de movimiento no soportado: {mtype}",
+        )
+
+    # -------------------------
+    # POST principal (router)
+    # -------------------------
+    def post(self, request):
+        try:
+            tenant_id = get_tenant_from_request(request)
+
+            AppMeta.objects.get_or_create(
+                tenant_id=tenant_id,
+                defaults={
+                    "schema_version": 1,
+                    "app_version": "0.1-alpha (tester-local)",
+                },
+            )
+
+            return self._scan(request, tenant_id)
+
+        except Exception:
+            return self._server_error()
+
+
+# -------------------------------------------------------------------
+#  SINCRONIZACIÓN EN BLOQUE (cola offline de la PWA)
+# -------------------------------------------------------------------
+class _QueuedScan:
+    """
+    Una operación de la cola offline con la interfaz que usan los
+    handlers de ScanEndpoint (data, META, user).
+    """
+
+    def __init__(self, request, data):
+        self.data = data
+        self.user = request.user
+        self.META = {k: v for k, v in request.META.items() if k != idempotency.HEADER}
+
+
+class ScanBulkEndpoint(ScanEndpoint):
+    """
+    POST /api/scan/bulk/
+    {"operations": [{"idempotency_key": "...", "movement_type": "OUT",
+                     "payload": "PRD:...", "quantity": 1, ...}, ...]}
+
+    Aplica las operaciones en orden, cada una con la lógica de /api/scan/
+    y en su propio savepoint, y todas en una sola transacción (una sola
+    escritura al disco por lote). Cada operación necesita su
+    idempotency_key: reenviar el lote tras un corte no duplica nada.
+
+    Devuelve un resultado por operación:
+    - "applied": se aplicó (o ya estaba aplicada: replayed=true).
+    - "conflict": error de negocio (sin stock, producto inexistente...)
+      o datos inválidos (payload con un UUID mal formado, cantidad no
+      numérica...); no tiene sentido reintentarla tal cual.
+    - "retry": error temporal (BD bloqueada, escritor ocupado...); el
+      cliente debe reenviarla más tarde.
+    """
+
+    MAX_OPERATIONS = 500
+    WRITE_TYPES = {"IN", "OUT"}
+
+    # Cada operación es un escaneo completo: el presupuesto crece con el lote
+    query_budget = 10
+    query_budget_per_operation = 32
+
+    def post(self, request):
+        # Un cuerpo JSON que no es un objeto ([1, 2], "x"...) no trae 'operations'
+        data = request.data if isinstance(request.data, dict) else {}
+        operations = data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return self._error("invalid_operations", "Se espera una lista 'operations'.")
+        if len(operations) > self.MAX_OPERATIONS:
             return self._error(
-                "unknown_type",
-                f"Tipo de movimiento no soportado: {mtype}",
+                "too_many_operations",
+                f"Máximo {self.MAX_OPERATIONS} operaciones por lote.",
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        try:
+            tenant_id = get_tenant_from_request(request)
+            querycount.set_budget(
+                request, self.query_budget + self.query_budget_per_operation * len(operations)
+            )
+
+            AppMeta.objects.get_or_create(
+                tenant_id=tenant_id,
+                defaults={
+                    "schema_version": 1,
+                    "app_version": "0.1-alpha (tester-local)",
+                },
             )
 
+            if writer.enabled():
+                try:
+                    results = writer.writer.run(
+                        tenant_id,
+                        self._apply_all,
+                        request,
+                        operations,
+                        tenant_id,
+                        timeout=settings.SCAN_WRITER_TIMEOUT,
+                    )
+                except (writer.WriterBusy, writer.WriterTimeout):
+                    return self._busy()
+            else:
+                with transaction.atomic():
+                    results = self._apply_all(request, operations, tenant_id)
+
         except Exception:
-            # Hardening de seguridad:
-            # - No devolvemos trazas ni nombres de excepciones al cliente.
-            # - Mensaje genérico para el usuario.
-            return Response(
-                {
+            return self._server_error()
+
+        summary = {"applied": 0, "conflict": 0, "retry": 0}
+        for r in results:
+            summary[r["result"]] += 1
+        return Response({"ok": summary["retry"] == 0, "summary": summary, "results": results})
+
+    def _apply_all(self, request, operations, tenant_id):
+        results = []
+        blocked = False
+        for index, op in enumerate(operations):
+            key = op.get(idempotency.FIELD) if isinstance(op, dict) else None
+            result = {"index": index, "idempotency_key": key}
+
+            # Tras un error temporal no se sigue: las siguientes operaciones
+            # podrían depender de ella (p. ej. una entrada y luego su salida)
+            if blocked:
+                results.append(dict(result, result="retry", status=None, response={
+                    "ok": False,
+                    "error": "not_attempted",
+                    "detail": "Pendiente de una operación anterior.",
+                }))
+                continue
+
+            if not key:
+                results.append(dict(result, result="conflict", status=400, response={
+                    "ok": False,
+                    "error": "missing_idempotency_key",
+                    "detail": "Cada operación necesita su idempotency_key.",
+                }))
+                continue
+
+            mtype = str(op.get("movement_type") or op.get("type") or "OUT").strip().upper()
+            if self.TYPE_MAP.get(mtype, mtype) not in self.WRITE_TYPES:
+                results.append(dict(result, result="conflict", status=400, response={
+                    "ok": False,
+                    "error": "unsupported_type",
+                    "detail": "Solo se sincronizan entradas y salidas.",
+                }))
+                continue
+
+            try:
+                with transaction.atomic():
+                    response = self._scan(_QueuedScan(request, op), tenant_id)
+            except (ValidationError, ValueError, TypeError):
+                # Datos inválidos: reenviarla igual volvería a fallar, y no
+                # debe bloquear el resto del lote
+                results.append(dict(result, result="conflict", status=400, response={
+                    "ok": False,
+                    "error": "invalid_operation",
+                    "detail": "La operación tiene datos no válidos.",
+                }))
+                continue
+            except Exception:
+                results.append(dict(result, result="retry", status=500, response={
                     "ok": False,
                     "error": "server_error",
                     "detail": "Ha ocurrido un error interno. Inténtalo de nuevo más tarde.",
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+                }))
+                blocked = True
+                continue
+
+            code = response.status_code
+            if code < 300:
+                outcome = "applied"
+            elif code >= 500 or code in idempotency.NOT_STORED:
+                outcome = "retry"
+                blocked = True
+            else:
+                outcome = "conflict"
+            results.append(dict(
+                result,
+                result=outcome,
+                status=code,
+                replayed=response.headers.get("Idempotent-Replayed") == "true",
+                response=response.data,
+            ))
+        return results
 
 
 # -------------------------------------------------------------------
@@ -998,7 +1358,24 @@ urlpatterns = [
     path("locations/delete/<int:loc_id>/", LocationDeleteView.as_view()),
     # --- Scan y buscador rápido ---
     path("scan/", ScanEndpoint.as_view()),
+    path("scan/bulk/", ScanBulkEndpoint.as_view()),
     path("products/search/", ProductQuickSearch.as_view()),
+    # --- Catálogo para copias locales (sincronización incremental) ---
+    path("catalog/sync/", CatalogSyncView.as_view()),
+    # --- Versiones asíncronas (ASGI) ---
+    path("scan/async/", scan_async),
+    path("products/search/async/", product_search_async),
+    # --- Informes ---
+    path("reports/valuation/", ValuationReportView.as_view()),
+    path("reports/valuation/export/", ValuationExportView.as_view()),
+    path("reports/forecasts/", ForecastListView.as_view()),
+    # --- Analítica (rollup diario) ---
+    path("analytics/consumption/", ConsumptionSeriesView.as_view()),
+    path("analytics/consumption/top/", ConsumptionTopView.as_view()),
+    # --- Importación masiva ---
+    path("import/", InventoryImportView.as_view()),
+    # --- Exportación en streaming ---
+    path("export/<str:entity>.<str:fmt>", InventoryExportView.as_view()),
     # --- Resto de endpoints REST estándar ---
     path("", include(router.urls)),
 ]
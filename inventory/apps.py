@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Registra los receivers de invalidación de cachés (versión por
+        # tenant), de mantenimiento del rollup diario, de tombstones del
+        # catálogo y el perfil SQLite
+        from . import tenant_cache, valuation, rollups, catalog, db  # noqa: F401
+        from . import metrics, querycount, replicas, slowlog
+
+        # Contador de consultas por petición (inactivo sin QueryRecorder abierto)
+        querycount.install()
+        # Espera por el lock de la BD y movimientos confirmados (/metrics)
+        metrics.install()
+        # Consultas por encima de SLOW_QUERY_MS, con su plan
+        slowlog.install()
+        # Lectura de lo escrito con réplica (DATABASE_REPLICA_PIN_SECONDS)
+        replicas.install()
@@ -0,0 +1,152 @@
+"""
+Vistas asíncronas de escaneo y búsqueda (para servir con ASGI).
+
+Pensadas para flotas de lectores: con ASGI, la autenticación, la búsqueda,
+la espera al escritor y la espera a un cliente lento no ocupan un hilo del
+servidor.
+
+- POST /api/scan/async/: misma entrada y salida que /api/scan/. La
+  autenticación se resuelve con el ORM asíncrono; la validación del
+  escaneo (y las auditorías, que solo leen) se ejecutan con ScanEndpoint en
+  un hilo del executor, que queda libre en cuanto envía la escritura IN/OUT
+  al escritor único (inventory/writer.py, orden FIFO por tenant). El
+  resultado se espera en el bucle de eventos: cola llena o sin empezar a
+  aplicarse en SCAN_WRITER_TIMEOUT segundos → 503 busy.
+- GET /api/products/search/async/?q=: como /api/products/search/ (también
+  lee de la réplica, ver inventory/replicas.py).
+"""
+import base64
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .exporter import build_paths
+from .querycount import query_budget
+from .locations_api import DEFAULT_TENANT
+from .models import Location, Organization, Product
+from .replicas import read_only
+
+
+def _error(code, detail, status):
+    return JsonResponse({"ok": False, "error": code, "detail": detail}, status=status)
+
+
+async def _auser(request):
+    """
+    Usuario de la sesión o, si no hay, de la cabecera Basic
+    (las mismas autenticaciones que REST_FRAMEWORK). El usuario Basic queda
+    fijado en la petición para que ScanEndpoint no vuelva a comprobar la
+    contraseña (un hash por escaneo, no dos).
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if header[:6].lower() == "basic ":
+        try:
+            decoded = base64.b64decode(header[6:]).decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            return None
+        username, _, password = decoded.partition(":")
+        user = await aauthenticate(request, username=username, password=password)
+        if user is not None and user.is_active:
+            # rest_framework.request.Request usa estas credenciales en vez
+            # de sus autenticadores (como force_authenticate en las pruebas)
+            request._force_auth_user = user
+            return user
+    return None
+
+
+async def _atenant(user):
+    tenant_id = await (
+        Organization.objects.filter(owner_id=user.pk).values_list("id", flat=True).afirst()
+    )
+    return tenant_id or DEFAULT_TENANT
+
+
+def _scan_sync(request):
+    # ScanEndpoint hace la validación y el formato de respuesta; IN/OUT
+    # devuelven PendingWrite sin esperar al escritor. El resto se renderiza
+    # aquí para no volver a pasar por un hilo
+    from .api import PendingWrite, ScanEndpoint
+
+    # En los hilos del executor no llegan request_started/finished:
+    # se descartan aquí las conexiones caducadas o rotas
+    close_old_connections()
+    try:
+        response = ScanEndpoint.as_view(defer_writes=True)(request)
+        if hasattr(response, "render") and not isinstance(response, PendingWrite):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+@csrf_exempt
+@require_POST
+@query_budget(32)  # ScanEndpoint lo ajusta según el tipo
+async def scan_async(request):
+    user = await _auser(request)
+    if user is None:
+        return _error("not_authenticated", "Autenticación requerida.", 403)
+
+    from .api import PendingWrite
+
+    response = await sync_to_async(_scan_sync, thread_sensitive=False)(request)
+    if isinstance(response, PendingWrite):
+        # La espera al escritor no ocupa ningún hilo
+        response = await response.view.finish_write(response)
+    return response
+
+
+@require_GET
+@query_budget(6)
+async def product_search_async(request):
+    user = await _auser(request)
+    if user is None:
+        return _error("not_authenticated", "Autenticación requerida.", 403)
+
+    q = (request.GET.get("q") or "").strip()
+    if not q:
+        return JsonResponse({"results": []})
+
+    tenant_id = await _atenant(user)
+
+    with read_only():
+        products = [
+            p
+            async for p in Product.objects.filter(tenant_id=tenant_id, name__icontains=q)
+            .only("id", "name", "sku", "category", "location_id")
+            .order_by("name")[:20]
+        ]
+
+        paths = {}
+        if any(p.location_id for p in products):
+            rows = {
+                loc_id: (parent_id, name)
+                async for loc_id, parent_id, name in Location.objects.filter(
+                    tenant_id=tenant_id
+                ).values_list("id", "parent_id", "name")
+            }
+            paths = build_paths(rows)
+
+    return JsonResponse(
+        {
+            "results": [
+                {
+                    "id": str(p.id),
+                    "name": p.name,
+                    "sku": p.sku,
+                    "payload": f"PRD:{p.id}",
+                    "category": p.category,
+                    "location": paths.get(p.location_id) if p.location_id else None,
+                }
+                for p in products
+            ]
+        }
+    )
@@ -0,0 +1,179 @@
+"""
+Sincronización incremental del catálogo (productos, ubicaciones,
+categorías y unidades) para las copias locales de los clientes.
+
+- Product y Location guardan updated_at (auto_now); los borrados dejan
+  un CatalogTombstone.
+- El cliente guarda la marca de agua ("watermark") de la última respuesta
+  y la envía como ?since=. Se devuelven las filas con updated_at posterior
+  a since - CATALOG_SYNC_OVERLAP_SECONDS: el solape cubre transacciones
+  que se confirmaron después de la consulta anterior con un updated_at
+  más antiguo. El cliente hace upsert, así que recibir una fila dos veces
+  no importa.
+- Sin since, o si es anterior a la retención de tombstones, se devuelve el
+  catálogo completo (full=true) y el cliente reemplaza su copia.
+- Las ubicaciones se envían sin ruta (id, parent_id, name) y los productos
+  con location_id: renombrar una ubicación solo cambia esa fila y el
+  cliente recompone las rutas.
+"""
+import threading
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CatalogTombstone, Location, Product
+
+PRODUCT_FIELDS = (
+    "id",
+    "name",
+    "sku",
+    "category",
+    "unit",
+    "brand",
+    "min_stock",
+    "qr_payload",
+    "location_id",
+    "updated_at",
+)
+LOCATION_FIELDS = ("id", "public_id", "name", "parent_id", "updated_at")
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def overlap():
+    return timedelta(seconds=getattr(settings, "CATALOG_SYNC_OVERLAP_SECONDS", 30))
+
+
+def tombstone_ttl():
+    return timedelta(days=getattr(settings, "CATALOG_TOMBSTONE_TTL_DAYS", 30))
+
+
+def parse_watermark(raw):
+    """Marca de agua ISO 8601 → datetime aware, None si no hay. ValueError si es inválida."""
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    value = parse_datetime(raw.replace(" ", "+"))  # '+' llega como espacio en la query
+    if value is None:
+        raise ValueError(raw)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+# =========================
+#  Consulta
+# =========================
+
+def _vocabulary(tenant_id):
+    """Categorías y unidades distintas en una sola consulta."""
+    categories, units = set(), set()
+    for category, unit in (
+        Product.objects.filter(tenant_id=tenant_id).values_list("category", "unit").distinct()
+    ):
+        if category:
+            categories.add(category)
+        if unit:
+            units.add(unit)
+    return sorted(categories), sorted(units)
+
+
+def _deleted(tenant_id, kind, since):
+    return list(
+        CatalogTombstone.objects.filter(
+            tenant_id=tenant_id, kind=kind, deleted_at__gt=since
+        ).values_list("object_id", flat=True)
+    )
+
+
+def changes(tenant_id, since=None, now=None):
+    """
+    Cambios del catálogo desde `since` (o el catálogo completo).
+    `categories` y `units` son None cuando no ha cambiado ningún producto.
+    """
+    now = now or timezone.now()
+    full = since is None or since - overlap() < now - tombstone_ttl()
+
+    products = Product.objects.filter(tenant_id=tenant_id)
+    locations = Location.objects.filter(tenant_id=tenant_id)
+    if not full:
+        cutoff = since - overlap()
+        products = products.filter(updated_at__gt=cutoff)
+        locations = locations.filter(updated_at__gt=cutoff)
+
+    product_rows = list(products.order_by("updated_at").values(*PRODUCT_FIELDS))
+    location_rows = list(locations.order_by("updated_at").values(*LOCATION_FIELDS))
+
+    if full:
+        deleted_products, deleted_locations = [], []
+    else:
+        deleted_products = _deleted(tenant_id, CatalogTombstone.KIND_PRODUCT, cutoff)
+        deleted_locations = _deleted(tenant_id, CatalogTombstone.KIND_LOCATION, cutoff)
+
+    categories = units = None
+    if full or product_rows or deleted_products:
+        categories, units = _vocabulary(tenant_id)
+
+    return {
+        "full": full,
+        # Se toma antes de las consultas: lo escrito mientras tanto se
+        # vuelve a enviar en la siguiente sincronización
+        "watermark": now,
+        "products": {"upserts": product_rows, "deleted": deleted_products},
+        "locations": {"upserts": location_rows, "deleted": deleted_locations},
+        "categories": categories,
+        "units": units,
+    }
+
+
+# =========================
+#  Tombstones
+# =========================
+
+@receiver(pre_delete, sender=Location)
+def _touch_location_dependents(sender, instance, **kwargs):
+    # El SET_NULL de hijos y productos es un UPDATE que no pasa por save():
+    # se marcan como modificados para que el cliente reciba el cambio
+    now = timezone.now()
+    Location.objects.filter(parent_id=instance.pk).update(updated_at=now)
+    Product.objects.filter(location_id=instance.pk).update(updated_at=now)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Location)
+def _record_deletion(sender, instance, **kwargs):
+    kind = (
+        CatalogTombstone.KIND_PRODUCT if sender is Product else CatalogTombstone.KIND_LOCATION
+    )
+    CatalogTombstone.objects.create(
+        tenant_id=instance.tenant_id,
+        kind=kind,
+        object_id=str(instance.pk),
+    )
+    maybe_purge()
+
+
+def purge_tombstones(now=None):
+    cutoff = (now or timezone.now()) - tombstone_ttl()
+    deleted, _ = CatalogTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+def maybe_purge():
+    """Purga como mucho una vez por CATALOG_TOMBSTONE_PURGE_INTERVAL segundos."""
+    global _last_purge
+    interval = getattr(settings, "CATALOG_TOMBSTONE_PURGE_INTERVAL", 3600)
+    now = time.monotonic()
+    if now - _last_purge < interval or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _last_purge = now
+        purge_tombstones()
+    finally:
+        _purge_lock.release()
@@ -0,0 +1,37 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from .locations_api import get_tenant_from_request
+from . import catalog
+
+
+class CatalogSyncView(APIView):
+    """
+    GET /api/catalog/sync/?since=<watermark>
+
+    Catálogo del tenant para copias locales (PWA, lectores): productos,
+    ubicaciones, categorías y unidades. Sin `since` devuelve todo
+    (full=true); con la `watermark` de la respuesta anterior, solo lo
+    modificado o borrado desde entonces. Ver inventory.catalog.
+    """
+
+    permission_classes = [IsAuthenticated]
+    query_budget = 8
+
+    def get(self, request):
+        tenant_id = get_tenant_from_request(request)
+
+        try:
+            since = catalog.parse_watermark(request.GET.get("since"))
+        except ValueError:
+            return Response(
+                {"ok": False, "error": "invalid_since", "detail": "Marca de agua inválida."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        data = catalog.changes(tenant_id, since)
+        response = Response({"ok": True, **data})
+        response["Cache-Control"] = "private, no-cache"
+        return response
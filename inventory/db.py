@@ -0,0 +1,100 @@
+"""
+Perfil de conexión de la BD.
+
+Cada conexión nueva a una BD SQLite recibe los PRAGMA de
+settings.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, cachés, busy_timeout...).
+Las transacciones de escritura usan BEGIN IMMEDIATE vía
+DATABASES[...]["OPTIONS"]["transaction_mode"] (ver settings.py).
+
+La conexión de lectura (alias "replica" con READ_ONLY, ver
+inventory/replicas.py) recibe settings.SQLITE_READ_PRAGMAS: query_only y
+sin journal_mode/synchronous, que solo afectan a quien escribe.
+
+PostgreSQL: las conexiones de un proceso que atiende peticiones (los
+puntos de entrada de smart_inventory/wsgi.py y asgi.py llaman a
+serve_requests()) reciben statement_timeout = POSTGRES_STATEMENT_TIMEOUT_MS.
+Los comandos de gestión (migrate, fusiones, previsiones, backfills) no
+tienen límite: sus sentencias largas son esperadas.
+"""
+import weakref
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Orden de aplicación: journal_mode primero, el resto depende de él
+PRAGMA_ORDER = (
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "wal_autocheckpoint",
+    "foreign_keys",
+)
+
+
+def apply_pragmas(cursor, pragmas):
+    """
+    Ejecuta los PRAGMA indicados sobre un cursor DB-API de SQLite.
+    Los valores None se ignoran. Devuelve lo que SQLite ha aceptado.
+    """
+    applied = {}
+    names = [n for n in PRAGMA_ORDER if n in pragmas] + [
+        n for n in pragmas if n not in PRAGMA_ORDER
+    ]
+    for name in names:
+        value = pragmas[name]
+        if value is None or value == "":
+            continue
+        cursor.execute(f"PRAGMA {name} = {value}")
+        row = cursor.fetchone()
+        applied[name] = row[0] if row else value
+    return applied
+
+
+_serving = False
+_timed_connections = weakref.WeakSet()
+
+
+def serve_requests():
+    """El proceso atiende peticiones: sus conexiones nuevas llevan statement_timeout."""
+    global _serving
+    _serving = True
+
+
+@receiver(connection_created)
+def _configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    if connection.settings_dict.get("READ_ONLY"):
+        pragmas = getattr(settings, "SQLITE_READ_PRAGMAS", None)
+    else:
+        pragmas = getattr(settings, "SQLITE_PRAGMAS", None)
+    if not pragmas:
+        return
+    # En BD en memoria (tests) SQLite ignora WAL y se queda en "memory"
+    cursor = connection.connection.cursor()
+    try:
+        apply_pragmas(cursor, pragmas)
+    finally:
+        cursor.close()
+
+
+@receiver(connection_created)
+def _configure_postgresql(sender, connection, **kwargs):
+    if connection.vendor != "postgresql" or not _serving:
+        return
+    timeout = getattr(settings, "POSTGRES_STATEMENT_TIMEOUT_MS", 0)
+    if not timeout:
+        return
+    # Con POSTGRES_POOL la señal llega cada vez que se presta una conexión
+    # del pool: solo se configura la primera vez
+    raw = connection.connection
+    if raw in _timed_connections:
+        return
+    # set_config en lugar de SET: admite parámetros enlazados
+    with raw.cursor() as cursor:
+        cursor.execute("SELECT set_config('statement_timeout', %s, false)", [str(int(timeout))])
+    _timed_connections.add(raw)
@@ -0,0 +1,58 @@
+"""
+Ajuste de demanda por producto.
+
+Este módulo no importa Django: joblib lo carga en procesos hijos que
+no tienen el registro de apps inicializado.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_LEAD_TIME_DAYS = 7
+# Factor de suavizado exponencial del nivel de demanda
+SMOOTHING_ALPHA = 0.3
+
+
+def fit_series(series, stock, lead_time_days=DEFAULT_LEAD_TIME_DAYS, z=1.645):
+    """
+    Ajuste ligero de una serie diaria:
+    - nivel por suavizado exponencial,
+    - tendencia por regresión lineal (scikit-learn),
+    - stock de seguridad z * sigma * sqrt(lead time).
+
+    Devuelve un dict con los campos de ProductForecast.
+    """
+    from sklearn.linear_model import LinearRegression
+
+    n = len(series)
+    avg = float(series.mean()) if n else 0.0
+    std = float(series.std(ddof=1)) if n > 1 else 0.0
+
+    # Pesos alpha * (1 - alpha)^k, el día más reciente pesa más
+    weights = SMOOTHING_ALPHA * (1 - SMOOTHING_ALPHA) ** np.arange(n - 1, -1, -1)
+    level = float((weights * series).sum() / weights.sum()) if n else 0.0
+
+    trend = 0.0
+    if n > 1 and series.any():
+        days = np.arange(n, dtype=np.float64).reshape(-1, 1)
+        trend = float(LinearRegression().fit(days, series).coef_[0])
+
+    rate = max(level + trend * lead_time_days / 2.0, 0.0)
+    safety = z * std * math.sqrt(lead_time_days)
+    reorder_point = rate * lead_time_days + safety
+
+    return {
+        "avg_daily_demand": round(avg, 4),
+        "demand_std": round(std, 4),
+        "trend": round(trend, 6),
+        "forecast_daily_demand": round(rate, 4),
+        "suggested_min_stock": int(math.ceil(reorder_point)),
+        "days_until_stockout": round(stock / rate, 1) if rate > 0 else None,
+    }
+
+
+def fit_chunk(matrix, stocks, lead_time_days, z):
+    return [
+        fit_series(matrix[i], stocks[i], lead_time_days=lead_time_days, z=z)
+        for i in range(matrix.shape[0])
+    ]
@@ -0,0 +1,305 @@
+"""
+Fusión de productos duplicados (ver `manage.py merge_product_duplicates`).
+
+Duplicados: mismo (tenant_id, location_id, name_normalized). La restricción
+uniq_product_per_location_tenant_norm solo los deja pasar sin ubicación
+(NULL no colisiona) o en BD anteriores a ella. El canónico de cada grupo es
+el de id menor; el resto se fusiona en él.
+
+- summary(): grupos y sobrantes por tenant con un GROUP BY.
+- find_duplicates(): una consulta con funciones ventana devuelve cada
+  sobrante del tenant con su canónico, sin cargar el resto de productos.
+- merge_chunk(): en una transacción por bloque, lotes y movimientos se
+  re-apuntan con un único UPDATE ... CASE cada uno, se reconstruye el
+  rollup diario de los productos afectados, se borra la previsión del
+  canónico (refresh_forecasts la recalcula entera) y se borran los
+  sobrantes con el ORM (tombstones del catálogo, invalidación de la
+  valoración). Sus imágenes QR se borran al confirmar.
+- merge_tenants(): un tenant por hilo con workers > 1 (útil en PostgreSQL;
+  en SQLite las escrituras se serializan igualmente).
+
+Casi duplicados ("Leche entera 1L" / "leche entera 1 l"), ver
+`manage.py find_near_duplicates`:
+
+- find_near_duplicates(): TF-IDF de n-gramas de caracteres de los nombres
+  normalizados (scikit-learn), similitud coseno con productos de matrices
+  dispersas dentro de cada bloque (tenant + ubicación, o todo el tenant) y
+  sugerencias de fusión por encima del umbral. Los pares cuyos números no
+  coinciden ("1 L" / "2 L") no se sugieren.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, F, Value, When, Window
+from django.db.models.functions import FirstValue
+
+from . import rollups, valuation
+from .models import Batch, Movement, Product, ProductForecast, normalize_name
+
+DEFAULT_CHUNK_SIZE = 500
+
+GROUP_FIELDS = ("location_id", "name_normalized")
+
+
+def summary(tenant_id=None):
+    """{tenant_id: {"groups": n, "duplicates": n}} de los tenants con duplicados."""
+    qs = Product.objects.all()
+    if tenant_id:
+        qs = qs.filter(tenant_id=tenant_id)
+    groups = (
+        qs.order_by()
+        .values("tenant_id", *GROUP_FIELDS)
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("tenant_id", "n")
+    )
+    result = {}
+    for tenant, n in groups:
+        entry = result.setdefault(tenant, {"groups": 0, "duplicates": 0})
+        entry["groups"] += 1
+        entry["duplicates"] += n - 1
+    return result
+
+
+def find_duplicates(tenant_id):
+    """
+    [(id, canonical_id, qr_image)] de los productos sobrantes del tenant,
+    agrupados por canónico.
+    """
+    partition = [F(name) for name in GROUP_FIELDS]
+    rows = (
+        Product.objects.filter(tenant_id=tenant_id)
+        .annotate(
+            group_size=Window(Count("id"), partition_by=partition),
+            canonical_id=Window(FirstValue("id"), partition_by=partition, order_by=F("id").asc()),
+        )
+        .filter(group_size__gt=1)
+        .order_by()
+        .values_list("id", "canonical_id", "qr_image")
+    )
+    pairs = [row for row in rows if row[0] != row[1]]
+    pairs.sort(key=lambda row: (row[1], row[0]))
+    return pairs
+
+
+def _repoint(pairs):
+    """CASE product_id WHEN sobrante THEN canónico ... para un UPDATE."""
+    return Case(
+        *[When(product_id=loser, then=Value(canonical)) for loser, canonical, _ in pairs],
+        output_field=models.UUIDField(),
+    )
+
+
+def _delete_files(names):
+    storage = Product._meta.get_field("qr_image").storage
+    # Por si otro producto apunta al mismo fichero
+    names = set(names) - set(Product.objects.filter(qr_image__in=names).values_list("qr_image", flat=True))
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            pass
+    return len(names)
+
+
+def merge_chunk(tenant_id, pairs):
+    """
+    Fusiona un bloque de (id, canonical_id, qr_image) en una transacción.
+    Devuelve {"merged", "batches", "movements", "qr_files"}.
+    """
+    losers = [loser for loser, _, _ in pairs]
+    canonicals = sorted({canonical for _, canonical, _ in pairs})
+    files = [qr for _, _, qr in pairs if qr]
+
+    with transaction.atomic():
+        batches = Batch.objects.filter(product_id__in=losers).update(product_id=_repoint(pairs))
+        movements = Movement.objects.filter(product_id__in=losers).update(product_id=_repoint(pairs))
+        if movements:
+            # Las filas de un sobrante y su canónico pueden caer en el mismo día
+            rollups.backfill(tenant_id, product_ids=losers + canonicals)
+        ProductForecast.objects.filter(product_id__in=canonicals).delete()
+        Product.objects.filter(id__in=losers).delete()
+        valuation.invalidate(tenant_id)
+        if files:
+            transaction.on_commit(lambda: _delete_files(files))
+
+    return {"merged": len(losers), "batches": batches, "movements": movements, "qr_files": len(files)}
+
+
+def merge_tenant(tenant_id, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, on_progress=None):
+    """
+    Fusiona los duplicados de un tenant en bloques de `chunk_size`
+    sobrantes (un grupo no se parte entre bloques). on_progress(result)
+    tras cada bloque.
+    """
+    pairs = find_duplicates(tenant_id)
+    result = {
+        "tenant_id": tenant_id,
+        "duplicates": len(pairs),
+        "groups": len({canonical for _, canonical, _ in pairs}),
+        "merged": 0,
+        "batches": 0,
+        "movements": 0,
+        "qr_files": 0,
+        "pairs": pairs,
+    }
+    if dry_run:
+        return result
+
+    start = 0
+    while start < len(pairs):
+        end = min(start + chunk_size, len(pairs))
+        while end < len(pairs) and pairs[end][1] == pairs[end - 1][1]:
+            end += 1
+        counts = merge_chunk(tenant_id, pairs[start:end])
+        for key, value in counts.items():
+            result[key] += value
+        start = end
+        if on_progress:
+            on_progress(result)
+    return result
+
+
+def _merge_in_thread(tenant_id, **kwargs):
+    try:
+        return merge_tenant(tenant_id, **kwargs)
+    finally:
+        # Cada hilo abre su propia conexión
+        connections.close_all()
+
+
+def merge_tenants(tenant_ids, workers=1, **kwargs):
+    """merge_tenant() de cada tenant; con workers > 1, en paralelo. Devuelve los resultados."""
+    if workers <= 1 or len(tenant_ids) <= 1:
+        return [merge_tenant(tenant_id, **kwargs) for tenant_id in tenant_ids]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="merge-duplicates") as pool:
+        return list(pool.map(lambda tenant_id: _merge_in_thread(tenant_id, **kwargs), tenant_ids))
+
+
+# =========================
+#  Casi duplicados
+# =========================
+
+DEFAULT_SIMILARITY = 0.85
+# Celdas (filas x columnas) por multiplicación: acota la memoria en bloques grandes
+MAX_BLOCK_CELLS = 2_000_000
+
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+_DIGIT_LETTER = re.compile(r"(?<=\d)(?=[a-z])|(?<=[a-z])(?=\d)")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_NON_ALNUM = re.compile(r"[^a-z0-9.]+|(?<!\d)\.|\.(?!\d)")
+
+
+def fuzzy_key(name):
+    """
+    (texto, números) de un nombre: "Leche Entera 1,5L" -> ("leche entera 1.5 l", ("1.5",)).
+    """
+    text = _DECIMAL_COMMA.sub(".", normalize_name(name))
+    text = _DIGIT_LETTER.sub(" ", text)
+    text = " ".join(_NON_ALNUM.sub(" ", text).split())
+    return text, tuple(_NUMBER.findall(text))
+
+
+def _similar_pairs(matrix, block, numbers, threshold):
+    """
+    (i, j, similitud) con i < j dentro del bloque (índices de fila de
+    matrix) y similitud >= threshold. Las filas están normalizadas (L2):
+    el producto escalar es la similitud coseno.
+    """
+    sub = matrix[block]
+    n = len(block)
+    step = max(1, MAX_BLOCK_CELLS // n)
+    for start in range(0, n, step):
+        sims = (sub[start:start + step] @ sub.T).tocoo()
+        rows = sims.row + start
+        keep = (sims.col > rows) & (sims.data >= threshold)
+        for r, c, value in zip(rows[keep], sims.col[keep], sims.data[keep]):
+            i, j = block[r], block[c]
+            if numbers[i] == numbers[j]:
+                yield i, j, float(value)
+
+
+def _clusters(pairs):
+    """Componentes conexas (union-find) de los pares similares."""
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, _ in pairs:
+        a, b = find(i), find(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for x in parent:
+        groups.setdefault(find(x), []).append(x)
+    return list(groups.values())
+
+
+def find_near_duplicates(tenant_id, threshold=DEFAULT_SIMILARITY, scope="location"):
+    """
+    Sugerencias de fusión del tenant, de más a menos parecidas:
+    [{"tenant_id", "location_id", "similarity",
+      "canonical": {"id", "name"},
+      "duplicates": [{"id", "name", "similarity"}]}]
+
+    scope="location" solo compara productos de la misma ubicación;
+    scope="tenant" compara todo el tenant. El canónico es el de id menor,
+    como en merge_product_duplicates.
+    """
+    # scikit-learn tarda en importarse: solo cuando se usa
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    import numpy as np
+
+    rows = list(
+        Product.objects.filter(tenant_id=tenant_id)
+        .order_by("location_id", "id")
+        .values_list("id", "name", "location_id")
+    )
+    if len(rows) < 2:
+        return []
+
+    keys = [fuzzy_key(name) for _, name, _ in rows]
+    vectorizer = TfidfVectorizer(
+        analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True, dtype=np.float32
+    )
+    try:
+        matrix = vectorizer.fit_transform([text for text, _ in keys]).tocsr()
+    except ValueError:
+        return []  # nombres vacíos: vocabulario vacío
+    numbers = [nums for _, nums in keys]
+
+    if scope == "tenant":
+        blocks = [list(range(len(rows)))]
+    else:
+        by_location = {}
+        for index, (_, _, location_id) in enumerate(rows):
+            by_location.setdefault(location_id, []).append(index)
+        blocks = list(by_location.values())
+
+    suggestions = []
+    for block in blocks:
+        if len(block) < 2:
+            continue
+        for members in _clusters(_similar_pairs(matrix, block, numbers, threshold)):
+            members.sort(key=lambda i: rows[i][0])
+            canonical, others = members[0], members[1:]
+            sims = (matrix[others] @ matrix[canonical].T).toarray().ravel()
+            duplicates = [
+                {"id": rows[i][0], "name": rows[i][1], "similarity": round(float(sim), 4)}
+                for i, sim in zip(others, sims)
+            ]
+            suggestions.append({
+                "tenant_id": tenant_id,
+                "location_id": rows[canonical][2],
+                "similarity": min(d["similarity"] for d in duplicates),
+                "canonical": {"id": rows[canonical][0], "name": rows[canonical][1]},
+                "duplicates": duplicates,
+            })
+    suggestions.sort(key=lambda s: (-s["similarity"], str(s["canonical"]["id"])))
+    return suggestions
@@ -0,0 +1,53 @@
+from datetime import date
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from .locations_api import get_tenant_from_request
+from . import exporter
+from .replicas import ReplicaReadMixin, iter_read_only
+
+
+class InventoryExportView(ReplicaReadMixin, APIView):
+    """
+    GET /api/export/<entity>.<fmt>?since=YYYY-MM-DD
+    entity: products | batches | movements | locations
+    fmt: csv | ndjson | parquet (si pyarrow está instalado)
+    since: movimientos creados o productos/ubicaciones modificados desde
+    esa fecha; no se admite con batches (400).
+    La respuesta se genera en streaming con memoria constante.
+    """
+
+    permission_classes = [IsAuthenticated]
+    query_budget = 8
+
+    def get(self, request, entity, fmt):
+        tenant_id = get_tenant_from_request(request)
+
+        since = None
+        if request.GET.get("since"):
+            try:
+                since = date.fromisoformat(request.GET["since"])
+            except ValueError:
+                return Response(
+                    {"ok": False, "error": "invalid_since", "detail": "Fecha inválida."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            body = exporter.stream(entity, fmt, tenant_id, since=since)
+        except exporter.ExportError as e:
+            return Response(
+                {"ok": False, "error": "invalid_export", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # El cuerpo se genera fuera de la vista: también desde la réplica
+        response = StreamingHttpResponse(iter_read_only(body), content_type=exporter.CONTENT_TYPES[fmt])
+        stamp = timezone.localdate().isoformat()
+        response["Content-Disposition"] = f'attachment; filename="{entity}-{stamp}.{fmt}"'
+        return response
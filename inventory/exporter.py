@@ -0,0 +1,337 @@
+"""
+Exportación en streaming del inventario (CSV, NDJSON y Parquet).
+
+Las filas se leen con values_list().iterator(chunk_size=...) y se
+serializan bloque a bloque, así que la memoria no depende del nº de
+filas exportadas. Parquet necesita 'pyarrow' (opcional) y escribe un
+row group por bloque.
+"""
+import csv
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Batch, Location, Movement, Product
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = ("csv", "ndjson", "parquet")
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportError(Exception):
+    """Entidad/formato no soportado o falta una dependencia opcional."""
+
+
+# =========================
+#  Definición de entidades
+# =========================
+
+# (columna, lookup del ORM, tipo). Todas las entidades llevan una columna
+# "location_path" que se calcula con el árbol cargado una vez.
+ENTITIES = {
+    "products": (
+        Product,
+        [
+            ("id", "id", "uuid"),
+            ("sku", "sku", "str"),
+            ("name", "name", "str"),
+            ("category", "category", "str"),
+            ("unit", "unit", "str"),
+            ("min_stock", "min_stock", "int"),
+            ("location_id", "location_id", "int"),
+            ("location_path", None, "str"),
+            ("brand", "brand", "str"),
+            ("origin", "origin", "str"),
+            ("primary_color", "primary_color", "str"),
+            ("dimensions", "dimensions", "str"),
+            ("estimated_value", "estimated_value", "float"),
+            ("expiration_date", "expiration_date", "date"),
+            ("qr_payload", "qr_payload", "str"),
+        ],
+    ),
+    "batches": (
+        Batch,
+        [
+            ("id", "id", "int"),
+            ("product_id", "product_id", "uuid"),
+            ("product", "product__name", "str"),
+            ("location_id", "product__location_id", "int"),
+            ("location_path", None, "str"),
+            ("quantity", "quantity", "int"),
+            ("entry_date", "entry_date", "date"),
+            ("expiration_date", "expiration_date", "date"),
+            ("opened_units", "opened_units", "int"),
+            ("open_expires_at", "open_expires_at", "datetime"),
+            ("is_depleted", "is_depleted", "bool"),
+            ("brand", "brand", "str"),
+            ("origin", "origin", "str"),
+            ("estimated_value", "estimated_value", "float"),
+            ("notes", "notes", "str"),
+        ],
+    ),
+    "movements": (
+        Movement,
+        [
+            ("id", "id", "uuid"),
+            ("created_at", "created_at", "datetime"),
+            ("movement_type", "movement_type", "str"),
+            ("product_id", "product_id", "uuid"),
+            ("product", "product__name", "str"),
+            ("location_id", "location_id", "int"),
+            ("location_path", None, "str"),
+            ("quantity", "quantity", "int"),
+            ("created_by_id", "created_by_id", "int"),
+            ("metadata", "metadata", "json"),
+        ],
+    ),
+    "locations": (
+        Location,
+        [
+            ("id", "id", "int"),
+            ("public_id", "public_id", "uuid"),
+            ("name", "name", "str"),
+            ("parent_id", "parent_id", "int"),
+            ("location_path", None, "str"),
+        ],
+    ),
+}
+
+# Columna por la que filtra `since` en cada entidad. Los lotes no guardan
+# cuándo cambiaron (entry_date es la fecha de entrada, no de la última
+# modificación): con `since` se rechazan en lugar de exportarlos todos.
+SINCE_FIELDS = {
+    "products": "updated_at",
+    "movements": "created_at",
+    "locations": "updated_at",
+}
+
+
+def location_paths(tenant_id, sep=" > "):
+    """
+    {id: 'Raíz > ... > Hoja'} para todas las ubicaciones del tenant
+    (una consulta en lugar de full_path() por fila).
+    """
+    rows = {
+        loc_id: (parent_id, name)
+        for loc_id, parent_id, name in Location.objects.filter(
+            tenant_id=tenant_id
+        ).values_list("id", "parent_id", "name")
+    }
+    return build_paths(rows, sep)
+
+
+def build_paths(rows, sep=" > "):
+    """
+    Igual que location_paths() a partir de {id: (parent_id, name)} ya
+    cargado (p. ej. con el ORM asíncrono).
+    """
+    paths = {}
+
+    def _path(loc_id):
+        chain = []
+        node = loc_id
+        while node is not None and node not in paths and len(chain) <= len(rows):
+            chain.append(node)
+            node = rows.get(node, (None, None))[0]
+        prefix = paths.get(node)
+        for n in reversed(chain):
+            name = rows.get(n, (None, "?"))[1]
+            prefix = f"{prefix}{sep}{name}" if prefix else name
+            paths[n] = prefix
+        return paths.get(loc_id)
+
+    for loc_id in rows:
+        _path(loc_id)
+    return paths
+
+
+def iter_records(entity, tenant_id, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Itera listas de tuplas (un bloque cada vez) con las columnas de
+    `entity` en el orden de columns(entity).
+    """
+    if entity not in ENTITIES:
+        raise ExportError(f"Entidad no soportada: {entity}")
+    if since is not None and entity not in SINCE_FIELDS:
+        raise ExportError(f"'since' no está disponible para {entity}.")
+
+    model, spec = ENTITIES[entity]
+    lookups = [lookup for _, lookup, _ in spec if lookup]
+    path_pos = [name for name, _, _ in spec].index("location_path")
+    # La ruta sale del propio id (ubicaciones) o de la columna location_id
+    path_source = "id" if entity == "locations" else {n: l for n, l, _ in spec}["location_id"]
+    loc_pos = lookups.index(path_source)
+
+    qs = model.objects.filter(tenant_id=tenant_id).order_by()
+    if since is not None:
+        # Desde el inicio del día en la zona horaria actual. Sin __date: la
+        # comparación directa puede usar el índice (tenant_id, updated_at)
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        qs = qs.filter(**{f"{SINCE_FIELDS[entity]}__gte": start})
+
+    paths = location_paths(tenant_id)
+
+    chunk = []
+    for row in qs.values_list(*lookups).iterator(chunk_size=chunk_size):
+        row = row[:path_pos] + (paths.get(row[loc_pos]),) + row[path_pos:]
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def columns(entity):
+    return [(name, kind) for name, _, kind in ENTITIES[entity][1]]
+
+
+# =========================
+#  Serialización
+# =========================
+
+def _plain(value, kind):
+    """Valor apto para CSV/JSON."""
+    if value is None:
+        return None
+    if kind == "json":
+        return value
+    if isinstance(value, (uuid.UUID, datetime, date)):
+        return value.isoformat() if not isinstance(value, uuid.UUID) else str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class _Buffer:
+    """Pseudo-fichero que acumula lo escrito y lo entrega al vaciarlo."""
+
+    def __init__(self, binary=False):
+        self._parts = []
+        self._pos = 0
+        self.binary = binary
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = (b"" if self.binary else "").join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_csv(entity, chunks):
+    cols = columns(entity)
+    buf = _Buffer()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in cols])
+    yield buf.drain().encode("utf-8")
+
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow(
+                [
+                    json.dumps(v) if kind == "json" and v is not None else _plain(v, kind)
+                    for v, (_, kind) in zip(row, cols)
+                ]
+            )
+        yield buf.drain().encode("utf-8")
+
+
+def stream_ndjson(entity, chunks):
+    cols = columns(entity)
+    names = [name for name, _ in cols]
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(
+                {n: _plain(v, kind) for n, v, (_, kind) in zip(names, row, cols)},
+                ensure_ascii=False,
+                default=str,
+            )
+            + "\n"
+            for row in chunk
+        ).encode("utf-8")
+
+
+def stream_parquet(entity, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Para exportar a Parquet hace falta instalar 'pyarrow'.")
+
+    types = {
+        "uuid": pa.string(),
+        "str": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("us", tz="UTC"),
+        "json": pa.string(),
+    }
+    cols = columns(entity)
+    schema = pa.schema([(name, types[kind]) for name, kind in cols])
+
+    def _cell(v, kind):
+        if v is None:
+            return None
+        if kind == "uuid":
+            return str(v)
+        if kind == "json":
+            return json.dumps(v, default=str)
+        if kind == "float":
+            return float(v)
+        return v
+
+    sink = _Buffer(binary=True)
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        arrays = [
+            pa.array([_cell(row[i], kind) for row in chunk], type=schema.field(i).type)
+            for i, (_, kind) in enumerate(cols)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream(entity, fmt, tenant_id, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generador de bytes con la exportación de `entity` en formato `fmt`.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Formato no soportado: {fmt}")
+    if entity not in ENTITIES:
+        raise ExportError(f"Entidad no soportada: {entity}")
+    if since is not None and entity not in SINCE_FIELDS:
+        raise ExportError(f"'since' no está disponible para {entity}.")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Para exportar a Parquet hace falta instalar 'pyarrow'.")
+
+    chunks = iter_records(entity, tenant_id, since=since, chunk_size=chunk_size)
+    writer = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}[fmt]
+    return writer(entity, chunks)
@@ -0,0 +1,200 @@
+"""
+Previsión de demanda y punto de pedido por producto.
+
+- La serie diaria de consumo se agrega en la BD (TruncDate + Sum sobre
+  los movimientos OUT) y se vuelca a una matriz productos x días con
+  np.add.at, de modo que los días sin movimiento valen 0.
+- El ajuste de cada producto (inventory.demand) es puro numpy/scikit-learn
+  sin ORM, así que se reparte entre procesos con joblib.
+- Los resultados se guardan en ProductForecast.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Batch, Movement, Product, ProductForecast
+from .demand import DEFAULT_LEAD_TIME_DAYS, fit_chunk
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_SERVICE_LEVEL = 0.95
+
+
+# =========================
+#  Series de consumo
+# =========================
+
+def consumption_matrix(tenant_id, product_ids, window_days=DEFAULT_WINDOW_DAYS, today=None):
+    """
+    Devuelve (ids, matrix) donde matrix[i, d] son las unidades consumidas
+    del producto ids[i] el día d de la ventana (el último día es hoy).
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=window_days - 1)
+
+    ids = list(product_ids)
+    pos = {pid: i for i, pid in enumerate(ids)}
+    matrix = np.zeros((len(ids), window_days), dtype=np.float64)
+    if not ids:
+        return ids, matrix
+
+    rows = (
+        Movement.objects.filter(
+            tenant_id=tenant_id,
+            movement_type=Movement.OUT,
+            product_id__in=ids,
+            created_at__date__gte=start,
+        )
+        .annotate(day=TruncDate("created_at"))
+        .order_by()
+        .values_list("product_id", "day")
+        .annotate(units=Sum("quantity"))
+    )
+
+    prod_idx, day_idx, units = [], [], []
+    for product_id, day, qty in rows:
+        offset = (day - start).days
+        if 0 <= offset < window_days:
+            prod_idx.append(pos[product_id])
+            day_idx.append(offset)
+            units.append(-qty)  # OUT se guarda en negativo
+
+    if units:
+        np.add.at(
+            matrix,
+            (np.asarray(prod_idx), np.asarray(day_idx)),
+            np.clip(np.asarray(units, dtype=np.float64), 0, None),
+        )
+    return ids, matrix
+
+
+def _service_z(service_level):
+    from scipy.stats import norm
+
+    return float(norm.ppf(min(max(service_level, 0.5), 0.999)))
+
+
+# =========================
+#  Refresco
+# =========================
+
+def stale_product_ids(tenant_id, max_age=None):
+    """
+    Productos cuya previsión falta, es más antigua que `max_age`
+    (timedelta) o ya no corresponde a los datos: un movimiento de cualquier
+    tipo posterior al último considerado (una entrada o un ajuste cambian
+    el stock y los días hasta agotarse) o un stock en lotes distinto del
+    guardado (lotes editados sin movimiento, p. ej. desde el admin).
+    Devuelve (ids, último movimiento por producto, stock por producto).
+    """
+    last_movement = dict(
+        Movement.objects.filter(tenant_id=tenant_id)
+        .order_by()
+        .values_list("product_id")
+        .annotate(last=Max("created_at"))
+    )
+    stock = dict(
+        Batch.objects.filter(tenant_id=tenant_id)
+        .order_by()
+        .values_list("product_id")
+        .annotate(t=Coalesce(Sum("quantity"), 0))
+    )
+    existing = {
+        pid: (last_mov, stored_stock, computed)
+        for pid, last_mov, stored_stock, computed in ProductForecast.objects.filter(
+            tenant_id=tenant_id
+        ).values_list("product_id", "last_movement_at", "current_stock", "computed_at")
+    }
+
+    cutoff = timezone.now() - max_age if max_age else None
+    stale = []
+    for pid in Product.objects.filter(tenant_id=tenant_id).values_list("id", flat=True):
+        if pid not in existing:
+            stale.append(pid)
+            continue
+        last_mov, stored_stock, computed = existing[pid]
+        newest = last_movement.get(pid)
+        if newest and (last_mov is None or newest > last_mov):
+            stale.append(pid)
+        elif stock.get(pid, 0) != stored_stock:
+            stale.append(pid)
+        elif cutoff and computed < cutoff:
+            stale.append(pid)
+    return stale, last_movement, stock
+
+
+def refresh_tenant(
+    tenant_id,
+    *,
+    full=False,
+    max_age=None,
+    window_days=DEFAULT_WINDOW_DAYS,
+    lead_time_days=DEFAULT_LEAD_TIME_DAYS,
+    service_level=DEFAULT_SERVICE_LEVEL,
+    n_jobs=1,
+    chunk_size=500,
+):
+    """
+    Recalcula las previsiones del tenant. Por defecto solo las de los
+    productos con movimientos o lotes cambiados (ver stale_product_ids).
+    Devuelve el nº de previsiones escritas.
+    """
+    from joblib import Parallel, delayed
+
+    stale, last_movement, stock = stale_product_ids(tenant_id, max_age=max_age)
+    if full:
+        stale = list(Product.objects.filter(tenant_id=tenant_id).values_list("id", flat=True))
+    if not stale:
+        return 0
+
+    ids, matrix = consumption_matrix(tenant_id, stale, window_days=window_days)
+    stocks = np.array([stock.get(pid, 0) for pid in ids], dtype=np.float64)
+    z = _service_z(service_level)
+
+    bounds = range(0, len(ids), chunk_size)
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(fit_chunk)(
+            matrix[s:s + chunk_size], stocks[s:s + chunk_size], lead_time_days, z
+        )
+        for s in bounds
+    )
+    fits = [f for chunk in chunks for f in chunk]
+
+    now = timezone.now()
+    rows = [
+        ProductForecast(
+            tenant_id=tenant_id,
+            product_id=pid,
+            window_days=window_days,
+            current_stock=int(stocks[i]),
+            last_movement_at=last_movement.get(pid),
+            computed_at=now,
+            **fits[i],
+        )
+        for i, pid in enumerate(ids)
+    ]
+
+    fields = [
+        "window_days",
+        "avg_daily_demand",
+        "demand_std",
+        "trend",
+        "forecast_daily_demand",
+        "current_stock",
+        "suggested_min_stock",
+        "days_until_stockout",
+        "last_movement_at",
+        "computed_at",
+    ]
+    with transaction.atomic():
+        ProductForecast.objects.bulk_create(
+            rows,
+            batch_size=chunk_size,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=fields,
+        )
+    return len(rows)
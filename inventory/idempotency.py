@@ -0,0 +1,145 @@
+"""
+Claves de idempotencia para los escaneos.
+
+El cliente envía una clave única por escaneo (cabecera Idempotency-Key o
+campo "idempotency_key") y la reutiliza en los reintentos. La primera vez
+se ejecuta el escaneo y se guarda la respuesta en IdempotencyRecord, en
+la misma transacción que los cambios de stock; los reintentos reciben esa
+respuesta sin volver a consumir lotes ni crear movimientos.
+
+- Misma clave con otro cuerpo → KeyReused (la vista responde 422).
+- No se guardan respuestas 5xx, 409 ni 503: esos reintentos sí se vuelven
+  a ejecutar.
+- Los registros caducan a las IDEMPOTENCY_TTL_HOURS horas; se purgan de
+  vez en cuando al escribir y con `manage.py purge_idempotency_keys`.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 100
+
+# Respuestas que no se cachean (el reintento puede tener otro resultado)
+NOT_STORED = {409, 503}
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+class KeyReused(Exception):
+    """La clave ya se usó con un cuerpo distinto."""
+
+
+class InvalidKey(Exception):
+    """Clave vacía o demasiado larga."""
+
+
+def ttl():
+    return timedelta(hours=getattr(settings, "IDEMPOTENCY_TTL_HOURS", 24))
+
+
+def key_from_request(request):
+    key = request.META.get(HEADER)
+    if key is None:
+        data = request.data if hasattr(request, "data") else {}
+        key = data.get(FIELD) if hasattr(data, "get") else None
+    if key is None:
+        return None
+    key = str(key).strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise InvalidKey(key)
+    return key
+
+
+def fingerprint(data):
+    """sha256 del cuerpo normalizado (sin la propia clave)."""
+    if hasattr(data, "dict"):
+        data = data.dict()
+    if isinstance(data, dict):
+        data = {k: v for k, v in data.items() if k != FIELD}
+    raw = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _replay(record):
+    return Response(
+        record.response,
+        status=record.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _lookup(tenant_id, key, fp):
+    record = IdempotencyRecord.objects.filter(tenant_id=tenant_id, key=key).first()
+    if record is None:
+        return None
+    if record.created_at < timezone.now() - ttl():
+        record.delete()
+        return None
+    if record.fingerprint != fp:
+        raise KeyReused(key)
+    return record
+
+
+def run_once(tenant_id, key, fp, handler):
+    """
+    Ejecuta handler() (que devuelve una Response de DRF) una sola vez por
+    (tenant, clave). Debe llamarse en el hilo que hace la escritura.
+    """
+    maybe_purge()
+    try:
+        with transaction.atomic():
+            record = _lookup(tenant_id, key, fp)
+            if record is not None:
+                return _replay(record)
+
+            response = handler()
+            code = response.status_code
+            if code < 500 and code not in NOT_STORED:
+                IdempotencyRecord.objects.create(
+                    tenant_id=tenant_id,
+                    key=key,
+                    fingerprint=fp,
+                    status_code=code,
+                    response=response.data,
+                )
+            return response
+    except IntegrityError:
+        # Otra petición con la misma clave terminó antes: esta transacción
+        # (incluido su escaneo) se ha deshecho; se devuelve la guardada
+        record = _lookup(tenant_id, key, fp)
+        if record is None:
+            raise
+        return _replay(record)
+
+
+def purge_expired(now=None):
+    cutoff = (now or timezone.now()) - ttl()
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def maybe_purge():
+    """Purga como mucho una vez por IDEMPOTENCY_PURGE_INTERVAL segundos."""
+    global _last_purge
+    interval = getattr(settings, "IDEMPOTENCY_PURGE_INTERVAL", 3600)
+    now = time.monotonic()
+    if now - _last_purge < interval or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _last_purge = now
+        purge_expired()
+    finally:
+        _purge_lock.release()
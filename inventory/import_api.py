@@ -0,0 +1,52 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+
+from .locations_api import get_tenant_from_request
+from . import importer, querycount
+
+
+class InventoryImportView(APIView):
+    """
+    POST /api/import/  (multipart: file=<.csv|.xlsx>, dry_run=1)
+    Importación masiva de productos y stock. Devuelve el resumen y las
+    filas rechazadas. Los QR se generan después (generate_qr_images).
+    """
+
+    permission_classes = [IsAuthenticated]
+    # Consultas por bloque de importer.DEFAULT_CHUNK_SIZE filas (inventory/querycount.py)
+    query_budget = 10
+    query_budget_per_chunk = 20
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        tenant_id = get_tenant_from_request(request)
+
+        upload = request.FILES.get("file")
+        if not upload:
+            return Response(
+                {"ok": False, "error": "file_required", "detail": "Debes adjuntar un fichero."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        dry_run = str(request.data.get("dry_run") or "").lower() in ("1", "true", "on")
+
+        try:
+            result = importer.import_rows(
+                importer.iter_rows(upload.file, upload.name),
+                tenant_id,
+                user=request.user,
+                dry_run=dry_run,
+                source=upload.name,
+            )
+        except importer.ImportFormatError as e:
+            return Response(
+                {"ok": False, "error": "invalid_file", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        chunks = -(-result["rows"] // importer.DEFAULT_CHUNK_SIZE)
+        querycount.set_budget(request, self.query_budget + self.query_budget_per_chunk * chunks)
+        return Response({"ok": True, **result}, status=status.HTTP_200_OK)
@@ -0,0 +1,454 @@
+"""
+Importación masiva de productos y stock desde CSV/XLSX.
+
+Las filas se leen en streaming y se procesan por bloques:
+- Las ubicaciones se resuelven por ruta ('Casa > Cocina > Estante'),
+  creando las que falten, con una sola carga inicial del árbol.
+- Los productos se insertan/actualizan con bulk_create(update_conflicts=...)
+  contra uniq_product_per_location_tenant_norm.
+- Lotes y movimientos IN se crean con bulk_create.
+- La imagen QR no se genera aquí (ver `manage.py generate_qr_images`).
+
+Columnas reconocidas (cabecera, sin distinguir mayúsculas):
+name, location, quantity, unit, category, min_stock, expiration_date,
+brand, origin, primary_color, dimensions, estimated_value, notes.
+"""
+import codecs
+import contextlib
+import csv
+import io
+import re
+import uuid
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .models import Batch, Location, Movement, Product, normalize_name
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+PRODUCT_FIELDS = (
+    "category",
+    "unit",
+    "min_stock",
+    "brand",
+    "origin",
+    "primary_color",
+    "dimensions",
+    "estimated_value",
+    "notes",
+)
+BATCH_META_FIELDS = ("brand", "origin", "primary_color", "dimensions", "estimated_value", "notes")
+
+PATH_SEPARATORS = re.compile(r"\s*(?:>|/)\s*")
+
+# Codificaciones probadas, en orden, para un CSV binario: UTF-8 (con o sin
+# BOM) y, si no lo es, la de Excel en Windows para Europa occidental
+CSV_ENCODINGS = ("utf-8-sig", "cp1252")
+
+
+class ImportFormatError(Exception):
+    """El fichero no se puede leer (formato, cabecera, dependencia)."""
+
+
+# =========================
+#  Lectura en streaming
+# =========================
+
+def _clean_header(header):
+    return [(h or "").strip().lower() for h in header]
+
+
+def _detect_encoding(fileobj, encodings=CSV_ENCODINGS):
+    """
+    Primera codificación de `encodings` que decodifica el fichero binario
+    entero. Se lee por bloques, sin cargarlo en memoria, antes de importar
+    nada: un error a mitad dejaría confirmados los bloques anteriores.
+    """
+    for encoding in encodings:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        fileobj.seek(0)
+        try:
+            for block in iter(lambda: fileobj.read(64 * 1024), b""):
+                decoder.decode(block)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            continue
+        finally:
+            fileobj.seek(0)
+        return encoding
+    raise ImportFormatError(
+        "No se reconoce la codificación del CSV (se admite UTF-8 y Windows-1252)."
+    )
+
+
+def iter_csv(fileobj, encoding=None):
+    """
+    Itera dicts a partir de un CSV (texto o binario). Detecta ',' o ';'.
+    Un CSV binario se decodifica con `encoding` o, si no se indica, con la
+    primera de CSV_ENCODINGS que lo lee entero.
+    """
+    if isinstance(fileobj, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(fileobj, "mode", ""):
+        encoding = encoding or _detect_encoding(fileobj)
+        fileobj = io.TextIOWrapper(fileobj, encoding=encoding, newline="")
+
+    try:
+        sample = fileobj.read(4096)
+        fileobj.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.reader(fileobj, dialect)
+        header = _clean_header(next(reader, []))
+        if "name" not in header:
+            raise ImportFormatError("La cabecera debe incluir al menos la columna 'name'.")
+        for values in reader:
+            if any(v.strip() for v in values):
+                yield dict(zip(header, values))
+    except UnicodeDecodeError:
+        raise ImportFormatError(f"El CSV no está codificado en {fileobj.encoding}.")
+    except csv.Error as e:
+        raise ImportFormatError(f"CSV mal formado: {e}")
+
+
+def iter_xlsx(fileobj):
+    """
+    Itera dicts a partir de la primera hoja de un XLSX (openpyxl en modo
+    solo lectura, fila a fila). openpyxl es opcional.
+    """
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ImportFormatError("Para importar XLSX hace falta instalar 'openpyxl'.")
+
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        # KeyError: zip válido al que le falta alguna parte del libro
+        raise ImportFormatError(f"El fichero no es un XLSX válido: {e}")
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = _clean_header(str(h) if h is not None else "" for h in next(rows, ()))
+        if "name" not in header:
+            raise ImportFormatError("La cabecera debe incluir al menos la columna 'name'.")
+        for values in rows:
+            if any(v not in (None, "") for v in values):
+                yield {
+                    k: ("" if v is None else v)
+                    for k, v in zip(header, values)
+                }
+    finally:
+        wb.close()
+
+
+def iter_rows(fileobj, filename):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx(fileobj)
+    return iter_csv(fileobj)
+
+
+def _chunks(iterable, size):
+    buf = []
+    for item in iterable:
+        buf.append(item)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+# =========================
+#  Ubicaciones por ruta
+# =========================
+
+class LocationResolver:
+    """
+    Resuelve rutas de ubicación a ids usando el árbol cargado una vez
+    y crea las ubicaciones que falten.
+    """
+
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id
+        self.by_key = {
+            (parent_id, name.lower()): loc_id
+            for loc_id, parent_id, name in Location.objects.filter(
+                tenant_id=tenant_id
+            ).values_list("id", "parent_id", "name")
+        }
+        self.created = 0
+
+    def resolve(self, path):
+        parts = [p for p in PATH_SEPARATORS.split((path or "").strip()) if p]
+        if not parts:
+            return None
+
+        parent_id = None
+        for name in parts:
+            key = (parent_id, name.lower())
+            loc_id = self.by_key.get(key)
+            if loc_id is None:
+                loc_id = Location.objects.create(
+                    name=name[:255],
+                    parent_id=parent_id,
+                    tenant_id=self.tenant_id,
+                ).id
+                self.by_key[key] = loc_id
+                self.created += 1
+            parent_id = loc_id
+        return parent_id
+
+
+# =========================
+#  Validación de filas
+# =========================
+
+def _str(v, max_len=None):
+    s = str(v).strip() if v not in (None, "") else ""
+    return s[:max_len] if max_len else s
+
+
+def _int(v, field, default=0):
+    if v in (None, ""):
+        return default
+    try:
+        n = int(float(str(v).replace(",", ".")))
+    except ValueError:
+        raise ValueError(f"'{field}' no es un número entero: {v!r}")
+    if n < 0:
+        raise ValueError(f"'{field}' no puede ser negativo.")
+    return n
+
+
+def _decimal(v):
+    if v in (None, ""):
+        return None
+    try:
+        return Decimal(str(v).replace(",", ".")).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"'estimated_value' no es un número: {v!r}")
+
+
+def _date(v):
+    if v in (None, ""):
+        return None
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    s = str(v).strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"'expiration_date' no es una fecha válida: {v!r}")
+
+
+def parse_row(raw):
+    """
+    Valida una fila y devuelve un dict normalizado. Lanza ValueError.
+    """
+    name = _str(raw.get("name"), 200)
+    if not name:
+        raise ValueError("El nombre es obligatorio.")
+    location = _str(raw.get("location"))
+    if not location:
+        raise ValueError("La ubicación es obligatoria.")
+
+    return {
+        "name": name,
+        "name_normalized": normalize_name(name),
+        "location": location,
+        "quantity": _int(raw.get("quantity"), "quantity"),
+        "unit": _str(raw.get("unit"), 20) or "unit",
+        "category": _str(raw.get("category"), 100),
+        "min_stock": _int(raw.get("min_stock"), "min_stock"),
+        "expiration_date": _date(raw.get("expiration_date")),
+        "brand": _str(raw.get("brand"), 100) or None,
+        "origin": _str(raw.get("origin"), 100) or None,
+        "primary_color": _str(raw.get("primary_color"), 50) or None,
+        "dimensions": _str(raw.get("dimensions"), 120) or None,
+        "estimated_value": _decimal(raw.get("estimated_value")),
+        "notes": _str(raw.get("notes")) or None,
+    }
+
+
+# =========================
+#  Importación
+# =========================
+
+def _new_product(row, location_id, tenant_id, user):
+    pid = uuid.uuid4()
+    base_sku = (slugify(row["name"])[:10] or "prd").upper()
+    return Product(
+        id=pid,
+        tenant_id=tenant_id,
+        name=row["name"],
+        name_normalized=row["name_normalized"],
+        location_id=location_id,
+        sku=f"{base_sku}-{pid.hex[:12]}",
+        qr_payload=f"PRD:{pid}",
+        created_by=user,
+        **{f: row[f] for f in PRODUCT_FIELDS},
+    )
+
+
+def _import_chunk(rows, resolver, tenant_id, user, update_fields, result, source):
+    # Último valor de cada producto dentro del bloque (no se puede hacer
+    # upsert dos veces de la misma clave en una sentencia)
+    products = {}
+    for row in rows:
+        row["location_id"] = resolver.resolve(row["location"])
+        key = (row["location_id"], row["name_normalized"])
+        products[key] = _new_product(row, row["location_id"], tenant_id, user)
+
+    existing = set(
+        Product.objects.filter(
+            tenant_id=tenant_id,
+            location_id__in={k[0] for k in products},
+            name_normalized__in={k[1] for k in products},
+        ).values_list("location_id", "name_normalized")
+    )
+    existing &= set(products)
+
+    if update_fields:
+        Product.objects.bulk_create(
+            products.values(),
+            update_conflicts=True,
+            unique_fields=["tenant_id", "location", "name_normalized"],
+            update_fields=[*update_fields, "updated_at"],
+        )
+    else:
+        Product.objects.bulk_create(products.values(), ignore_conflicts=True)
+
+    result["products_created"] += len(products) - len(existing)
+    result["products_updated"] += len(existing)
+
+    # Los ids reales (los existentes conservan el suyo)
+    ids = {
+        (loc_id, norm): pid
+        for pid, loc_id, norm in Product.objects.filter(
+            tenant_id=tenant_id,
+            location_id__in={k[0] for k in products},
+            name_normalized__in={k[1] for k in products},
+        ).values_list("id", "location_id", "name_normalized")
+    }
+
+    stocked = [r for r in rows if r["quantity"] > 0]
+    batches = Batch.objects.bulk_create(
+        [
+            Batch(
+                product_id=ids[(r["location_id"], r["name_normalized"])],
+                tenant_id=tenant_id,
+                quantity=r["quantity"],
+                expiration_date=r["expiration_date"],
+                **{f: r[f] for f in BATCH_META_FIELDS},
+            )
+            for r in stocked
+        ]
+    )
+
+    movements = Movement.objects.bulk_create(
+        [
+            Movement(
+                product_id=b.product_id,
+                location_id=r["location_id"],
+                quantity=b.quantity,
+                movement_type=Movement.IN,
+                metadata={
+                    "batch_id": b.id,
+                    "entry_date": str(b.entry_date),
+                    "import": source,
+                },
+                tenant_id=tenant_id,
+                created_by=user,
+            )
+            for b, r in zip(batches, stocked)
+        ]
+    )
+
+    # bulk_create no dispara post_save: mantener rollup y cachés a mano
+    from . import rollups, valuation
+
+    rollups.apply_movements(movements)
+    valuation.invalidate(tenant_id)
+
+    result["batches_created"] += len(batches)
+    result["units_in"] += sum(b.quantity for b in batches)
+
+
+def import_rows(
+    rows,
+    tenant_id,
+    *,
+    user=None,
+    dry_run=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    source="import",
+    on_progress=None,
+):
+    """
+    Importa un iterable de dicts (ver iter_rows). Cada bloque se confirma
+    en su propia transacción; con dry_run todo se deshace al final.
+
+    Devuelve un dict con contadores y la lista de errores por fila
+    ({"row": nº de línea, "error": texto}).
+    """
+    result = {
+        "dry_run": dry_run,
+        "rows": 0,
+        "rows_ok": 0,
+        "products_created": 0,
+        "products_updated": 0,
+        "batches_created": 0,
+        "units_in": 0,
+        "locations_created": 0,
+        "errors": [],
+        "error_count": 0,
+    }
+
+    header_seen = set()
+    outer = transaction.atomic() if dry_run else contextlib.nullcontext()
+
+    with outer:
+        resolver = LocationResolver(tenant_id)
+
+        # La primera fila de datos es la línea 2 (la 1 es la cabecera)
+        for chunk in _chunks(enumerate(rows, start=2), chunk_size):
+            valid = []
+            for line, raw in chunk:
+                result["rows"] += 1
+                header_seen.update(raw.keys())
+                try:
+                    valid.append(parse_row(raw))
+                except ValueError as e:
+                    result["error_count"] += 1
+                    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                        result["errors"].append({"row": line, "error": str(e)})
+
+            if valid:
+                # Solo se sobrescriben las columnas que trae el fichero
+                update_fields = [f for f in PRODUCT_FIELDS if f in header_seen]
+                with transaction.atomic():
+                    _import_chunk(
+                        valid, resolver, tenant_id, user, update_fields, result, source
+                    )
+                result["rows_ok"] += len(valid)
+
+            if on_progress:
+                on_progress(result)
+
+        result["locations_created"] = resolver.created
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    return result
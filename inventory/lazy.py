@@ -0,0 +1,30 @@
+"""
+Importación diferida de dependencias pesadas (numpy, ...).
+
+    np = LazyModule("numpy")
+
+El módulo real se importa la primera vez que se accede a un atributo,
+así que importar el módulo que lo usa (p. ej. desde AppConfig.ready())
+no paga el coste en el arranque.
+"""
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "cargado" if self.__dict__["_module"] is not None else "sin cargar"
+        return f"<LazyModule {self.__dict__['_name']!r} ({state})>"
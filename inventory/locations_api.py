@@ -6,6 +6,9 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 from .models import Location, Product, Batch, Movement
+from .exporter import build_paths
+from .replicas import ReplicaReadMixin
+from . import tenant_cache
 import uuid
 
 DEFAULT_TENANT = uuid.UUID(
@@ -24,44 +27,54 @@ def get_tenant_from_request(request):
     return DEFAULT_TENANT
 
 
-class LocationTreeView(APIView):
+def build_tree(tenant_id):
+    """Árbol de ubicaciones del tenant: lista de raíces con sus children."""
+    rows = list(
+        Location.objects.filter(tenant_id=tenant_id)
+        .order_by("name")
+        .values_list("id", "parent_id", "name")
+    )
+    # Rutas calculadas en memoria (antes: full_path() por ubicación)
+    paths = build_paths({loc_id: (parent_id, name) for loc_id, parent_id, name in rows})
+
+    nodes = {}
+    roots = []
+
+    for loc_id, parent_id, name in rows:
+        nodes[loc_id] = {
+            "id": str(loc_id),
+            "name": name,
+            "path": paths.get(loc_id, name),
+            "parent_id": str(parent_id) if parent_id else None,
+            "children": [],
+        }
+
+    for loc_id, parent_id, name in rows:
+        node = nodes[loc_id]
+        if parent_id and parent_id in nodes:
+            nodes[parent_id]["children"].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+class LocationTreeView(ReplicaReadMixin, APIView):
     """
     GET /api/locations/tree/
-    Devuelve el árbol completo de ubicaciones del tenant.
+    Devuelve el árbol completo de ubicaciones del tenant (cacheado, ver
+    inventory/tenant_cache.py).
     """
 
     permission_classes = [IsAuthenticated]
+    query_budget = 5
 
     def get(self, request):
         tenant_id = get_tenant_from_request(request)
-
-        qs = (
-            Location.objects.filter(tenant_id=tenant_id)
-            .select_related("parent")
-            .order_by("name")
+        roots, hit = tenant_cache.get_or_compute("tree", tenant_id, (), lambda: build_tree(tenant_id))
+        return tenant_cache.mark(
+            Response({"ok": True, "tree": roots}, status=status.HTTP_200_OK), hit
         )
 
-        nodes = {}
-        roots = []
-
-        for loc in qs:
-            nodes[loc.id] = {
-                "id": str(loc.id),
-                "name": loc.name,
-                "path": loc.full_path() if hasattr(loc, "full_path") else loc.name,
-                "parent_id": str(loc.parent_id) if loc.parent_id else None,
-                "children": [],
-            }
-
-        for loc in qs:
-            node = nodes[loc.id]
-            if loc.parent_id and loc.parent_id in nodes:
-                nodes[loc.parent_id]["children"].append(node)
-            else:
-                roots.append(node)
-
-        return Response({"ok": True, "tree": roots}, status=status.HTTP_200_OK)
-
 
 class LocationCreateView(APIView):
     """
@@ -70,6 +83,7 @@ class LocationCreateView(APIView):
     """
 
     permission_classes = [IsAuthenticated]
+    query_budget = 8
 
     def post(self, request):
         tenant_id = get_tenant_from_request(request)
@@ -132,6 +146,7 @@ class LocationUpdateView(APIView):
     """
 
     permission_classes = [IsAuthenticated]
+    query_budget = 14
 
     def post(self, request, loc_id):
         tenant_id = get_tenant_from_request(request)
@@ -222,6 +237,8 @@ class LocationDeleteView(APIView):
     """
 
     permission_classes = [IsAuthenticated]
+    # Incluye el borrado en cascada y los tombstones del catálogo
+    query_budget = 20
 
     def post(self, request, loc_id):
         tenant_id = get_tenant_from_request(request)
@@ -238,17 +255,7 @@ class LocationDeleteView(APIView):
         ).exists()
 
         # Construir el subárbol completo (incluyendo la propia ubicación)
-        to_check = [loc.id]
-        queue = [loc.id]
-
-        while queue:
-            current = queue.pop(0)
-            children_ids = Location.objects.filter(
-                parent_id=current, tenant_id=tenant_id
-            ).values_list("id", flat=True)
-            for child_id in children_ids:
-                to_check.append(child_id)
-                queue.append(child_id)
+        to_check = loc.descendant_ids(include_self=True)
 
         # Productos en cualquier ubicación del subárbol
         has_products = Product.objects.filter(
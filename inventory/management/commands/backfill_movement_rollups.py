@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from inventory.models import Organization, DEFAULT_TENANT
+from inventory import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el rollup diario de movimientos (MovementDaily) "
+        "a partir de la tabla Movement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tenant",
+            help="UUID del tenant a procesar (por defecto, todos).",
+        )
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Reconstruye solo desde esta fecha (YYYY-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        if options["tenant"]:
+            tenants = [options["tenant"]]
+        else:
+            tenants = [DEFAULT_TENANT] + list(
+                Organization.objects.values_list("id", flat=True)
+            )
+
+        total = 0
+        for tenant_id in tenants:
+            written = rollups.backfill(tenant_id, since=options["since"])
+            if written:
+                self.stdout.write(f" {tenant_id}: {written} filas")
+            total += written
+
+        self.stdout.write(self.style.SUCCESS(f"Rollup reconstruido: {total} filas"))
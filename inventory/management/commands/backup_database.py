@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backup_db import (
+    BackupError,
+    DEFAULT_RETENTION,
+    backup_sqlite_db,
+    integrity_check,
+    list_backups,
+    rotate_backups,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Backup online de la BD SQLite con la API de backup (no bloquea a los "
+        "escritores), verificación de integridad y rotación por retención."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reason", default="manual", help="Sufijo del fichero.")
+        parser.add_argument("--dir", help="Carpeta destino (por defecto <BD>/backups).")
+        parser.add_argument("--compress", action="store_true", help="Guarda como .bak.gz")
+        parser.add_argument(
+            "--no-verify",
+            action="store_true",
+            help="No ejecuta integrity_check sobre la copia.",
+        )
+        parser.add_argument(
+            "--rotate",
+            action="store_true",
+            help="Aplica la política de retención tras el backup.",
+        )
+        parser.add_argument("--keep-hourly", type=int, default=DEFAULT_RETENTION["hourly"])
+        parser.add_argument("--keep-daily", type=int, default=DEFAULT_RETENTION["daily"])
+        parser.add_argument("--keep-weekly", type=int, default=DEFAULT_RETENTION["weekly"])
+        parser.add_argument(
+            "--verify-all",
+            action="store_true",
+            help="No hace backup: comprueba la integridad de los existentes.",
+        )
+
+    def handle(self, *args, **options):
+        import os
+        from django.conf import settings
+
+        backup_dir = options["dir"] or os.path.join(
+            os.path.dirname(str(settings.DATABASES["default"]["NAME"])), "backups"
+        )
+
+        if options["verify_all"]:
+            bad = 0
+            for ts, reason, path in list_backups(backup_dir):
+                ok = integrity_check(path)
+                bad += not ok
+                label = self.style.SUCCESS("ok") if ok else self.style.ERROR("CORRUPTO")
+                self.stdout.write(f" {os.path.basename(path)}: {label}")
+            if bad:
+                raise CommandError(f"{bad} backups no pasan integrity_check")
+            return
+
+        def progress(remaining, total):
+            done = total - remaining
+            self.stdout.write(f" {done}/{total} páginas", ending="\r")
+
+        try:
+            path = backup_sqlite_db(
+                reason=options["reason"],
+                backup_dir=backup_dir,
+                compress=options["compress"],
+                verify=not options["no_verify"],
+                progress=progress,
+            )
+        except BackupError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(f"Backup creado en: {path}"))
+
+        if options["rotate"]:
+            removed = rotate_backups(
+                backup_dir,
+                hourly=options["keep_hourly"],
+                daily=options["keep_daily"],
+                weekly=options["keep_weekly"],
+            )
+            self.stdout.write(f"Rotación: {len(removed)} backups eliminados")
@@ -0,0 +1,55 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import DEFAULT_TENANT
+from inventory import exporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta productos, lotes, movimientos o ubicaciones en CSV, NDJSON "
+        "o Parquet, en streaming (memoria constante)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("entity", choices=sorted(exporter.ENTITIES))
+        parser.add_argument("--format", default="csv", choices=exporter.FORMATS)
+        parser.add_argument(
+            "--output",
+            "-o",
+            default="-",
+            help="Fichero de salida ('-' = stdout).",
+        )
+        parser.add_argument("--tenant", default=DEFAULT_TENANT, help="UUID del tenant.")
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Solo movimientos desde esta fecha (YYYY-MM-DD).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=exporter.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            body = exporter.stream(
+                options["entity"],
+                options["format"],
+                options["tenant"],
+                since=options["since"],
+                chunk_size=options["chunk_size"],
+            )
+        except exporter.ExportError as e:
+            raise CommandError(str(e))
+
+        out = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        written = 0
+        try:
+            for part in body:
+                out.write(part)
+                written += len(part)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+        if options["output"] != "-":
+            self.stdout.write(self.style.SUCCESS(f"Exportados {written} bytes a {options['output']}"))
@@ -0,0 +1,86 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import duplicates
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca productos casi duplicados (nombres parecidos en la misma ubicación) "
+        "y emite sugerencias de fusión. Pensado para ejecutarse cada noche."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="UUID del tenant (por defecto, todos).")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=duplicates.DEFAULT_SIMILARITY,
+            help="Similitud coseno mínima (0-1).",
+        )
+        parser.add_argument(
+            "--scope",
+            choices=["location", "tenant"],
+            default="location",
+            help="Comparar solo dentro de cada ubicación o en todo el tenant.",
+        )
+        parser.add_argument("--format", choices=["text", "csv", "json"], default="text")
+        parser.add_argument("--output", help="Fichero de salida (por defecto, la consola).")
+
+    def handle(self, *args, **options):
+        if options["tenant"]:
+            tenants = [options["tenant"]]
+        else:
+            tenants = list(
+                Product.objects.order_by().values_list("tenant_id", flat=True).distinct()
+            )
+
+        started = time.monotonic()
+        suggestions = []
+        for tenant_id in tenants:
+            suggestions += duplicates.find_near_duplicates(
+                tenant_id, threshold=options["threshold"], scope=options["scope"]
+            )
+        elapsed = time.monotonic() - started
+
+        out = open(options["output"], "w", encoding="utf-8", newline="") if options["output"] else self.stdout
+        try:
+            getattr(self, f"_write_{options['format']}")(out, suggestions)
+        finally:
+            if options["output"]:
+                out.close()
+
+        products = sum(len(s["duplicates"]) for s in suggestions)
+        self.stderr.write(self.style.SUCCESS(
+            f"{len(suggestions)} sugerencias de fusión ({products} productos) "
+            f"en {len(tenants)} tenants, {elapsed:.1f} s"
+        ))
+
+    def _write_text(self, out, suggestions):
+        for s in suggestions:
+            out.write(
+                f"[{s['similarity']:.2f}] Mantener {s['canonical']['id']}  {s['canonical']['name']}\n"
+            )
+            for d in s["duplicates"]:
+                out.write(f"         fusionar {d['id']}  {d['name']}  ({d['similarity']:.2f})\n")
+
+    def _write_csv(self, out, suggestions):
+        writer = csv.writer(out)
+        writer.writerow([
+            "group", "tenant_id", "location_id", "canonical_id", "canonical_name",
+            "product_id", "name", "similarity",
+        ])
+        for group, s in enumerate(suggestions, start=1):
+            for d in s["duplicates"]:
+                writer.writerow([
+                    group, s["tenant_id"], s["location_id"] or "", s["canonical"]["id"],
+                    s["canonical"]["name"], d["id"], d["name"], d["similarity"],
+                ])
+
+    def _write_json(self, out, suggestions):
+        out.write(json.dumps(suggestions, ensure_ascii=False, indent=2, default=str))
+        out.write("\n")
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from inventory import valuation
+from inventory.models import Product
+from inventory.utils import make_qr_contentfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera la imagen QR de los productos que no la tienen "
+        "(p. ej. los creados por import_inventory)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="UUID del tenant (por defecto, todos).")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        qs = Product.objects.filter(Q(qr_image="") | Q(qr_image__isnull=True))
+        if options["tenant"]:
+            qs = qs.filter(tenant_id=options["tenant"])
+
+        # Los ids primero: no se itera sobre la misma columna que se actualiza
+        ids = list(qs.order_by("pk").values_list("id", flat=True))
+        size = options["chunk_size"]
+        tenants = set()
+        done = 0
+
+        for start in range(0, len(ids), size):
+            pending = []
+            now = timezone.now()
+            for p in Product.objects.filter(pk__in=ids[start:start + size]).only(
+                "id", "tenant_id", "name", "qr_payload"
+            ):
+                payload = p.qr_payload or f"PRD:{p.id}"
+                filename = f"product-{slugify(p.name)}-{str(p.id)[:8]}.png"
+                p.qr_image.save(filename, make_qr_contentfile(payload), save=False)
+                # bulk_update no aplica auto_now: la sincronización del catálogo lo necesita
+                p.updated_at = now
+                pending.append(p)
+                tenants.add(p.tenant_id)
+
+            Product.objects.bulk_update(pending, ["qr_image", "updated_at"])
+            done += len(pending)
+            self.stdout.write(f" {done} QR generados", ending="\r")
+
+        # bulk_update no dispara post_save: invalidar la caché de lecturas a mano
+        for tenant_id in tenants:
+            valuation.invalidate(tenant_id)
+
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(f"QR generados: {done}"))
@@ -0,0 +1,104 @@
+import csv
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import DEFAULT_TENANT
+from inventory import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa productos y stock desde un CSV/XLSX (name, location, quantity, "
+        "unit, category, ...). Crea ubicaciones por ruta, hace upsert de "
+        "productos y crea lotes + movimientos IN en bloque."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichero .csv o .xlsx")
+        parser.add_argument(
+            "--user",
+            help="Usuario propietario: se usa su organización como tenant.",
+        )
+        parser.add_argument(
+            "--tenant",
+            help="UUID del tenant (si no se indica --user).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Valida e importa dentro de una transacción que se deshace.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=importer.DEFAULT_CHUNK_SIZE,
+        )
+        parser.add_argument(
+            "--errors-file",
+            help="Escribe aquí un CSV con las filas rechazadas (row, error).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No existe el fichero: {path}")
+
+        user = None
+        tenant_id = options["tenant"] or DEFAULT_TENANT
+        if options["user"]:
+            user = get_user_model().objects.filter(username=options["user"]).first()
+            if not user or not hasattr(user, "organization"):
+                raise CommandError(f"Usuario sin organización: {options['user']}")
+            tenant_id = user.organization.id
+
+        started = time.monotonic()
+
+        def progress(result):
+            self.stdout.write(
+                f" {result['rows']} filas leídas, {result['error_count']} con errores",
+                ending="\r",
+            )
+
+        try:
+            with open(path, "rb") as fh:
+                result = importer.import_rows(
+                    importer.iter_rows(fh, path),
+                    tenant_id,
+                    user=user,
+                    dry_run=options["dry_run"],
+                    chunk_size=options["chunk_size"],
+                    source=os.path.basename(path),
+                    on_progress=progress,
+                )
+        except importer.ImportFormatError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write("")
+        for key in (
+            "rows",
+            "rows_ok",
+            "products_created",
+            "products_updated",
+            "batches_created",
+            "units_in",
+            "locations_created",
+            "error_count",
+        ):
+            self.stdout.write(f" {key}: {result[key]}")
+        self.stdout.write(f" tiempo: {time.monotonic() - started:.1f}s")
+
+        if options["errors_file"] and result["errors"]:
+            with open(options["errors_file"], "w", newline="", encoding="utf-8") as fh:
+                writer = csv.writer(fh)
+                writer.writerow(["row", "error"])
+                writer.writerows((e["row"], e["error"]) for e in result["errors"])
+            self.stdout.write(f" errores en: {options['errors_file']}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry-run completado. No se ha modificado la BD."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Importación completada. Genera los QR con: manage.py generate_qr_images"
+            ))
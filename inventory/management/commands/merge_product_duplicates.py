@@ -1,12 +1,16 @@
-from collections import defaultdict
+import threading
+import time
+
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from inventory.models import Product, Batch, Movement
+from django.db import connection
+
+from inventory import duplicates
+
 
 class Command(BaseCommand):
     help = (
         "Fusiona productos duplicados por (tenant_id, location_id, name_normalized). "
-        "Mueve Batches y Movements al producto canónico y elimina el resto."
+        "Mueve Batches y Movements al producto canónico, borra el resto y sus QR."
     )
 
     def add_arguments(self, parser):
@@ -15,44 +19,81 @@ class Command(BaseCommand):
             action="store_true",
             help="Muestra lo que haría sin modificar nada."
         )
+        parser.add_argument("--tenant", help="UUID del tenant (por defecto, todos).")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=duplicates.DEFAULT_CHUNK_SIZE,
+            help="Productos sobrantes por transacción.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Tenants en paralelo (en SQLite las escrituras se serializan igualmente).",
+        )
 
     def handle(self, *args, **options):
         dry_run = options["dry_run"]
+        verbose = options["verbosity"] >= 2
 
-        # Construir mapa de duplicados
-        dupes = defaultdict(list)
-        for p in Product.objects.all().values("id", "tenant_id", "location_id", "name", "name_normalized"):
-            key = (p["tenant_id"], p["location_id"], p["name_normalized"])
-            dupes[key].append(p)
-
-        to_merge = {k: v for k, v in dupes.items() if len(v) > 1}
-        total_groups = len(to_merge)
-        self.stdout.write(self.style.WARNING(f"Grupos duplicados: {total_groups}"))
+        pending = duplicates.summary(options["tenant"])
+        total_groups = sum(s["groups"] for s in pending.values())
+        total_dupes = sum(s["duplicates"] for s in pending.values())
+        self.stdout.write(self.style.WARNING(
+            f"Grupos duplicados: {total_groups} ({total_dupes} productos sobrantes "
+            f"en {len(pending)} tenants)"
+        ))
 
         if total_groups == 0:
             self.stdout.write(self.style.SUCCESS("No hay duplicados. Nada que hacer."))
             return
 
-        for key, rows in to_merge.items():
-            # Canónico = el de id menor (más antiguo)
-            rows_sorted = sorted(rows, key=lambda r: str(r["id"]))
-            canonical_id = rows_sorted[0]["id"]
-            losers = [r["id"] for r in rows_sorted[1:]]
+        workers = options["workers"]
+        if workers > 1 and connection.vendor == "sqlite":
+            self.stdout.write(self.style.WARNING(
+                "SQLite: los tenants se fusionan en paralelo pero escriben de uno en uno."
+            ))
 
-            self.stdout.write(f" Mantengo: {canonical_id}  |  Borro: {losers}")
+        lock = threading.Lock()
 
-            if dry_run:
-                # Solo mostrar
-                continue
+        def progress(result):
+            with lock:
+                self.stdout.write(
+                    f" {result['tenant_id']}: {result['merged']}/{result['duplicates']} fusionados"
+                )
+
+        started = time.monotonic()
+        # Primero los tenants con más trabajo, para repartir mejor entre hilos
+        tenants = sorted(pending, key=lambda t: pending[t]["duplicates"], reverse=True)
+        results = duplicates.merge_tenants(
+            tenants,
+            workers=workers,
+            chunk_size=options["chunk_size"],
+            dry_run=dry_run,
+            on_progress=progress,
+        )
 
-            with transaction.atomic():
-                # Reasignar lotes y movimientos
-                Batch.objects.filter(product_id__in=losers).update(product_id=canonical_id)
-                Movement.objects.filter(product_id__in=losers).update(product_id=canonical_id)
-                # Eliminar productos duplicados
-                Product.objects.filter(id__in=losers).delete()
+        merged = batches = movements = qr_files = 0
+        for result in results:
+            if dry_run or verbose:
+                self.stdout.write(
+                    f" Tenant {result['tenant_id']}: {result['groups']} grupos, "
+                    f"{result['duplicates']} sobrantes"
+                )
+            if verbose:
+                for loser, canonical, _ in result["pairs"]:
+                    self.stdout.write(f"  Mantengo: {canonical}  |  Borro: {loser}")
+            merged += result["merged"]
+            batches += result["batches"]
+            movements += result["movements"]
+            qr_files += result["qr_files"]
 
         if dry_run:
             self.stdout.write(self.style.WARNING("Dry-run completado. No se ha modificado la BD."))
         else:
-            self.stdout.write(self.style.SUCCESS("Fusión de duplicados completada."))
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS(
+                f"Fusión de duplicados completada en {time.monotonic() - started:.1f} s: "
+                f"{merged} productos borrados, {batches} lotes y {movements} movimientos "
+                f"re-apuntados, {qr_files} imágenes QR eliminadas."
+            ))
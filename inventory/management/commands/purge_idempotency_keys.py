@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Borra las respuestas de escaneo guardadas por Idempotency-Key ya caducadas."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Registros de idempotencia borrados: {deleted}"))
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from inventory.models import Organization, DEFAULT_TENANT
+from inventory import forecasting
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las previsiones de demanda (ProductForecast) a partir de los "
+        "movimientos OUT. Por defecto solo los productos con movimientos nuevos o stock cambiado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tenant",
+            help="UUID del tenant a procesar (por defecto, todos).",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recalcula todos los productos, no solo los afectados.",
+        )
+        parser.add_argument(
+            "--max-age-hours",
+            type=int,
+            default=24,
+            help="Recalcula también previsiones más antiguas que esto (0 = nunca).",
+        )
+        parser.add_argument(
+            "--window",
+            type=int,
+            default=forecasting.DEFAULT_WINDOW_DAYS,
+            help="Días de histórico a considerar.",
+        )
+        parser.add_argument(
+            "--lead-time",
+            type=int,
+            default=forecasting.DEFAULT_LEAD_TIME_DAYS,
+            help="Días de reposición usados para el punto de pedido.",
+        )
+        parser.add_argument(
+            "--service-level",
+            type=float,
+            default=forecasting.DEFAULT_SERVICE_LEVEL,
+            help="Nivel de servicio objetivo (0.5-0.999).",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Procesos en paralelo para el ajuste (-1 = todos los núcleos).",
+        )
+
+    def handle(self, *args, **options):
+        if options["tenant"]:
+            tenants = [options["tenant"]]
+        else:
+            tenants = [DEFAULT_TENANT] + list(
+                Organization.objects.values_list("id", flat=True)
+            )
+
+        max_age = (
+            timedelta(hours=options["max_age_hours"])
+            if options["max_age_hours"]
+            else None
+        )
+
+        total = 0
+        for tenant_id in tenants:
+            written = forecasting.refresh_tenant(
+                tenant_id,
+                full=options["full"],
+                max_age=max_age,
+                window_days=options["window"],
+                lead_time_days=options["lead_time"],
+                service_level=options["service_level"],
+                n_jobs=options["jobs"],
+            )
+            if written:
+                self.stdout.write(f" {tenant_id}: {written} previsiones actualizadas")
+            total += written
+
+        self.stdout.write(self.style.SUCCESS(f"Previsiones actualizadas: {total}"))
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import slowlog
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrupa el registro de consultas lentas (logs/slow_queries.log) por "
+        "huella: veces, tiempo total, p95, vistas, origen y plan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            help="Log a analizar (por defecto LOG_DIR/slow_queries.log y sus rotaciones).",
+        )
+        parser.add_argument(
+            "--since",
+            type=float,
+            help="Solo las últimas N horas.",
+        )
+        parser.add_argument(
+            "--sort",
+            choices=["total", "count", "max", "p95"],
+            default="total",
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Muestra el plan de ejecución de cada consulta.",
+        )
+        parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+
+    def handle(self, *args, **options):
+        path = options["file"] or str(settings.LOG_DIR / slowlog.LOG_FILENAME)
+        paths = slowlog.log_files(path)
+        if not paths:
+            raise CommandError(f"No existe {path}: ¿SLOW_QUERY_MS está activo?")
+
+        since = None
+        if options["since"]:
+            since = datetime.now(timezone.utc) - timedelta(hours=options["since"])
+
+        stats = slowlog.aggregate(slowlog.read_entries(paths, since), options["sort"])
+        shown = stats[: options["limit"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps([s.as_dict() for s in shown], ensure_ascii=False, indent=2))
+            return
+
+        total = sum(s.count for s in stats)
+        self.stdout.write(f"{total} consultas lentas, {len(stats)} huellas distintas\n")
+        self.stdout.write(f"{'total_ms':>10} {'n':>6} {'p95_ms':>9} {'max_ms':>9}  scan")
+        self.stdout.write("-" * 44)
+        for s in shown:
+            scan = self.style.WARNING("SCAN") if s.full_scan else "    "
+            self.stdout.write(
+                f"{s.total_ms:>10.1f} {s.count:>6} {s.p95_ms:>9.1f} {s.max_ms:>9.1f}  {scan}  {s.sql[:160]}"
+            )
+            view, _ = s.views.most_common(1)[0]
+            frame, _ = s.frames.most_common(1)[0]
+            self.stdout.write(f"{'':>40}vista: {view}  |  origen: {frame}")
+            if options["plans"] and s.plan:
+                for line in s.plan:
+                    self.stdout.write(f"{'':>40}  {line}")
+
+        scans = sum(1 for s in stats if s.full_scan)
+        if scans:
+            self.stdout.write(self.style.WARNING(f"\n{scans} huella(s) recorren tablas enteras (SCAN / Seq Scan)."))
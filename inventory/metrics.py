@@ -0,0 +1,490 @@
+"""
+Métricas de operación en formato de exposición de Prometheus (GET /metrics).
+
+Registro en proceso, sin dependencias ni servicios externos: contadores e
+histogramas con etiquetas, protegidos por un lock por métrica (un
+incremento cuesta menos de un microsegundo).
+
+- smartinv_scans_total{type,outcome} y smartinv_scan_duration_seconds{type}:
+  escaneos por tipo (IN/OUT/AUD/AUDTOTAL...) y su latencia.
+- smartinv_scan_errors_total{type,code}: códigos devueltos por
+  ScanEndpoint._error (insufficient_stock, concurrency_race, busy...).
+- smartinv_stock_movements_total / smartinv_stock_units_total{type}:
+  movimientos confirmados y unidades movidas.
+- smartinv_http_requests_total / smartinv_http_request_duration_seconds:
+  todas las peticiones, por ruta de URL (MetricsMiddleware).
+- smartinv_db_lock_wait_seconds{statement}: duración de BEGIN IMMEDIATE
+  (SQLite) y de SELECT ... FOR UPDATE, es decir, la espera por el lock.
+- smartinv_writer_*: espera en la cola del hilo escritor (inventory/writer.py),
+  tamaño de los grupos y comandos fallidos.
+- smartinv_cache_requests_total{namespace,result}: aciertos y fallos de la
+  caché de lecturas por tenant (inventory/tenant_cache.py).
+
+Varios procesos (gunicorn con workers, varios launcher): con METRICS_DIR
+cada proceso vuelca sus contadores e histogramas a METRICS_DIR/<pid>.json
+(como mucho cada METRICS_FLUSH_SECONDS) y /metrics suma los de todos. Los
+ficheros de procesos terminados se conservan para que los contadores no
+retrocedan; conviene vaciar el directorio al arrancar el servicio. Los
+gauges (smartinv_writer_pending) son del proceso que atiende el scrape.
+
+Acceso: staff, desde METRICS_ALLOWED_IPS sin pasar por un proxy o con
+METRICS_TOKEN (ver metrics_view en inventory/views.py).
+
+    curl -s http://127.0.0.1:8000/metrics
+    curl -s -H "Authorization: Bearer $METRICS_TOKEN" https://inventario.example/metrics
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Movement
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCK_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+SCAN_TYPES = {"IN", "OUT", "AUD", "AUDTOTAL", "ADJ"}
+
+
+def enabled():
+    return getattr(settings, "METRICS", True)
+
+
+# =========================
+#  Tipos de métrica
+# =========================
+
+class _Metric:
+    type = "untyped"
+    persisted = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # (valores de etiqueta) -> valor
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def values(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def merge(self, total, value):
+        return total + value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0  # se publica aunque aún no haya pasado nada
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+
+class Histogram(_Metric):
+    """Cada valor es [n por cubo..., n en +Inf, suma]."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def _copy(self, value):
+        return list(value)
+
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, key, value):
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), value[:-1]):
+            cumulative += n
+            yield f"{self.name}_bucket", key + (_format_value(bound),), cumulative
+        yield f"{self.name}_sum", key, value[-1]
+        yield f"{self.name}_count", key, cumulative
+
+
+class Gauge(_Metric):
+    """Valor calculado en el momento del scrape con fn(); no se vuelca a disco."""
+
+    type = "gauge"
+    persisted = False
+
+    def __init__(self, name, documentation, fn):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def values(self):
+        return {(): self.fn()}
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+
+# =========================
+#  Registro
+# =========================
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._flushed = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, fn):
+        return self.register(Gauge(name, documentation, fn))
+
+    def snapshot(self):
+        """{nombre: [[etiquetas, valor], ...]} de las métricas persistibles."""
+        return {
+            name: [[list(key), value] for key, value in metric.values().items()]
+            for name, metric in self._metrics.items()
+            if metric.persisted
+        }
+
+    # --- varios procesos ---
+
+    def flush(self, directory, force=False):
+        """
+        Vuelca el snapshot de este proceso a directory/<pid>.json (escritura
+        atómica). Sin force, como mucho una vez cada METRICS_FLUSH_SECONDS.
+        """
+        now = time.monotonic()
+        interval = getattr(settings, "METRICS_FLUSH_SECONDS", 5)
+        if not force and now - self._flushed < interval:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._flushed = now
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{os.getpid()}.json")
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        finally:
+            self._flush_lock.release()
+
+    def collect(self, directory=None):
+        """
+        {nombre: {etiquetas: valor}}. Con directory, suma los snapshots de
+        todos los procesos (incluido este, que se vuelca antes).
+        """
+        if not directory:
+            return {name: metric.values() for name, metric in self._metrics.items()}
+
+        self.flush(directory, force=True)
+        merged = {
+            name: ({} if metric.persisted else metric.values())
+            for name, metric in self._metrics.items()
+        }
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # volcado a medias o de otra versión
+            for name, samples in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None or not metric.persisted:
+                    continue
+                values = merged[name]
+                for labels, value in samples:
+                    key = tuple(labels)
+                    values[key] = metric.merge(values[key], value) if key in values else value
+        return merged
+
+    def render(self, directory=None):
+        """Texto en formato de exposición de Prometheus (0.0.4)."""
+        lines = []
+        for name, values in self.collect(directory).items():
+            metric = self._metrics[name]
+            lines.append(f"# HELP {name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            labelnames = metric.labelnames
+            for key in sorted(values):
+                for sample, labels, value in metric.samples(key, values[key]):
+                    names = labelnames + ("le",) if len(labels) > len(labelnames) else labelnames
+                    lines.append(f"{sample}{_format_labels(names, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+registry = Registry()
+
+
+# =========================
+#  Métricas
+# =========================
+
+SCANS = registry.counter(
+    "smartinv_scans_total",
+    "Escaneos procesados por tipo y resultado (ok/error).",
+    ("type", "outcome"),
+)
+SCAN_ERRORS = registry.counter(
+    "smartinv_scan_errors_total",
+    "Errores devueltos por /api/scan/ por tipo de escaneo y código.",
+    ("type", "code"),
+)
+SCAN_DURATION = registry.histogram(
+    "smartinv_scan_duration_seconds",
+    "Duración de un escaneo (validación, escritura y respuesta) por tipo.",
+    ("type",),
+)
+STOCK_MOVEMENTS = registry.counter(
+    "smartinv_stock_movements_total",
+    "Movimientos de stock confirmados por tipo.",
+    ("type",),
+)
+STOCK_UNITS = registry.counter(
+    "smartinv_stock_units_total",
+    "Unidades movidas (valor absoluto) en movimientos confirmados, por tipo.",
+    ("type",),
+)
+HTTP_REQUESTS = registry.counter(
+    "smartinv_http_requests_total",
+    "Peticiones HTTP por método, ruta de URL y código de estado.",
+    ("method", "route", "status"),
+)
+HTTP_DURATION = registry.histogram(
+    "smartinv_http_request_duration_seconds",
+    "Duración de las peticiones HTTP dentro de Django, por método y ruta de URL.",
+    ("method", "route"),
+)
+DB_LOCK_WAIT = registry.histogram(
+    "smartinv_db_lock_wait_seconds",
+    "Duración de BEGIN IMMEDIATE (SQLite) y SELECT ... FOR UPDATE: espera por el lock.",
+    ("statement",),
+    buckets=LOCK_BUCKETS,
+)
+WRITER_QUEUE_WAIT = registry.histogram(
+    "smartinv_writer_queue_wait_seconds",
+    "Tiempo de un comando en la cola del hilo escritor hasta entrar en su grupo.",
+    buckets=LOCK_BUCKETS,
+)
+WRITER_GROUP_SIZE = registry.histogram(
+    "smartinv_writer_group_size",
+    "Comandos por transacción (group commit) del hilo escritor.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+WRITER_FAILED = registry.counter(
+    "smartinv_writer_failed_commands_total",
+    "Comandos del hilo escritor que terminaron con excepción.",
+)
+CACHE_REQUESTS = registry.counter(
+    "smartinv_cache_requests_total",
+    "Lecturas de la caché por tenant por espacio (tree, search, audit...) y resultado (hit/miss/bypass).",
+    ("namespace", "result"),
+)
+
+
+def _writer_pending():
+    from .writer import writer
+
+    return writer.pending()
+
+
+registry.gauge(
+    "smartinv_writer_pending",
+    "Comandos esperando en la cola del hilo escritor (este proceso).",
+    _writer_pending,
+)
+
+
+def scan_label(mtype):
+    if mtype is None:
+        return "unknown"
+    return mtype if mtype in SCAN_TYPES else "other"
+
+
+def observe_scan(mtype, response, elapsed):
+    """
+    Cuenta un escaneo terminado. response None: el escaneo lanzó una
+    excepción (se responde server_error).
+    """
+    label = scan_label(mtype)
+    if response is None:
+        SCAN_ERRORS.inc(type=label, code="server_error")
+        outcome = "error"
+    else:
+        outcome = "ok" if response.status_code < 400 else "error"
+    SCANS.inc(type=label, outcome=outcome)
+    SCAN_DURATION.observe(elapsed, type=label)
+
+
+@receiver(post_save, sender=Movement)
+def _count_movement(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    mtype = instance.movement_type
+    units = abs(instance.quantity or 0)
+
+    def _confirmed():
+        STOCK_MOVEMENTS.inc(type=mtype)
+        STOCK_UNITS.inc(units, type=mtype)
+
+    # Solo si la transacción se confirma (un savepoint deshecho no cuenta)
+    transaction.on_commit(_confirmed, using=kwargs.get("using"))
+
+
+# =========================
+#  Espera por el lock de la BD
+# =========================
+
+_installed = False
+
+
+def _lock_statement(sql):
+    if sql[:5].upper() == "BEGIN":
+        return "begin"
+    if "FOR UPDATE" in sql:
+        return "select_for_update"
+    return None
+
+
+def _lock_wait_wrapper(execute, sql, params, many, context):
+    statement = _lock_statement(sql) if isinstance(sql, str) else None
+    if statement is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        DB_LOCK_WAIT.observe(time.perf_counter() - t0, statement=statement)
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if _lock_wait_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_lock_wait_wrapper)
+
+
+def install():
+    """Mide BEGIN/FOR UPDATE en todas las conexiones. Idempotente."""
+    global _installed
+    if not enabled():
+        return
+    if not _installed:
+        connection_created.connect(_add_wrapper, dispatch_uid="inventory_metrics_lock_wait")
+        _installed = True
+    for conn in connections.all(initialized_only=True):
+        _add_wrapper(None, conn)
+
+
+# =========================
+#  Middleware
+# =========================
+
+class MetricsMiddleware:
+    """
+    Cuenta y cronometra cada petición por ruta de URL (el patrón, no la
+    ruta concreta, para no crear una serie por id). Con METRICS_DIR vuelca
+    el snapshot del proceso de vez en cuando.
+
+    Admite ASGI sin pasar por un hilo: el escaneo asíncrono espera al
+    escritor en el bucle de eventos (inventory/async_api.py).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = getattr(settings, "METRICS_DIR", None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        t0 = time.perf_counter()
+        response = self.get_response(request)
+        return self._record(request, response, time.perf_counter() - t0)
+
+    async def __acall__(self, request):
+        t0 = time.perf_counter()
+        response = await self.get_response(request)
+        return self._record(request, response, time.perf_counter() - t0)
+
+    def _record(self, request, response, elapsed):
+        match = getattr(request, "resolver_match", None)
+        route = (match.route or match.view_name) if match else "<unmatched>"
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        HTTP_DURATION.observe(elapsed, method=request.method, route=route)
+
+        if self.directory:
+            registry.flush(self.directory)
+        return response
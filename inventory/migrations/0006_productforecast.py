@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_appmeta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.UUIDField(db_index=True, default='00000000-0000-0000-0000-000000000001', editable=False)),
+                ('window_days', models.PositiveIntegerField(default=90)),
+                ('avg_daily_demand', models.FloatField(default=0)),
+                ('demand_std', models.FloatField(default=0)),
+                ('trend', models.FloatField(default=0, help_text='Variación diaria de la demanda (unidades/día²).')),
+                ('forecast_daily_demand', models.FloatField(default=0)),
+                ('current_stock', models.IntegerField(default=0)),
+                ('suggested_min_stock', models.PositiveIntegerField(default=0)),
+                ('days_until_stockout', models.FloatField(blank=True, null=True)),
+                ('last_movement_at', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['days_until_stockout'],
+                'indexes': [models.Index(fields=['tenant_id', 'days_until_stockout'], name='inventory_p_tenant__b8a192_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_productforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovementDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.UUIDField(db_index=True, default='00000000-0000-0000-0000-000000000001', editable=False)),
+                ('day', models.DateField()),
+                ('in_qty', models.IntegerField(default=0)),
+                ('out_qty', models.IntegerField(default=0)),
+                ('adj_qty', models.IntegerField(default=0)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['tenant_id', 'day'], name='inventory_m_tenant__b488fe_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tenant_id', 'product', 'location', 'day'), name='uniq_movement_daily')],
+            },
+        ),
+    ]
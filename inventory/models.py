@@ -3,6 +3,7 @@ import unicodedata
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import Q
 from django.utils.text import slugify
@@ -140,6 +141,9 @@ class Location(models.Model):
         related_name="children",
     )
 
+    # Para la sincronización incremental del catálogo (inventory.catalog)
+    updated_at = models.DateTimeField(auto_now=True)
+
     objects = TenantManager()
 
     class Meta:
@@ -150,6 +154,9 @@ class Location(models.Model):
                 name="uniq_location_per_parent_tenant",
             )
         ]
+        indexes = [
+            models.Index(fields=["tenant_id", "updated_at"]),
+        ]
         ordering = ["name"]
 
     def clean(self):
@@ -195,15 +202,26 @@ class Location(models.Model):
         de la propia ubicación.
         Útil para auditorías recursivas (subárbol).
         """
+        # Una sola consulta con (id, parent_id) del tenant en lugar de
+        # children.all() por cada nodo
+        children = {}
+        for loc_id, parent_id in Location.objects.filter(
+            tenant_id=self.tenant_id
+        ).values_list("id", "parent_id"):
+            children.setdefault(parent_id, []).append(loc_id)
+
         ids = []
-        stack = [self]
+        seen = set()
+        stack = [self.pk]
 
         while stack:
             node = stack.pop()
-            if include_self or node.pk != self.pk:
-                ids.append(node.pk)
-            # children viene de related_name="children"
-            stack.extend(list(node.children.all()))
+            if node in seen:
+                continue
+            seen.add(node)
+            if include_self or node != self.pk:
+                ids.append(node)
+            stack.extend(children.get(node, ()))
 
         return ids
 
@@ -325,6 +343,9 @@ class Product(models.Model):
         blank=True,
     )
 
+    # Para la sincronización incremental del catálogo (inventory.catalog)
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ["name"]
         constraints = [
@@ -340,6 +361,7 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=["tenant_id", "location", "name_normalized"]),
             models.Index(fields=["tenant_id", "name"]),
+            models.Index(fields=["tenant_id", "updated_at"]),
         ]
 
     def __str__(self):
@@ -711,6 +733,176 @@ class AppMeta(models.Model):
             )
         ]
 
+
+# =========================
+#  Previsión de demanda (precalculada)
+# =========================
+
+class ProductForecast(models.Model):
+    """
+    Previsión de consumo por producto, calculada a partir de los
+    movimientos OUT por `manage.py refresh_forecasts`.
+    Los paneles leen esta tabla en lugar de recalcular la serie.
+    """
+    tenant_id = models.UUIDField(
+        default=DEFAULT_TENANT,
+        editable=False,
+        db_index=True,
+    )
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="forecast",
+    )
+
+    window_days = models.PositiveIntegerField(default=90)
+    avg_daily_demand = models.FloatField(default=0)
+    demand_std = models.FloatField(default=0)
+    trend = models.FloatField(
+        default=0,
+        help_text="Variación diaria de la demanda (unidades/día²).",
+    )
+    forecast_daily_demand = models.FloatField(default=0)
+
+    current_stock = models.IntegerField(default=0)
+    suggested_min_stock = models.PositiveIntegerField(default=0)
+    days_until_stockout = models.FloatField(null=True, blank=True)
+
+    # Último movimiento (de cualquier tipo) considerado, para el refresco incremental
+    last_movement_at = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = TenantManager()
+
+    class Meta:
+        ordering = ["days_until_stockout"]
+        indexes = [
+            models.Index(fields=["tenant_id", "days_until_stockout"]),
+        ]
+
+    def __str__(self):
+        return f"Previsión de {self.product.name}"
+
+
+# =========================
+#  Rollup diario de movimientos
+# =========================
+
+class MovementDaily(models.Model):
+    """
+    Agregado diario de movimientos por (tenant, producto, ubicación, día).
+    Se mantiene al guardar cada Movement (ver inventory.rollups) y se puede
+    reconstruir con `manage.py backfill_movement_rollups`.
+    Las consultas de analítica leen de aquí y no de Movement.
+    """
+    tenant_id = models.UUIDField(
+        default=DEFAULT_TENANT,
+        editable=False,
+        db_index=True,
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="daily_rollups",
+    )
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name="daily_rollups",
+    )
+    day = models.DateField()
+
+    in_qty = models.IntegerField(default=0)
+    # Unidades consumidas (positivo)
+    out_qty = models.IntegerField(default=0)
+    # Ajustes netos (con signo)
+    adj_qty = models.IntegerField(default=0)
+
+    objects = TenantManager()
+
+    class Meta:
+        ordering = ["day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant_id", "product", "location", "day"],
+                name="uniq_movement_daily",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["tenant_id", "day"]),
+        ]
+
+# =========================
+#  Idempotencia de escaneos
+# =========================
+class IdempotencyRecord(models.Model):
+    """
+    Respuesta guardada de un escaneo enviado con Idempotency-Key.
+    Si el cliente reintenta con la misma clave se devuelve esta respuesta
+    sin volver a tocar lotes ni movimientos (ver inventory.idempotency).
+    Caducan a las settings.IDEMPOTENCY_TTL_HOURS horas.
+    """
+    tenant_id = models.UUIDField(
+        default=DEFAULT_TENANT,
+        editable=False,
+    )
+    key = models.CharField(max_length=100)
+    # sha256 del cuerpo de la petición: misma clave con otro cuerpo = error
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = TenantManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant_id", "key"],
+                name="uniq_idempotency_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
+
+
+# =========================
+#  Borrados del catálogo (sincronización incremental)
+# =========================
+class CatalogTombstone(models.Model):
+    """
+    Marca de borrado de un producto o ubicación. Los clientes que
+    mantienen una copia local del catálogo la reciben en
+    /api/catalog/sync/ para eliminar la fila. Se purgan a los
+    settings.CATALOG_TOMBSTONE_TTL_DAYS días (ver inventory.catalog).
+    """
+    KIND_PRODUCT = "product"
+    KIND_LOCATION = "location"
+    KIND_CHOICES = [
+        (KIND_PRODUCT, "Producto"),
+        (KIND_LOCATION, "Ubicación"),
+    ]
+
+    tenant_id = models.UUIDField(
+        default=DEFAULT_TENANT,
+        editable=False,
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = TenantManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant_id", "deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+
+
 # =========================
 #  Signals: auto-crear Organization por usuario
 # =========================
@@ -0,0 +1,235 @@
+"""
+Perfilado por petición (opcional, PROFILING=on).
+
+Para cada petición muestreada (PROFILING_SAMPLE_RATE) se escribe una línea
+JSON en el logger "inventory.profiling" (logs/profiling.log, rotativo) con:
+
+- wall_ms: tiempo total dentro de Django
+- db_ms y queries: tiempo y número de consultas (inventory.querycount)
+- serialize_ms: render de la respuesta (DRF/plantillas)
+- spans: tramos con nombre medidos con span(), p. ej. las fases de
+  ScanEndpoint: scan.parse, scan.location, scan.write (incluye la cola
+  del hilo escritor), scan.stock, scan.fifo, scan.movement,
+  scan.response y scan.audit
+
+Con PROFILING_CPROFILE_RATE > 0 una fracción de las peticiones se ejecuta
+bajo cProfile y, si tardan al menos PROFILING_SLOW_MS, se guarda el .prof
+en PROFILING_DIR. Solo se conservan los PROFILING_MAX_DUMPS más lentos.
+cProfile solo ve el hilo de la petición (no el hilo escritor) y se perfila
+una petición a la vez.
+
+    python -m pstats logs/profiles/001234ms-....prof
+
+span() no hace nada si la petición no se está perfilando.
+"""
+import contextvars
+import cProfile
+import heapq
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .querycount import QueryRecorder
+
+logger = logging.getLogger("inventory.profiling")
+
+_current = contextvars.ContextVar("inventory_request_profile", default=None)
+
+
+class RequestProfile:
+    """Tramos acumulados de una petición: {nombre: [segundos, veces]}."""
+
+    def __init__(self):
+        self.spans = {}
+        self.serialize = 0.0
+
+    def add(self, name, elapsed):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [elapsed, 1]
+        else:
+            entry[0] += elapsed
+            entry[1] += 1
+
+    def spans_ms(self):
+        return {
+            name: round(total * 1000, 3) if count == 1 else {"ms": round(total * 1000, 3), "n": count}
+            for name, (total, count) in self.spans.items()
+        }
+
+
+class _Span:
+    __slots__ = ("profile", "name", "t0")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """
+    with span("scan.fifo"):
+        ...
+
+    Mide el tramo si la petición actual se está perfilando.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NO_SPAN
+    return _Span(profile, name)
+
+
+# =========================
+#  Volcados de cProfile
+# =========================
+
+_SLUG = re.compile(r"[^A-Za-z0-9]+")
+
+
+class ProfileDumps:
+    """Conserva en disco los `max_dumps` volcados más lentos."""
+
+    def __init__(self, directory, max_dumps):
+        self.directory = directory
+        self.max_dumps = max_dumps
+        self._kept = []  # heap (wall_ms, ruta): el más rápido arriba
+        self._lock = threading.Lock()
+
+    def save(self, profiler, wall_ms, request):
+        with self._lock:
+            if len(self._kept) >= self.max_dumps and wall_ms <= self._kept[0][0]:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            slug = _SLUG.sub("-", request.path).strip("-")[:60] or "root"
+            path = os.path.join(
+                self.directory, f"{int(wall_ms):06d}ms-{stamp}-{request.method}-{slug}.prof"
+            )
+            profiler.dump_stats(path)
+            heapq.heappush(self._kept, (wall_ms, path))
+            while len(self._kept) > self.max_dumps:
+                _, oldest = heapq.heappop(self._kept)
+                try:
+                    os.remove(oldest)
+                except OSError:
+                    pass
+            return os.path.basename(path)
+
+
+# =========================
+#  Middleware
+# =========================
+
+class ProfilingMiddleware:
+    """
+    Perfilado opcional de peticiones. Va el primero de MIDDLEWARE para que
+    wall_ms incluya el resto de middlewares.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+        self.cprofile_rate = getattr(settings, "PROFILING_CPROFILE_RATE", 0.0)
+        self.slow_ms = getattr(settings, "PROFILING_SLOW_MS", 500)
+        self.dumps = ProfileDumps(
+            str(getattr(settings, "PROFILING_DIR", "profiles")),
+            getattr(settings, "PROFILING_MAX_DUMPS", 20),
+        )
+        self._cprofile_lock = threading.Lock()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+
+        profiler = None
+        if (
+            self.cprofile_rate
+            and random.random() < self.cprofile_rate
+            and self._cprofile_lock.acquire(blocking=False)
+        ):
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        t0 = time.perf_counter()
+        try:
+            with QueryRecorder() as recorder:
+                response = self.get_response(request)
+        finally:
+            wall_ms = (time.perf_counter() - t0) * 1000
+            if profiler is not None:
+                profiler.disable()
+                self._cprofile_lock.release()
+            _current.reset(token)
+
+        dump = None
+        if profiler is not None and wall_ms >= self.slow_ms:
+            dump = self.dumps.save(profiler, wall_ms, request)
+
+        self._log(request, response, profile, recorder, wall_ms, dump)
+        return response
+
+    def process_template_response(self, request, response):
+        # Se llama justo antes del render: el callback mide la serialización
+        profile = _current.get()
+        if profile is not None:
+            start = time.perf_counter()
+
+            def _rendered(rendered):
+                profile.serialize += time.perf_counter() - start
+
+            response.add_post_render_callback(_rendered)
+        return response
+
+    def _log(self, request, response, profile, recorder, wall_ms, dump):
+        match = getattr(request, "resolver_match", None)
+        user = getattr(request, "user", None)
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "method": request.method,
+            "path": request.path,
+            "view": (match.view_name or match._func_path) if match else None,
+            "status": response.status_code,
+            "user": user.pk if user is not None and user.is_authenticated else None,
+            "wall_ms": round(wall_ms, 3),
+            "db_ms": round(recorder.time * 1000, 3),
+            "queries": recorder.count,
+            "serialize_ms": round(profile.serialize * 1000, 3),
+            "spans": profile.spans_ms(),
+        }
+        if dump:
+            record["profile"] = dump
+        logger.info(json.dumps(record, ensure_ascii=False))
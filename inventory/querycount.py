@@ -0,0 +1,256 @@
+"""
+Recuento de consultas SQL por petición y presupuestos de consultas.
+
+Cada endpoint declara cuántas consultas puede hacer como máximo
+(`query_budget`), independientemente del tamaño de los datos: una
+consulta por fila (N+1) rompe el presupuesto en cuanto hay datos reales.
+
+- QueryRecorder cuenta las consultas del contexto actual (contextvar), con
+  su tiempo y una huella por sentencia (parámetros y listas IN colapsados)
+  para detectar la misma consulta repetida N veces.
+- Los comandos del hilo escritor (inventory.writer) se ejecutan con el
+  contexto de quien los envía, así que también cuentan para la petición.
+- QueryCountMiddleware (activo con QUERY_COUNT_HEADERS, por defecto en
+  DEBUG) añade las cabeceras X-Query-* a la respuesta y avisa en el logger
+  "inventory.queries" cuando se supera el presupuesto.
+- assert_max_queries() es el equivalente para pruebas y scripts
+  (ver benchmarks/query_budgets.py).
+
+Declaración del presupuesto:
+    class MiVista(APIView):
+        query_budget = 6            # APIView / ViewSet / ModelAdmin
+
+    @query_budget(4)                # vistas función (también async)
+    def mi_vista(request): ...
+
+    set_budget(request, 10 + 20 * n)  # desde la vista, si depende de la petición
+
+Las respuestas en streaming solo cuentan lo ejecutado antes de empezar a
+enviar el cuerpo.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("inventory.queries")
+
+_current = contextvars.ContextVar("inventory_query_recorder", default=None)
+_installed = False
+
+_IN_LIST = re.compile(r"\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)", re.IGNORECASE)
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Sentencia normalizada: misma huella para la misma consulta con otros
+    parámetros, otro número de elementos en IN (...) u otro savepoint.
+    """
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("N", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+# =========================
+#  Registro
+# =========================
+
+class QueryRecorder:
+    """
+    Cuenta las consultas ejecutadas mientras está activo (with ...).
+    Se puede anidar: la consulta cuenta para todos los registradores
+    abiertos del contexto.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.fingerprints = Counter()
+        self._parent = None
+        self._token = None
+
+    @property
+    def duplicates(self):
+        """Consultas repetidas (misma huella) por encima de la primera."""
+        return sum(n - 1 for n in self.fingerprints.values() if n > 1)
+
+    def repeated(self, limit=5):
+        """[(huella, veces)] de las consultas repetidas, de más a menos."""
+        return [(sql, n) for sql, n in self.fingerprints.most_common(limit) if n > 1]
+
+    def record(self, sql, elapsed):
+        recorder = self
+        while recorder is not None:
+            recorder.count += 1
+            recorder.time += elapsed
+            recorder.fingerprints[fingerprint(sql)] += 1
+            recorder = recorder._parent
+
+    def __enter__(self):
+        install()
+        self._parent = _current.get()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        self._token = None
+        return False
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record(sql, time.perf_counter() - t0)
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def install():
+    """
+    Engancha el contador en todas las conexiones (las ya abiertas en este
+    hilo y las que se creen después, en cualquier hilo). Idempotente.
+    """
+    global _installed
+    if not _installed:
+        connection_created.connect(_add_wrapper, dispatch_uid="inventory_querycount")
+        _installed = True
+    for conn in connections.all(initialized_only=True):
+        _add_wrapper(None, conn)
+
+
+# =========================
+#  Presupuestos
+# =========================
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, recorder, budget, label=""):
+        self.recorder = recorder
+        self.budget = budget
+        lines = [f"{label or 'Bloque'}: {recorder.count} consultas (presupuesto {budget})"]
+        lines += [f"  {n}x {sql[:200]}" for sql, n in recorder.repeated()]
+        super().__init__("\n".join(lines))
+
+
+def query_budget(n):
+    """Declara el presupuesto de consultas de una vista función."""
+
+    def decorator(view_func):
+        view_func.query_budget = n
+        return view_func
+
+    return decorator
+
+
+def set_budget(request, n):
+    """
+    Fija el presupuesto de esta petición desde la vista, cuando depende de
+    la petición (tipo de escaneo, número de operaciones de un lote...).
+    Acepta el HttpRequest o el Request de DRF.
+    """
+    getattr(request, "_request", request)._query_budget = n
+
+
+def budget_for(view_func):
+    """
+    Presupuesto declarado para la vista resuelta por la URL, o None.
+    Busca en la función, en la clase de as_view() (APIView, ViewSet, vistas
+    genéricas de Django) y en el ModelAdmin de las vistas del admin.
+    """
+    budget = getattr(view_func, "query_budget", None)
+    if budget is None:
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        budget = getattr(view_class, "query_budget", None)
+    if budget is None:
+        budget = getattr(getattr(view_func, "model_admin", None), "query_budget", None)
+    return budget
+
+
+class assert_max_queries:
+    """
+    with assert_max_queries(5, "AUD"):
+        client.post(...)
+
+    Lanza QueryBudgetExceeded (un AssertionError) con las consultas
+    repetidas si el bloque hace más de `n` consultas.
+    """
+
+    def __init__(self, n, label=""):
+        self.n = n
+        self.label = label
+        self.recorder = QueryRecorder()
+
+    def __enter__(self):
+        return self.recorder.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.recorder.count > self.n:
+            raise QueryBudgetExceeded(self.recorder, self.n, self.label)
+        return False
+
+
+# =========================
+#  Middleware
+# =========================
+
+class QueryCountMiddleware:
+    """
+    Cabeceras por respuesta:
+      X-Query-Count, X-Query-Duplicates, X-Query-Time-Ms
+      X-Query-Budget y X-Query-Budget-Exceeded (si la vista declara presupuesto)
+
+    Va la primera de MIDDLEWARE para contar también sesión y usuario.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_COUNT_HEADERS", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        request._query_budget = None
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        response["X-Query-Count"] = str(recorder.count)
+        response["X-Query-Duplicates"] = str(recorder.duplicates)
+        response["X-Query-Time-Ms"] = f"{recorder.time * 1000:.1f}"
+
+        budget = request._query_budget
+        if budget is not None:
+            response["X-Query-Budget"] = str(budget)
+            if recorder.count > budget:
+                response["X-Query-Budget-Exceeded"] = "1"
+                logger.warning(
+                    "%s %s: %d consultas (presupuesto %d)%s",
+                    request.method,
+                    request.path,
+                    recorder.count,
+                    budget,
+                    "".join(f"\n  {n}x {sql[:200]}" for sql, n in recorder.repeated()),
+                )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = budget_for(view_func)
+        return None
@@ -0,0 +1,220 @@
+"""
+Lecturas en réplica para los endpoints de solo lectura.
+
+Los endpoints marcados como de solo lectura (AUD, AUDTOTAL, búsqueda
+rápida, árbol de ubicaciones, listados de los ViewSets, informes,
+analítica y exportaciones) leen del alias "replica" si está configurado
+(ver DATABASE_REPLICA_URL en settings.py):
+
+- PostgreSQL: una réplica en streaming (DATABASE_REPLICA_URL).
+- SQLite: una segunda conexión al mismo fichero con PRAGMA query_only. En
+  WAL sus lecturas no esperan al escritor y, al no usar BEGIN IMMEDIATE,
+  una transacción de lectura no toma el lock de escritura.
+
+ReplicaRouter solo manda a la réplica las lecturas hechas dentro de
+read_only() y fuera de una transacción de la BD principal (las lecturas de
+un flujo de escritura, y select_for_update, van siempre a la principal).
+Las escrituras van siempre a la principal.
+
+Lectura de lo escrito: si una petición escribe en la BD principal,
+ReplicaMiddleware fija al cliente (cookie) a la principal durante
+DATABASE_REPLICA_PIN_SECONDS, para que el AUD que sigue a un IN vea el
+movimiento aunque la réplica vaya con retraso. Con 0 (por defecto con la
+conexión de lectura de SQLite, que no tiene retraso) no se fija nada.
+
+Marcado:
+    class MiVista(ReplicaReadMixin, APIView): ...   # GET/HEAD/OPTIONS
+
+    with read_only():
+        ...
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+REPLICA_ALIAS = "replica"
+PIN_COOKIE = "smartinv_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLAC")
+
+_reading = contextvars.ContextVar("inventory_replica_reading", default=False)
+_request = contextvars.ContextVar("inventory_replica_request", default=None)
+_installed = False
+
+
+def enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def pin_seconds():
+    return getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 0) if enabled() else 0
+
+
+def pinned():
+    """True si la petición en curso lee de la principal (cliente fijado o que ya ha escrito)."""
+    state = _request.get()
+    return state is not None and (state.pinned or state.wrote)
+
+
+@contextmanager
+def read_only():
+    """Las lecturas del bloque van a la réplica (si la hay y el cliente no está fijado)."""
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+class _RequestState:
+    """Estado de la petición en curso: fijada a la principal y si ha escrito."""
+
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# =========================
+#  Router
+# =========================
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _reading.get() or not enabled():
+            return None
+        if pinned():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # También para instancias leídas de la réplica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mismos datos en las dos BD
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA_ALIAS else None
+
+
+# =========================
+#  Lectura de lo escrito
+# =========================
+
+def _pin_wrapper(execute, sql, params, many, context):
+    state = _request.get()
+    if state is not None and not state.wrote and sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+        state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS and _pin_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_pin_wrapper)
+
+
+def install():
+    """Detecta las escrituras en la BD principal si hay que fijar clientes. Idempotente."""
+    global _installed
+    if not pin_seconds():
+        return
+    if not _installed:
+        connection_created.connect(_add_wrapper, dispatch_uid="inventory_replica_pin")
+        _installed = True
+    for conn in connections.all(initialized_only=True):
+        _add_wrapper(None, conn)
+
+
+class ReplicaMiddleware:
+    """
+    Fija a la BD principal, durante DATABASE_REPLICA_PIN_SECONDS, al
+    cliente que acaba de escribir. Las escrituras del hilo escritor cuentan
+    para la petición que las envía.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not pin_seconds():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self._pin(request, response, state)
+
+    async def __acall__(self, request):
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self._pin(request, response, state)
+
+    def _pin(self, request, response, state):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=pin_seconds(),
+                httponly=True,
+                samesite="Lax",
+                secure=request.is_secure(),
+            )
+        return response
+
+
+# =========================
+#  Vistas
+# =========================
+
+class ReplicaReadMixin:
+    """Las peticiones GET/HEAD/OPTIONS de la vista leen de la réplica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def iter_read_only(iterable):
+    """
+    Itera `iterable` (el cuerpo de un StreamingHttpResponse) leyendo de la
+    réplica: el cuerpo se genera después de salir de la vista.
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            with read_only():
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            yield chunk
+    finally:
+        # Cliente desconectado: cierra también el generador interno (cursores)
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
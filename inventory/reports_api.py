@@ -0,0 +1,164 @@
+import csv
+import uuid
+
+from django.db import models
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from .models import Location, ProductForecast
+from .locations_api import get_tenant_from_request
+from . import valuation
+from .replicas import ReplicaReadMixin
+
+
+def resolve_location_param(request, tenant_id):
+    """
+    Lee ?location= (id numérico del árbol o public_id UUID del escáner).
+    Devuelve (location_id, error_response).
+    """
+    raw = (request.GET.get("location") or "").strip()
+    if not raw:
+        return None, None
+
+    lookup = {"tenant_id": tenant_id}
+    try:
+        lookup["public_id"] = uuid.UUID(raw)
+    except ValueError:
+        if not raw.isdigit():
+            return None, Response(
+                {"ok": False, "error": "invalid_location", "detail": "Ubicación inválida."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        lookup["id"] = int(raw)
+
+    loc_id = Location.objects.filter(**lookup).values_list("id", flat=True).first()
+    if loc_id is None:
+        return None, Response(
+            {"ok": False, "error": "location_not_found", "detail": "Ubicación no encontrada."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return loc_id, None
+
+
+def _parse_horizon(request):
+    try:
+        return max(int(request.GET.get("horizon") or valuation.EXPIRY_HORIZON_DAYS), 1)
+    except ValueError:
+        return valuation.EXPIRY_HORIZON_DAYS
+
+
+class ValuationReportView(ReplicaReadMixin, APIView):
+    """
+    GET /api/reports/valuation/?location=<id|public_id>&horizon=<días>
+    Valoración del inventario del tenant: totales, por ubicación (subárbol),
+    categoría, marca y tramos de antigüedad.
+    """
+
+    permission_classes = [IsAuthenticated]
+    query_budget = 8
+
+    def get(self, request):
+        tenant_id = get_tenant_from_request(request)
+
+        location_id, error = resolve_location_param(request, tenant_id)
+        if error:
+            return error
+
+        report = valuation.build_report(
+            tenant_id,
+            location_id=location_id,
+            horizon_days=_parse_horizon(request),
+        )
+        return Response({"ok": True, **report}, status=status.HTTP_200_OK)
+
+
+class ValuationExportView(ReplicaReadMixin, APIView):
+    """
+    GET /api/reports/valuation/export/?by=location|category|brand|ageing
+    Igual que ValuationReportView pero devuelve una sección en CSV.
+    """
+
+    permission_classes = [IsAuthenticated]
+    query_budget = 8
+
+    def get(self, request):
+        tenant_id = get_tenant_from_request(request)
+
+        section = (request.GET.get("by") or "location").strip().lower()
+        if section not in valuation.REPORT_SECTIONS:
+            return Response(
+                {
+                    "ok": False,
+                    "error": "invalid_section",
+                    "detail": f"Sección no soportada: {section}",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        location_id, error = resolve_location_param(request, tenant_id)
+        if error:
+            return error
+
+        report = valuation.build_report(
+            tenant_id,
+            location_id=location_id,
+            horizon_days=_parse_horizon(request),
+        )
+        header, rows = valuation.report_rows(report, section)
+
+        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = (
+            f'attachment; filename="valuation-{section}-{report["as_of"]}.csv"'
+        )
+        writer = csv.writer(response)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return response
+
+
+class ForecastListView(ReplicaReadMixin, APIView):
+    """
+    GET /api/reports/forecasts/?below_min=1&limit=100
+    Previsiones precalculadas (ver `manage.py refresh_forecasts`),
+    ordenadas por días hasta rotura de stock.
+    """
+
+    permission_classes = [IsAuthenticated]
+    query_budget = 6
+
+    def get(self, request):
+        tenant_id = get_tenant_from_request(request)
+
+        qs = (
+            ProductForecast.objects.filter(tenant_id=tenant_id)
+            .select_related("product")
+            .order_by(models.F("days_until_stockout").asc(nulls_last=True))
+        )
+        if request.GET.get("below_min"):
+            qs = qs.filter(current_stock__lte=models.F("suggested_min_stock"))
+
+        try:
+            # Un límite negativo haría un slice negativo del queryset (error 500)
+            limit = max(1, min(int(request.GET.get("limit") or 100), 1000))
+        except ValueError:
+            limit = 100
+
+        items = [
+            {
+                "product_id": str(f.product_id),
+                "product": f.product.name,
+                "current_stock": f.current_stock,
+                "min_stock": f.product.min_stock,
+                "suggested_min_stock": f.suggested_min_stock,
+                "avg_daily_demand": f.avg_daily_demand,
+                "forecast_daily_demand": f.forecast_daily_demand,
+                "trend": f.trend,
+                "days_until_stockout": f.days_until_stockout,
+                "computed_at": f.computed_at,
+            }
+            for f in qs[:limit]
+        ]
+        return Response({"ok": True, "total": len(items), "items": items})
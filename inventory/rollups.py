@@ -0,0 +1,258 @@
+"""
+Mantenimiento y consulta de MovementDaily (rollup diario de movimientos).
+
+- Cada Movement nuevo suma sus unidades a la fila de su día (post_save).
+- backfill() reconstruye las filas agregando Movement en la BD.
+- series()/top_products() responden a la analítica leyendo solo el rollup,
+  así que su coste depende del nº de días, no del nº de movimientos.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Location, Movement, MovementDaily
+
+
+def _deltas(movement_type, quantity):
+    """
+    (in_qty, out_qty, adj_qty) que aporta un movimiento.
+    OUT se guarda en negativo en Movement y en positivo en el rollup.
+    """
+    if movement_type == Movement.IN:
+        return quantity, 0, 0
+    if movement_type == Movement.OUT:
+        return 0, -quantity, 0
+    if movement_type == Movement.ADJ:
+        return 0, 0, quantity
+    return 0, 0, 0
+
+
+def _bump(tenant_id, product_id, location_id, day, d_in, d_out, d_adj):
+    row, _ = MovementDaily.objects.get_or_create(
+        tenant_id=tenant_id,
+        product_id=product_id,
+        location_id=location_id,
+        day=day,
+    )
+    MovementDaily.objects.filter(pk=row.pk).update(
+        in_qty=F("in_qty") + d_in,
+        out_qty=F("out_qty") + d_out,
+        adj_qty=F("adj_qty") + d_adj,
+    )
+
+
+def apply_movement(movement, sign=1):
+    d_in, d_out, d_adj = _deltas(movement.movement_type, movement.quantity)
+    if not (d_in or d_out or d_adj):
+        return
+
+    with transaction.atomic():
+        _bump(
+            movement.tenant_id,
+            movement.product_id,
+            movement.location_id,
+            timezone.localdate(movement.created_at),
+            sign * d_in,
+            sign * d_out,
+            sign * d_adj,
+        )
+
+
+def apply_movements(movements):
+    """
+    Versión en bloque de apply_movement para movimientos creados con
+    bulk_create (que no dispara post_save): agrupa por clave y día,
+    inserta de golpe las filas nuevas e incrementa las existentes con
+    un único executemany (bulk_update con F() genera un CASE enorme).
+    """
+    totals = {}
+    for m in movements:
+        deltas = _deltas(m.movement_type, m.quantity)
+        if not any(deltas):
+            continue
+        key = (m.tenant_id, m.product_id, m.location_id, timezone.localdate(m.created_at))
+        prev = totals.get(key, (0, 0, 0))
+        totals[key] = tuple(a + b for a, b in zip(prev, deltas))
+
+    if not totals:
+        return
+
+    with transaction.atomic():
+        existing = {
+            (r.tenant_id, r.product_id, r.location_id, r.day): r
+            for r in MovementDaily.objects.filter(
+                tenant_id__in={k[0] for k in totals},
+                product_id__in={k[1] for k in totals},
+                day__in={k[3] for k in totals},
+            )
+        }
+
+        new_rows, bumped = [], []
+        for key, (d_in, d_out, d_adj) in totals.items():
+            row = existing.get(key)
+            if row is None:
+                new_rows.append(
+                    MovementDaily(
+                        tenant_id=key[0],
+                        product_id=key[1],
+                        location_id=key[2],
+                        day=key[3],
+                        in_qty=d_in,
+                        out_qty=d_out,
+                        adj_qty=d_adj,
+                    )
+                )
+            else:
+                bumped.append((d_in, d_out, d_adj, row.pk))
+
+        MovementDaily.objects.bulk_create(new_rows, batch_size=500)
+        if bumped:
+            table = connection.ops.quote_name(MovementDaily._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {table} SET in_qty = in_qty + %s, "
+                    "out_qty = out_qty + %s, adj_qty = adj_qty + %s WHERE id = %s",
+                    bumped,
+                )
+
+
+@receiver(post_save, sender=Movement)
+def _rollup_on_create(sender, instance, created, raw=False, **kwargs):
+    # Los movimientos son de solo escritura: solo se cuentan al crearse
+    if created and not raw:
+        apply_movement(instance)
+
+
+@receiver(post_delete, sender=Movement)
+def _rollup_on_delete(sender, instance, **kwargs):
+    apply_movement(instance, sign=-1)
+
+
+# =========================
+#  Backfill
+# =========================
+
+def backfill(tenant_id, since=None, batch_size=1000, product_ids=None):
+    """
+    Reconstruye el rollup del tenant (desde `since` si se indica, solo de
+    `product_ids` si se indican) agregando Movement en la BD. Devuelve el
+    nº de filas escritas.
+    """
+    qty = F("quantity")
+    movements = Movement.objects.filter(tenant_id=tenant_id)
+    rollups = MovementDaily.objects.filter(tenant_id=tenant_id)
+    if since:
+        movements = movements.filter(created_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+        rollups = rollups.filter(product_id__in=product_ids)
+
+    grouped = (
+        movements.annotate(day=TruncDate("created_at"))
+        .order_by()
+        .values("product_id", "location_id", "day")
+        .annotate(
+            in_qty=Coalesce(Sum(Case(When(movement_type=Movement.IN, then=qty), output_field=IntegerField())), 0),
+            out_qty=Coalesce(Sum(Case(When(movement_type=Movement.OUT, then=-qty), output_field=IntegerField())), 0),
+            adj_qty=Coalesce(Sum(Case(When(movement_type=Movement.ADJ, then=qty), output_field=IntegerField())), 0),
+        )
+    )
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        buf = []
+        for row in grouped.iterator(chunk_size=batch_size):
+            buf.append(MovementDaily(tenant_id=tenant_id, **row))
+            if len(buf) >= batch_size:
+                MovementDaily.objects.bulk_create(buf)
+                written += len(buf)
+                buf = []
+        if buf:
+            MovementDaily.objects.bulk_create(buf)
+            written += len(buf)
+    return written
+
+
+# =========================
+#  Consultas
+# =========================
+
+def subtree_ids(tenant_id, location_id):
+    """
+    IDs del subárbol de `location_id` (incluida) con una sola consulta.
+    """
+    children = {}
+    for loc_id, parent_id in Location.objects.filter(tenant_id=tenant_id).values_list(
+        "id", "parent_id"
+    ):
+        children.setdefault(parent_id, []).append(loc_id)
+
+    ids, stack = [], [location_id]
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        ids.append(node)
+        stack.extend(children.get(node, []))
+    return ids
+
+
+def filtered(tenant_id, start, end, product_id=None, category=None, location_id=None):
+    qs = MovementDaily.objects.filter(tenant_id=tenant_id, day__gte=start, day__lte=end)
+    if product_id:
+        qs = qs.filter(product_id=product_id)
+    if category:
+        qs = qs.filter(product__category__iexact=category)
+    if location_id:
+        qs = qs.filter(location_id__in=subtree_ids(tenant_id, location_id))
+    return qs
+
+
+def series(qs, start, end):
+    """
+    Serie diaria continua (días sin movimiento a 0) entre start y end.
+    """
+    by_day = {
+        row["day"]: row
+        for row in qs.order_by()
+        .values("day")
+        .annotate(
+            in_qty=Coalesce(Sum("in_qty"), 0),
+            out_qty=Coalesce(Sum("out_qty"), 0),
+            adj_qty=Coalesce(Sum("adj_qty"), 0),
+        )
+    }
+
+    points = []
+    day = start
+    while day <= end:
+        row = by_day.get(day, {})
+        points.append(
+            {
+                "day": day.isoformat(),
+                "in_qty": row.get("in_qty", 0),
+                "out_qty": row.get("out_qty", 0),
+                "adj_qty": row.get("adj_qty", 0),
+            }
+        )
+        day += timedelta(days=1)
+    return points
+
+
+def top_products(qs, limit=20):
+    return list(
+        qs.order_by()
+        .values("product_id", "product__name", "product__category")
+        .annotate(out_qty=Sum("out_qty"), in_qty=Sum("in_qty"))
+        .filter(~Q(out_qty=0))
+        .order_by("-out_qty")[:limit]
+    )
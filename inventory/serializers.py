@@ -1,10 +1,27 @@
 from rest_framework import serializers
 from .models import Product, Location, Movement, Batch
 
+
+class LocationPathMixin:
+    """
+    Rutas de ubicación desde context["location_paths"] ({id: ruta}, ver
+    exporter.location_paths) si la vista lo precarga: una consulta para
+    todo el listado en lugar de full_path() por fila.
+    """
+
+    def _location_path(self, location_id, get_location):
+        if location_id is None:
+            return None
+        paths = self.context.get("location_paths")
+        if paths is not None and location_id in paths:
+            return paths[location_id]
+        return get_location().full_path()
+
+
 # --------------------------------------------
 # LOCATION SERIALIZER
 # --------------------------------------------
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(LocationPathMixin, serializers.ModelSerializer):
     full_path = serializers.SerializerMethodField()
 
     class Meta:
@@ -13,13 +30,13 @@ class LocationSerializer(serializers.ModelSerializer):
 
     def get_full_path(self, obj):
         """Devuelve la ruta completa de la ubicación."""
-        return obj.full_path() if obj else None
+        return self._location_path(obj.pk, lambda: obj) if obj else None
 
 
 # --------------------------------------------
 # PRODUCT SERIALIZER
 # --------------------------------------------
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(LocationPathMixin, serializers.ModelSerializer):
     location_path = serializers.SerializerMethodField()
 
     class Meta:
@@ -28,15 +45,13 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_location_path(self, obj):
         """Ruta completa de la ubicación del producto."""
-        if obj.location:
-            return obj.location.full_path()
-        return None
+        return self._location_path(obj.location_id, lambda: obj.location)
 
 
 # --------------------------------------------
 # MOVEMENT SERIALIZER
 # --------------------------------------------
-class MovementSerializer(serializers.ModelSerializer):
+class MovementSerializer(LocationPathMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.name", read_only=True)
     location_path = serializers.SerializerMethodField()
 
@@ -46,15 +61,13 @@ class MovementSerializer(serializers.ModelSerializer):
 
     def get_location_path(self, obj):
         """Ruta completa de la ubicación asociada al movimiento."""
-        if obj.location:
-            return obj.location.full_path()
-        return None
+        return self._location_path(obj.location_id, lambda: obj.location)
 
 
 # --------------------------------------------
 # BATCH SERIALIZER
 # --------------------------------------------
-class BatchSerializer(serializers.ModelSerializer):
+class BatchSerializer(LocationPathMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.name", read_only=True)
     location_path = serializers.SerializerMethodField()
 
@@ -64,6 +77,6 @@ class BatchSerializer(serializers.ModelSerializer):
 
     def get_location_path(self, obj):
         """Ruta completa de la ubicación del producto vinculado al lote."""
-        if obj.product and obj.product.location:
-            return obj.product.location.full_path()
+        if obj.product:
+            return self._location_path(obj.product.location_id, lambda: obj.product.location)
         return None
@@ -0,0 +1,384 @@
+"""
+Registro de consultas lentas con su plan de ejecución.
+
+Cada consulta que tarda al menos SLOW_QUERY_MS se escribe como una línea
+JSON en el logger "inventory.slowqueries" (logs/slow_queries.log) con:
+
+- ms, alias y vendor de la conexión
+- sql: la huella normalizada (inventory.querycount.fingerprint), sin valores
+- params: forma de los parámetros (tipos y número), no sus valores
+- view y path de la petición (SlowQueryMiddleware; los comandos del hilo
+  escritor heredan los de quien los envía)
+- frame y stack: las llamadas del proyecto que lanzaron la consulta
+- plan: EXPLAIN QUERY PLAN (SQLite) / EXPLAIN (PostgreSQL), capturado una
+  vez por huella cada SLOW_QUERY_EXPLAIN_TTL segundos
+
+`manage.py slow_query_report` agrupa el log por huella y marca las que
+recorren tablas enteras (SCAN en SQLite, Seq Scan en PostgreSQL).
+
+Con SLOW_QUERY_MS=0 no se instala nada. Por debajo del umbral el coste es
+medir el tiempo de la consulta.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+
+from .querycount import fingerprint
+
+logger = logging.getLogger("inventory.slowqueries")
+
+LOG_FILENAME = "slow_queries.log"  # en LOG_DIR, ver LOGGING en settings.py
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+MAX_STACK = 5
+
+_request = contextvars.ContextVar("inventory_slowlog_request", default=None)
+_explaining = contextvars.ContextVar("inventory_slowlog_explaining", default=False)
+_installed = False
+
+# Marcos que no se muestran: la instrumentación y sus middlewares
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = frozenset(
+    os.path.join(_HERE, name)
+    for name in ("slowlog.py", "querycount.py", "metrics.py", "profiling.py")
+)
+
+
+def threshold():
+    """Umbral en segundos, o None si el registro está desactivado."""
+    ms = getattr(settings, "SLOW_QUERY_MS", 0)
+    return ms / 1000 if ms else None
+
+
+# =========================
+#  Detalles de la consulta
+# =========================
+
+def params_shape(params, many=False):
+    """
+    Tipos de los parámetros, con las repeticiones agrupadas:
+    ["UUID", "str", "int x120"] para un IN de 120 enteros.
+    """
+    if many:
+        params = list(params)
+        return [f"{len(params)} filas"] + (params_shape(params[0]) if params else [])
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    shape = []
+    last, run = None, 0
+    for value in params:
+        name = type(value).__name__
+        if name == last:
+            run += 1
+            continue
+        if last is not None:
+            shape.append(last if run == 1 else f"{last} x{run}")
+        last, run = name, 1
+    if last is not None:
+        shape.append(last if run == 1 else f"{last} x{run}")
+    return shape
+
+
+def project_stack(limit=MAX_STACK):
+    """["inventory/api.py:812 in _handle_aud", ...], de la más interna a la externa."""
+    base = str(settings.BASE_DIR) + os.sep
+    stack = []
+    frame = sys._getframe(1)
+    while frame is not None and len(stack) < limit:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base)
+            and filename not in _SKIP_FILES
+            and f"{os.sep}site-packages{os.sep}" not in filename
+        ):
+            stack.append(
+                f"{os.path.relpath(filename, base)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return stack
+
+
+class _PlanCache:
+    """Último plan por (alias, huella), para no repetir el EXPLAIN en cada consulta lenta."""
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl):
+        with self._lock:
+            entry = self._plans.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        return None
+
+    def put(self, key, plan):
+        with self._lock:
+            if len(self._plans) >= self.max_entries:
+                self._plans.clear()
+            self._plans[key] = (time.monotonic(), plan)
+
+
+_plans = _PlanCache()
+
+
+def explain(connection, sql, params):
+    """
+    Plan de la consulta como lista de líneas, o None si no se puede
+    obtener. Usa un cursor sin execute_wrappers (no cuenta como consulta
+    de la petición). En PostgreSQL, dentro de una transacción, va en un
+    savepoint para que un EXPLAIN fallido no la invalide.
+    """
+    if not sql.lstrip()[:6].upper().startswith(EXPLAINABLE):
+        return None
+    if not connection.features.supports_explaining_query_execution:
+        return None
+
+    token = _explaining.set(True)
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        savepoint = connection.vendor == "postgresql" and connection.in_atomic_block
+        with transaction.atomic(using=connection.alias) if savepoint else contextlib.nullcontext():
+            cursor = connection.create_cursor()
+            try:
+                cursor.execute(f"{prefix} {sql}", params)
+                # SQLite: (id, parent, notused, detail); PostgreSQL: (línea,)
+                return [str(row[-1]) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except Exception:
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+# =========================
+#  Registro
+# =========================
+
+def record(connection, sql, params, many, elapsed):
+    fp = fingerprint(sql)
+    request = _request.get() or {}
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "ms": round(elapsed * 1000, 3),
+        "alias": connection.alias,
+        "vendor": connection.vendor,
+        "sql": fp,
+        "params": params_shape(params, many),
+        "view": request.get("view"),
+        "path": request.get("path"),
+    }
+    stack = project_stack()
+    entry["frame"] = stack[0] if stack else None
+    entry["stack"] = stack
+
+    if getattr(settings, "SLOW_QUERY_EXPLAIN", True) and not many:
+        key = (connection.alias, fp)
+        plan = _plans.get(key, getattr(settings, "SLOW_QUERY_EXPLAIN_TTL", 300))
+        if plan is None:
+            plan = explain(connection, sql, params)
+            if plan is not None:
+                _plans.put(key, plan)
+                entry["plan"] = plan
+        # Con el plan en caché no se repite en cada línea: el informe usa el último
+    logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def _slow_query_wrapper(execute, sql, params, many, context):
+    limit = threshold()
+    if limit is None or _explaining.get():
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - t0
+    if elapsed >= limit:
+        try:
+            record(context["connection"], sql, params, many, elapsed)
+        except Exception:
+            # El registro nunca debe romper la consulta
+            pass
+    return result
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if _slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_slow_query_wrapper)
+
+
+def install():
+    """Engancha el registro en todas las conexiones si SLOW_QUERY_MS > 0. Idempotente."""
+    global _installed
+    if threshold() is None:
+        return
+    if not _installed:
+        connection_created.connect(_add_wrapper, dispatch_uid="inventory_slowlog")
+        _installed = True
+    for conn in connections.all(initialized_only=True):
+        _add_wrapper(None, conn)
+
+
+# =========================
+#  Middleware
+# =========================
+
+class SlowQueryMiddleware:
+    """Anota la vista y la ruta de la petición en curso para el registro."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if threshold() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request.set({"path": request.path, "view": None})
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set({"path": request.path, "view": None})
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current = _request.get()
+        if current is not None:
+            match = request.resolver_match
+            current["view"] = (match.view_name or match._func_path) if match else None
+        return None
+
+
+# =========================
+#  Informe
+# =========================
+
+# Recorrido completo de tabla: "SCAN inventory_product" (SQLite), "Seq Scan" (PostgreSQL)
+_FULL_SCAN = re.compile(r"^\s*SCAN (?!CONSTANT ROW)|\bSeq Scan\b")
+
+
+def log_files(path):
+    """El log y sus copias rotadas (path.1, path.2...), de la más antigua a la actual."""
+    rotated = []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        rotated.append(f"{path}.{n}")
+        n += 1
+    current = [path] if os.path.exists(path) else []
+    return rotated[::-1] + current
+
+
+def read_entries(paths, since=None):
+    """Entradas del log (dicts); since es un datetime con zona horaria."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is not None and datetime.fromisoformat(entry["ts"]) < since:
+                    continue
+                yield entry
+
+
+class SlowQueryStats:
+    """Consultas lentas con la misma huella."""
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.times = []
+        self.views = Counter()
+        self.frames = Counter()
+        self.plan = None
+        self.params = None
+        self.last_seen = None
+
+    def add(self, entry):
+        self.times.append(entry["ms"])
+        self.views[entry.get("view") or "-"] += 1
+        self.frames[entry.get("frame") or "-"] += 1
+        if entry.get("plan"):
+            self.plan = entry["plan"]
+        self.params = entry.get("params")
+        self.last_seen = entry["ts"]
+
+    @property
+    def count(self):
+        return len(self.times)
+
+    @property
+    def total_ms(self):
+        return sum(self.times)
+
+    @property
+    def max_ms(self):
+        return max(self.times)
+
+    @property
+    def p95_ms(self):
+        ordered = sorted(self.times)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    @property
+    def full_scan(self):
+        return bool(self.plan) and any(_FULL_SCAN.search(line) for line in self.plan)
+
+    def as_dict(self):
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "p95_ms": self.p95_ms,
+            "max_ms": self.max_ms,
+            "full_scan": self.full_scan,
+            "views": dict(self.views.most_common()),
+            "frames": dict(self.frames.most_common()),
+            "params": self.params,
+            "plan": self.plan,
+            "last_seen": self.last_seen,
+        }
+
+
+def aggregate(entries, sort="total"):
+    """[SlowQueryStats] por huella, de más a menos coste según `sort`."""
+    stats = {}
+    for entry in entries:
+        item = stats.get(entry["sql"])
+        if item is None:
+            item = stats[entry["sql"]] = SlowQueryStats(entry["sql"])
+        item.add(entry)
+    key = {
+        "total": lambda s: s.total_ms,
+        "count": lambda s: s.count,
+        "max": lambda s: s.max_ms,
+        "p95": lambda s: s.p95_ms,
+    }[sort]
+    return sorted(stats.values(), key=key, reverse=True)
@@ -0,0 +1,132 @@
+{% load static %}/*
+ * Service worker de Smart Inventory (servido en /sw.js, alcance "/").
+ *
+ * - Precachea la página de escaneo y sus estáticos para abrirla sin red.
+ * - Páginas y GET de la API: primero red, si falla la copia en caché.
+ * - Estáticos y librerías de CDN: caché y se refrescan en segundo plano.
+ * - Background Sync: vacía la cola de escaneos offline (offline.js).
+ */
+const VERSION = '{{ version }}';
+const SHELL_CACHE = `si-shell-${VERSION}`;
+const RUNTIME_CACHE = `si-runtime-${VERSION}`;
+
+const SHELL_URLS = [
+  '{% url "scan" %}',
+  '{% static "js/offline.js" %}',
+  '{% static "manifest.json" %}',
+  '{% static "img/logopeq.png" %}',
+  '{% static "icons/icon-192.png" %}',
+];
+const CDN_HOSTS = ['cdn.tailwindcss.com', 'unpkg.com', 'cdn.jsdelivr.net'];
+const LOGOUT_URL = '{% url "logout" %}';
+const CATALOG_SYNC_URL = '/api/catalog/sync/';
+const STATIC_URL = '{% get_static_prefix %}';
+
+importScripts('{% static "js/offline.js" %}');
+
+self.addEventListener('install', event => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(SHELL_CACHE);
+    // Uno a uno: una página que redirige al login no debe romper la instalación
+    await Promise.all(SHELL_URLS.map(async url => {
+      try {
+        const res = await fetch(url, { credentials: 'same-origin' });
+        if (res.ok && !res.redirected) await cache.put(url, res);
+      } catch (_e) { /* sin red: se cacheará al navegar */ }
+    }));
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil((async () => {
+    const keep = [SHELL_CACHE, RUNTIME_CACHE];
+    const names = await caches.keys();
+    await Promise.all(names.filter(n => n.startsWith('si-') && !keep.includes(n)).map(n => caches.delete(n)));
+    await self.clients.claim();
+  })());
+});
+
+async function networkFirst(request, fallbackUrl) {
+  const cache = await caches.open(RUNTIME_CACHE);
+  try {
+    const res = await fetch(request);
+    if (res.ok && !res.redirected) cache.put(request, res.clone());
+    return res;
+  } catch (err) {
+    const cached = await cache.match(request) ||
+      await caches.match(request, { ignoreSearch: true }) ||
+      (fallbackUrl && await caches.match(fallbackUrl));
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+async function staleWhileRevalidate(request) {
+  const cache = await caches.open(RUNTIME_CACHE);
+  const cached = await caches.match(request);
+  const refresh = fetch(request).then(res => {
+    if (res.ok || res.type === 'opaque') cache.put(request, res.clone());
+    return res;
+  });
+  if (cached) {
+    refresh.catch(() => {});
+    return cached;
+  }
+  return refresh;
+}
+
+self.addEventListener('fetch', event => {
+  const { request } = event;
+  if (request.method !== 'GET') return;  // los POST nunca se cachean
+
+  const url = new URL(request.url);
+  const sameOrigin = url.origin === self.location.origin;
+
+  if (sameOrigin && url.pathname === LOGOUT_URL) {
+    // Al cerrar sesión no deben quedar páginas ni datos de la API en caché
+    event.respondWith((async () => {
+      await caches.delete(RUNTIME_CACHE);
+      await caches.delete(SHELL_CACHE);
+      return fetch(request);
+    })());
+    return;
+  }
+
+  if (request.mode === 'navigate') {
+    event.respondWith(networkFirst(request, SHELL_URLS[0]));
+    return;
+  }
+
+  if (sameOrigin && url.pathname.startsWith(STATIC_URL)) {
+    event.respondWith(staleWhileRevalidate(request));
+    return;
+  }
+
+  if (CDN_HOSTS.includes(url.hostname)) {
+    event.respondWith(staleWhileRevalidate(request));
+    return;
+  }
+
+  // La sincronización del catálogo nunca sale de la caché (una respuesta
+  // vieja desharía cambios más recientes de la copia local)
+  if (sameOrigin && url.pathname.startsWith('/api/') && url.pathname !== CATALOG_SYNC_URL) {
+    event.respondWith(networkFirst(request));
+  }
+});
+
+self.addEventListener('sync', event => {
+  if (event.tag === SmartOffline.SYNC_TAG) {
+    event.waitUntil(SmartOffline.sync().then(async totals => {
+      if (totals.pending) throw new Error('pending');  // el navegador lo reintentará
+      const clients = await self.clients.matchAll();
+      clients.forEach(c => c.postMessage({ type: 'offline-synced', totals }));
+    }));
+  }
+});
+
+self.addEventListener('message', event => {
+  if (event.data && event.data.type === 'sync') {
+    event.waitUntil(SmartOffline.sync());
+  }
+});
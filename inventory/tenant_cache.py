@@ -0,0 +1,134 @@
+"""
+Caché de lecturas por tenant con invalidación por versión.
+
+Cada tenant tiene un contador de versión en la caché y las claves de los
+resultados lo incluyen:
+
+    tcache:<espacio>:<tenant>:<versión>:<huella de los parámetros>
+
+Al confirmarse un post_save/post_delete de Location, Product o Batch la
+versión del tenant sube (bump()): las entradas anteriores dejan de leerse
+y caducan solas, sin tener que conocer ni borrar las claves afectadas. Las
+escrituras en bloque que no disparan señales (importación, fusión de
+duplicados) llaman a bump() a mano vía valuation.invalidate().
+
+Espacios cacheados: "tree" (árbol de ubicaciones), "search" (búsqueda
+rápida), "audit" (AUD por ubicación y filtros), "audtotal" y "valuation"
+(frame de inventory/valuation.py).
+
+El backend es CACHES["default"], elegido con CACHE_BACKEND (locmem, file,
+redis o dummy, ver settings.py). Con locmem la caché y las versiones son
+de cada proceso: vale para el servidor del lanzador (un proceso, varios
+hilos); con varios procesos usar file o redis.
+
+Los resultados se calculan dentro de read_only(): con una réplica externa
+con retraso, un lector puede guardar con la versión nueva datos de la
+réplica anteriores a la escritura. Por eso los clientes fijados a la BD
+principal (ver replicas.py: acaban de escribir) no leen de la caché:
+calculan contra la principal y guardan ese valor, que ya incluye su
+escritura. Aun así, con réplica externa conviene un CACHE_TIMEOUT corto.
+
+Aciertos y fallos: smartinv_cache_requests_total{namespace,result} en
+/metrics (hit/miss/bypass) y cabecera X-Cache: HIT|MISS|BYPASS en las
+respuestas cacheadas.
+"""
+import hashlib
+import json
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics, replicas
+from .models import Batch, Location, Product
+
+KEY_PREFIX = "tcache"
+
+_MISSING = object()
+
+
+def _version_key(tenant_id):
+    return f"{KEY_PREFIX}:version:{tenant_id}"
+
+
+def version(tenant_id):
+    """Versión actual de la caché del tenant (la crea si no existe)."""
+    key = _version_key(tenant_id)
+    current = cache.get(key)
+    if current is None:
+        # Un valor que no se haya usado antes: si la clave se pierde
+        # (expulsión, reinicio) no revive entradas antiguas
+        cache.add(key, time.time_ns(), timeout=None)
+        current = cache.get(key, 0)
+    return current
+
+
+def _bump_now(tenant_id):
+    try:
+        cache.incr(_version_key(tenant_id))
+    except ValueError:
+        cache.add(_version_key(tenant_id), time.time_ns(), timeout=None)
+
+
+def bump(tenant_id, using=None):
+    """
+    Invalida todo lo cacheado del tenant al confirmar la transacción en
+    curso (en el acto si no hay ninguna): antes, un lector podría volver a
+    cachear los datos sin confirmar con la versión nueva.
+    """
+    transaction.on_commit(partial(_bump_now, tenant_id), using=using)
+
+
+def make_key(namespace, tenant_id, params=()):
+    digest = hashlib.blake2b(
+        json.dumps(params, default=str, ensure_ascii=False).encode("utf-8"), digest_size=12
+    ).hexdigest()
+    return f"{KEY_PREFIX}:{namespace}:{tenant_id}:{version(tenant_id)}:{digest}"
+
+
+def get_or_compute(namespace, tenant_id, params, compute, timeout=None):
+    """
+    (valor, acierto): el valor cacheado para (espacio, tenant, params) en la
+    versión actual del tenant o, si no está, compute() guardado con
+    `timeout` segundos (por defecto CACHE_TIMEOUT).
+
+    Con el cliente fijado a la principal el acierto es None: no se lee la
+    caché (lo guardado pudo calcularse con una réplica que aún no tiene su
+    escritura) y se guarda lo calculado contra la principal.
+    """
+    key = make_key(namespace, tenant_id, params)
+    if replicas.pinned():
+        metrics.CACHE_REQUESTS.inc(namespace=namespace, result="bypass")
+        value = compute()
+        cache.set(key, value, timeout if timeout is not None else settings.CACHE_TIMEOUT)
+        return value, None
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        metrics.CACHE_REQUESTS.inc(namespace=namespace, result="hit")
+        return value, True
+
+    metrics.CACHE_REQUESTS.inc(namespace=namespace, result="miss")
+    value = compute()
+    cache.set(key, value, timeout if timeout is not None else settings.CACHE_TIMEOUT)
+    return value, False
+
+
+def mark(response, hit):
+    """Añade X-Cache a la respuesta de un endpoint cacheado."""
+    response["X-Cache"] = "BYPASS" if hit is None else "HIT" if hit else "MISS"
+    return response
+
+
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def _bump_on_write(sender, instance, using=None, **kwargs):
+    bump(instance.tenant_id, using=using)
@@ -1,3 +1,597 @@
-from django.test import TestCase
+"""
+Pruebas de inventory.
 
-# Create your tests here.
+- Presupuestos de consultas (inventory/querycount.py): cada endpoint se
+  ejecuta con assert_max_queries y su presupuesto declarado sobre un
+  conjunto de datos con varias filas por consulta, para que un N+1 lo rompa.
+- Reintentos idempotentes de /api/scan/ y sincronización en bloque de la
+  cola offline (/api/scan/bulk/).
+- Hilo escritor (inventory/writer.py): orden, cancelación por timeout y
+  entrega de errores; /api/scan/async/ esperando al escritor.
+- Importación masiva (inventory/importer.py): upsert de productos y
+  ficheros ilegibles o en Windows-1252.
+- Fusión de duplicados (inventory/duplicates.py): merge_chunk.
+- Acceso a /metrics detrás de un proxy.
+
+    python manage.py test inventory
+"""
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import duplicates, importer, metrics, writer
+from .api import ScanBulkEndpoint, ScanEndpoint
+from .locations_api import LocationTreeView
+from .models import (
+    Batch,
+    CatalogTombstone,
+    IdempotencyRecord,
+    Location,
+    Movement,
+    MovementDaily,
+    Product,
+)
+from .querycount import QueryBudgetExceeded, assert_max_queries
+
+CATEGORIES = ("Alimentación", "Limpieza", "Ferretería")
+
+
+def seed_rows(products=40, batches=2, **overrides):
+    """Filas para importer.import_rows: `batches` lotes por producto en un árbol de 3 niveles."""
+    for p in range(products):
+        for b in range(batches):
+            row = {
+                "name": f"Producto {p:03d}",
+                "location": f"Almacén > Zona {p % 4} > Balda {p % 3}",
+                "quantity": str(50 + b),
+                "unit": "ud",
+                "category": CATEGORIES[p % len(CATEGORIES)],
+                "min_stock": "5",
+                "brand": "Acme",
+                "estimated_value": "2.50",
+            }
+            row.update(overrides)
+            yield row
+
+
+class InventoryTestCase(TestCase):
+    """Un tenant con 40 productos, 80 lotes y su árbol de ubicaciones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # La señal post_save crea su Organization (= tenant)
+        cls.user = get_user_model().objects.create_user("tester", password="pw")
+        cls.tenant_id = cls.user.organization.id
+        importer.import_rows(seed_rows(), cls.tenant_id, user=cls.user)
+
+        cls.product = (
+            Product.objects.filter(tenant_id=cls.tenant_id)
+            .select_related("location")
+            .order_by("name")
+            .first()
+        )
+        cls.root = Location.objects.get(tenant_id=cls.tenant_id, parent__isnull=True)
+
+    def setUp(self):
+        # Mide siempre el cálculo, no un acierto de otra prueba
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def scan(self, path="/api/scan/", **data):
+        return self.client.post(path, data, content_type="application/json")
+
+    def scan_data(self, mtype, quantity=1, **extra):
+        return {
+            "type": mtype,
+            "payload": f"PRD:{self.product.id}",
+            "quantity": quantity,
+            "location": str(self.product.location.public_id),
+            **extra,
+        }
+
+    def stock(self, product=None):
+        return sum(
+            Batch.objects.filter(product=product or self.product).values_list("quantity", flat=True)
+        )
+
+
+# =========================
+#  Presupuestos de consultas
+# =========================
+
+class QueryBudgetTests(InventoryTestCase):
+    def assertWithinBudget(self, budget, label, request):
+        with assert_max_queries(budget, label) as recorder:
+            response = request()
+            if getattr(response, "streaming", False):
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{label}: HTTP {response.status_code}")
+        self.assertGreater(recorder.count, 0)
+        return response
+
+    def test_scan_in(self):
+        self.assertWithinBudget(
+            ScanEndpoint.query_budgets["IN"], "scan IN", lambda: self.scan(**self.scan_data("IN"))
+        )
+
+    def test_scan_out(self):
+        self.assertWithinBudget(
+            ScanEndpoint.query_budgets["OUT"], "scan OUT", lambda: self.scan(**self.scan_data("OUT"))
+        )
+
+    def test_scan_aud_subtree(self):
+        response = self.assertWithinBudget(
+            ScanEndpoint.query_budgets["AUD"],
+            "scan AUD",
+            lambda: self.scan(type="AUD", location=str(self.root.public_id)),
+        )
+        self.assertTrue(response.json()["ok"])
+
+    def test_scan_aud_filters(self):
+        self.assertWithinBudget(
+            ScanEndpoint.query_budgets["AUD"],
+            "scan AUD filtros",
+            lambda: self.scan(type="AUD", audit_filters={"name": "Producto"}),
+        )
+
+    def test_scan_audtotal(self):
+        self.assertWithinBudget(
+            ScanEndpoint.query_budgets["AUDTOTAL"], "scan AUDTOTAL", lambda: self.scan(type="AUDTOTAL")
+        )
+
+    def test_scan_bulk(self):
+        operations = [
+            {"idempotency_key": f"budget-{i}", **self.scan_data("IN")} for i in range(5)
+        ]
+        budget = ScanBulkEndpoint.query_budget + ScanBulkEndpoint.query_budget_per_operation * 5
+        self.assertWithinBudget(
+            budget, "scan bulk", lambda: self.scan("/api/scan/bulk/", operations=operations)
+        )
+
+    def test_locations_tree(self):
+        response = self.assertWithinBudget(
+            LocationTreeView.query_budget,
+            "locations tree",
+            lambda: self.client.get("/api/locations/tree/"),
+        )
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_admin_changelists(self):
+        superuser = get_user_model().objects.create_superuser("budget-admin", password="pw")
+        self.client.force_login(superuser)
+        for model in (Product, Location, Movement, Batch):
+            with self.subTest(model=model.__name__):
+                budget = admin.site._registry[model].query_budget
+                self.assertWithinBudget(
+                    budget,
+                    f"admin {model._meta.model_name}",
+                    lambda: self.client.get(f"/admin/inventory/{model._meta.model_name}/"),
+                )
+
+    def test_budget_exceeded_lists_repeated_queries(self):
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            with assert_max_queries(1, "N+1"):
+                for product in Product.objects.filter(tenant_id=self.tenant_id)[:3]:
+                    product.location.name
+        self.assertIn("N+1: 4 consultas (presupuesto 1)", str(ctx.exception))
+        self.assertIn("3x", str(ctx.exception))
+
+
+# =========================
+#  Idempotencia de /api/scan/
+# =========================
+
+class IdempotentScanTests(InventoryTestCase):
+    def test_replay_returns_stored_response_without_consuming_stock(self):
+        before = self.stock()
+        data = self.scan_data("OUT", quantity=3, idempotency_key="k-out-1")
+
+        first = self.scan(**data)
+        self.assertEqual(first.status_code, 200, first.content)
+        movements = Movement.objects.filter(tenant_id=self.tenant_id).count()
+
+        replay = self.scan(**data)
+        self.assertEqual(replay.status_code, first.status_code)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(self.stock(), before - 3)
+        self.assertEqual(Movement.objects.filter(tenant_id=self.tenant_id).count(), movements)
+        self.assertEqual(IdempotencyRecord.objects.filter(tenant_id=self.tenant_id).count(), 1)
+
+    def test_header_key(self):
+        data = self.scan_data("IN", quantity=2)
+        before = self.stock()
+        for _ in range(2):
+            response = self.client.post(
+                "/api/scan/", data, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k-hdr"
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.stock(), before + 2)
+
+    def test_key_reused_with_other_body(self):
+        self.scan(**self.scan_data("OUT", quantity=1, idempotency_key="k-reused"))
+        response = self.scan(**self.scan_data("OUT", quantity=2, idempotency_key="k-reused"))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["error"], "idempotency_key_reused")
+
+    def test_invalid_key(self):
+        response = self.scan(**self.scan_data("OUT", idempotency_key="x" * 101))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "invalid_idempotency_key")
+
+    def test_writer_busy_or_timeout_is_503(self):
+        before = self.stock()
+        for exc in (writer.WriterBusy, writer.WriterTimeout):
+            with self.subTest(exc=exc.__name__), mock.patch.object(
+                writer, "enabled", return_value=True
+            ), mock.patch.object(writer.writer, "run", side_effect=exc("t")):
+                response = self.scan(**self.scan_data("OUT", idempotency_key=f"k-{exc.__name__}"))
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.json()["error"], "busy")
+                self.assertIn("Retry-After", response)
+        self.assertEqual(self.stock(), before)
+        self.assertFalse(IdempotencyRecord.objects.filter(tenant_id=self.tenant_id).exists())
+
+
+# =========================
+#  Sincronización en bloque (cola offline)
+# =========================
+
+class ScanBulkTests(InventoryTestCase):
+    def bulk(self, operations):
+        return self.scan("/api/scan/bulk/", operations=operations)
+
+    def test_resend_after_cut_does_not_duplicate(self):
+        before = self.stock()
+        operations = [
+            {"idempotency_key": "op-1", **self.scan_data("IN", quantity=5)},
+            {"idempotency_key": "op-2", **self.scan_data("OUT", quantity=2)},
+        ]
+
+        first = self.bulk(operations)
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(first.json()["summary"], {"applied": 2, "conflict": 0, "retry": 0})
+        self.assertEqual(self.stock(), before + 3)
+        movements = Movement.objects.filter(tenant_id=self.tenant_id).count()
+
+        again = self.bulk(operations).json()
+        self.assertTrue(again["ok"])
+        self.assertEqual([r["replayed"] for r in again["results"]], [True, True])
+        self.assertEqual(self.stock(), before + 3)
+        self.assertEqual(Movement.objects.filter(tenant_id=self.tenant_id).count(), movements)
+
+    def test_conflicts_do_not_block_the_rest(self):
+        results = self.bulk([
+            self.scan_data("OUT"),
+            {"idempotency_key": "op-aud", "type": "AUD"},
+            {"idempotency_key": "op-ok", **self.scan_data("OUT")},
+        ]).json()["results"]
+
+        self.assertEqual([r["result"] for r in results], ["conflict", "conflict", "applied"])
+        self.assertEqual(results[0]["response"]["error"], "missing_idempotency_key")
+        self.assertEqual(results[1]["response"]["error"], "unsupported_type")
+
+    def test_invalid_data_is_a_conflict_and_does_not_block(self):
+        results = self.bulk([
+            {"idempotency_key": "op-uuid", **self.scan_data("OUT"), "payload": "PRD:zz"},
+            {"idempotency_key": "op-qty", **self.scan_data("OUT"), "quantity": "mucho"},
+            {"idempotency_key": "op-ok", **self.scan_data("OUT")},
+        ]).json()["results"]
+
+        self.assertEqual([r["result"] for r in results], ["conflict", "conflict", "applied"])
+
+    def test_invalid_operations(self):
+        for body in ([], [1, 2], '"x"'):
+            with self.subTest(body=body):
+                response = self.client.post("/api/scan/bulk/", body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["error"], "invalid_operations")
+
+
+# =========================
+#  Hilo escritor
+# =========================
+
+class CommandWriterTests(TransactionTestCase):
+    """Sin transacción envolvente: los comandos se aplican en el hilo escritor."""
+
+    def setUp(self):
+        self.writer = writer.CommandWriter(group_wait=0, max_pending=2)
+
+    def block(self):
+        """Ocupa el hilo escritor hasta gate.set(); devuelve (gate, future)."""
+        started, gate = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            gate.wait(5)
+
+        future = self.writer.submit("t", hold)
+        self.assertTrue(started.wait(5))
+        self.addCleanup(self.drain)
+        self.addCleanup(gate.set)
+        return gate, future
+
+    def drain(self):
+        """Espera a que se confirme lo encolado: el flush de la prueba no debe chocar con su transacción."""
+        for tenant in ("t", "otro"):
+            while True:
+                try:
+                    self.writer.run(tenant, lambda: None, timeout=5)
+                    break
+                except writer.WriterBusy:
+                    time.sleep(0.01)
+
+    def test_fifo_per_tenant(self):
+        futures = [self.writer.submit("t", lambda i=i: i) for i in range(2)]
+        self.assertEqual([f.result(5) for f in futures], [0, 1])
+        self.assertEqual(self.writer.run("t", lambda: "ok", timeout=5), "ok")
+
+    def test_timeout_cancels_command_before_applying(self):
+        applied = []
+        gate, blocker = self.block()
+        with self.assertRaises(writer.WriterTimeout):
+            self.writer.run("t", applied.append, 1, timeout=0.05)
+        gate.set()
+        blocker.result(5)
+        # El siguiente comando va detrás del cancelado: si lo hubiera aplicado ya se vería
+        self.writer.run("t", lambda: None, timeout=5)
+        self.assertEqual(applied, [])
+
+    def test_failed_command_only_fails_itself(self):
+        gate, _ = self.block()
+        failing = self.writer.submit("t", int, "no es un número")
+        ok = self.writer.submit("t", lambda: 7)
+        gate.set()
+        with self.assertRaises(ValueError):
+            failing.result(5)
+        self.assertEqual(ok.result(5), 7)
+
+    def test_internal_error_reaches_every_future(self):
+        with mock.patch.object(
+            metrics.WRITER_GROUP_SIZE, "observe", side_effect=RuntimeError("métricas")
+        ):
+            future = self.writer.submit("t", lambda: 1)
+            with self.assertRaises(RuntimeError):
+                future.result(5)
+        # El hilo sigue vivo
+        self.assertEqual(self.writer.run("t", lambda: 2, timeout=5), 2)
+
+    def test_busy_when_tenant_queue_is_full(self):
+        self.block()
+        self.writer.submit("t", lambda: None)
+        self.writer.submit("t", lambda: None)
+        with self.assertRaises(writer.WriterBusy):
+            self.writer.submit("t", lambda: None)
+        # Otro tenant tiene su propia cola
+        self.writer.submit("otro", lambda: None)
+
+
+class AsyncScanTests(TransactionTestCase):
+    """/api/scan/async/ envía la escritura al hilo escritor y la espera en el bucle de eventos."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("tester", password="pw")
+        importer.import_rows(seed_rows(products=1, batches=1), self.user.organization.id)
+        self.product = Product.objects.get()
+        self.client.force_login(self.user)
+
+    def scan_out(self):
+        return self.client.post(
+            "/api/scan/async/",
+            {"type": "OUT", "payload": f"PRD:{self.product.id}", "quantity": 1},
+            content_type="application/json",
+        )
+
+    def stock(self):
+        return sum(Batch.objects.filter(product=self.product).values_list("quantity", flat=True))
+
+    def test_out_is_applied_by_the_writer(self):
+        response = self.scan_out()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 49)
+
+    @override_settings(SCAN_WRITER_TIMEOUT=0.05)
+    def test_writer_timeout_is_503_without_applying(self):
+        self.assertEqual(self.scan_out().status_code, 200)
+        started, gate = threading.Event(), threading.Event()
+        writer.writer.submit(self.product.tenant_id, lambda: (started.set(), gate.wait(5)))
+        self.addCleanup(gate.set)
+        self.assertTrue(started.wait(5))
+
+        response = self.scan_out()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["error"], "busy")
+        self.assertIn("Retry-After", response)
+        gate.set()
+        writer.writer.run(self.product.tenant_id, lambda: None, timeout=5)
+        self.assertEqual(self.stock(), 49)
+
+
+# =========================
+#  Importación
+# =========================
+
+class ImporterUpsertTests(InventoryTestCase):
+    def test_reimport_updates_products_in_place(self):
+        ids = dict(
+            Product.objects.filter(tenant_id=self.tenant_id).values_list("name", "id")
+        )
+        updated_at = Product.objects.get(pk=self.product.pk).updated_at
+
+        # Sin columna brand: la marca de los productos no se toca
+        rows = ({k: v for k, v in r.items() if k != "brand"} for r in seed_rows(category="Bebidas"))
+        result = importer.import_rows(rows, self.tenant_id, user=self.user)
+
+        self.assertEqual(result["error_count"], 0)
+        self.assertEqual(result["products_created"], 0)
+        self.assertEqual(result["products_updated"], 40)
+        self.assertEqual(result["locations_created"], 0)
+        self.assertEqual(
+            dict(Product.objects.filter(tenant_id=self.tenant_id).values_list("name", "id")), ids
+        )
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.category, "Bebidas")
+        self.assertEqual(product.brand, "Acme")
+        self.assertGreater(product.updated_at, updated_at)
+        # Cada fila con cantidad es un lote nuevo con su movimiento IN
+        self.assertEqual(Batch.objects.filter(product=product).count(), 4)
+
+    def test_same_product_twice_in_a_chunk(self):
+        rows = [
+            {"name": "Nuevo", "location": "Almacén > Zona 0", "quantity": "1", "category": "A"},
+            {"name": "nuevo ", "location": "Almacén > Zona 0", "quantity": "2", "category": "B"},
+        ]
+        result = importer.import_rows(rows, self.tenant_id, user=self.user)
+        product = Product.objects.get(tenant_id=self.tenant_id, name_normalized="nuevo")
+        self.assertEqual(result["products_created"], 1)
+        self.assertEqual(product.category, "B")
+        self.assertEqual(self.stock(product), 3)
+
+    def test_dry_run_writes_nothing(self):
+        products = Product.objects.count()
+        result = importer.import_rows(
+            seed_rows(products=3, location="Otro > Sitio"), self.tenant_id, dry_run=True
+        )
+        self.assertEqual(result["products_created"], 3)
+        self.assertEqual(Product.objects.count(), products)
+        self.assertFalse(Location.objects.filter(tenant_id=self.tenant_id, name="Otro").exists())
+
+    def upload(self, name, content):
+        return self.client.post("/api/import/", {"file": SimpleUploadedFile(name, content)})
+
+    def test_windows_1252_csv(self):
+        response = self.upload("excel.csv", "name;location;quantity\nPañuelos;Baño;3\n".encode("cp1252"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            Product.objects.filter(tenant_id=self.tenant_id, name="Pañuelos", location__name="Baño").exists()
+        )
+
+    def test_unreadable_files_are_400(self):
+        for name, content in (
+            ("roto.csv", b"name;location\nX\x81\x8d;Y\n"),  # ni UTF-8 ni cp1252
+            ("roto.xlsx", b"no es un zip"),
+        ):
+            with self.subTest(name=name):
+                response = self.upload(name, content)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["error"], "invalid_file")
+
+
+# =========================
+#  Fusión de duplicados
+# =========================
+
+class MergeDuplicatesTests(TestCase):
+    """Dos tenants con el mismo producto triplicado (sin ubicación, como deja pasar la restricción)."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.storage = Product._meta.get_field("qr_image").storage
+
+        self.tenants = []
+        for username in ("merge-a", "merge-b"):
+            tenant_id = get_user_model().objects.create_user(username, password="pw").organization.id
+            location = Location.objects.create(tenant_id=tenant_id, name="Despensa")
+            for quantity in (1, 2, 3):
+                # save() genera la imagen QR de cada producto
+                product = Product.objects.create(tenant_id=tenant_id, name="Leche entera")
+                Batch.objects.create(tenant_id=tenant_id, product=product, quantity=10 * quantity)
+                Movement.objects.create(
+                    tenant_id=tenant_id,
+                    product=product,
+                    location=location,
+                    quantity=quantity,
+                    movement_type=Movement.IN,
+                )
+            self.tenants.append(tenant_id)
+
+    def snapshot(self, tenant_id):
+        return {
+            "products": sorted(Product.objects.filter(tenant_id=tenant_id).values_list("id", flat=True)),
+            "batches": sorted(Batch.objects.filter(tenant_id=tenant_id).values_list("id", "product_id")),
+            "movements": sorted(Movement.objects.filter(tenant_id=tenant_id).values_list("id", "product_id")),
+            "rollups": sorted(
+                MovementDaily.objects.filter(tenant_id=tenant_id).values_list("product_id", "day", "in_qty")
+            ),
+        }
+
+    def test_merge_chunk(self):
+        tenant_id, other = self.tenants
+        other_before = self.snapshot(other)
+        products = list(Product.objects.filter(tenant_id=tenant_id))
+        canonical = min(p.id for p in products)
+        losers = [p for p in products if p.id != canonical]
+        in_qty = sum(MovementDaily.objects.filter(tenant_id=tenant_id).values_list("in_qty", flat=True))
+
+        pairs = duplicates.find_duplicates(tenant_id)
+        self.assertEqual({(loser, c) for loser, c, _ in pairs}, {(p.id, canonical) for p in losers})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = duplicates.merge_chunk(tenant_id, pairs)
+
+        self.assertEqual(result, {"merged": 2, "batches": 2, "movements": 2, "qr_files": 2})
+        self.assertEqual(list(Product.objects.filter(tenant_id=tenant_id).values_list("id", flat=True)), [canonical])
+        self.assertEqual(Batch.objects.filter(product_id=canonical).count(), 3)
+        self.assertEqual(Movement.objects.filter(product_id=canonical).count(), 3)
+
+        # El rollup del canónico suma sus movimientos y los de los sobrantes
+        rollups = MovementDaily.objects.filter(tenant_id=tenant_id)
+        self.assertEqual({r.product_id for r in rollups}, {canonical})
+        self.assertEqual(sum(r.in_qty for r in rollups), in_qty)
+
+        self.assertEqual(
+            set(
+                CatalogTombstone.objects.filter(
+                    tenant_id=tenant_id, kind=CatalogTombstone.KIND_PRODUCT
+                ).values_list("object_id", flat=True)
+            ),
+            {str(p.id) for p in losers},
+        )
+        for loser in losers:
+            self.assertFalse(self.storage.exists(loser.qr_image.name))
+        self.assertTrue(self.storage.exists(Product.objects.get(pk=canonical).qr_image.name))
+
+        # El otro tenant, con los mismos duplicados, no se toca
+        self.assertEqual(self.snapshot(other), other_before)
+        self.assertEqual(len(other_before["products"]), 3)
+        self.assertFalse(CatalogTombstone.objects.filter(tenant_id=other).exists())
+
+
+# =========================
+#  /metrics
+# =========================
+
+@override_settings(METRICS=True, METRICS_ALLOWED_IPS=["127.0.0.1"], METRICS_TOKEN="s3cret")
+class MetricsAccessTests(TestCase):
+    def test_loopback_without_proxy(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_loopback_through_proxy_is_not_trusted(self):
+        for header in ("HTTP_X_FORWARDED_FOR", "HTTP_X_REAL_IP", "HTTP_FORWARDED"):
+            with self.subTest(header=header):
+                response = self.client.get("/metrics", **{header: "203.0.113.7"})
+                self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        proxied = {"HTTP_X_FORWARDED_FOR": "203.0.113.7"}
+        ok = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret", **proxied)
+        self.assertEqual(ok.status_code, 200)
+        bad = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer otro", **proxied)
+        self.assertEqual(bad.status_code, 403)
+
+    def test_staff_through_proxy(self):
+        self.client.force_login(
+            get_user_model().objects.create_user("ops", password="pw", is_staff=True)
+        )
+        response = self.client.get("/metrics", HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(response.status_code, 200)
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import scan_view, scan_qr_view, scan_action_view, locations_manager, home_view, register, logout_view, qr_list_view
+from .views import scan_view, scan_qr_view, scan_action_view, locations_manager, home_view, register, logout_view, qr_list_view, service_worker_view, metrics_view
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
@@ -13,4 +13,6 @@ urlpatterns = [
     path("login/",auth_views.LoginView.as_view(template_name="inventory/login.html"),name="login",),
     path("logout/", logout_view, name="logout"),
     path("register/", register, name="register"),
+    path("sw.js", service_worker_view, name="service-worker"),
+    path("metrics", metrics_view, name="metrics"),
 ]
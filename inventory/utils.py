@@ -1,4 +1,4 @@
-import io, qrcode, os
+import io, os
 from django.core.files.base import ContentFile
 from django.db.models import Sum
 from django.db.models.functions import Coalesce
@@ -17,12 +17,13 @@ def available_stock(product, tenant_id):
 
 def make_qr_contentfile(data: str) -> ContentFile:
     """Devuelve un ContentFile PNG con el QR de `data`."""
+    import qrcode  # diferido: arrastra Pillow y no hace falta al arrancar
     img = qrcode.make(data)
     buf = io.BytesIO()
     img.save(buf, format="PNG")
     return ContentFile(buf.getvalue())
 
-"""
+'''
 def save_qr_to_media(data: str, filename: str) -> str:
     """
     Genera un QR PNG y lo guarda en media/qr/.
@@ -38,4 +39,4 @@ def save_qr_to_media(data: str, filename: str) -> str:
 
     return path
 
-""""
\ No newline at end of file
+'''
@@ -0,0 +1,361 @@
+"""
+Motor de valoración de inventario.
+
+Carga las columnas de los lotes con stock de un tenant en bloque
+(values_list → arrays de numpy) y calcula todos los agregados de forma
+vectorizada: totales por ubicación (con subárbol), categoría y marca,
+tramos de antigüedad y valor ponderado por caducidad.
+
+El "frame" cargado se cachea por tenant (inventory/tenant_cache.py) y deja
+de usarse en cuanto se escribe un lote, un producto o una ubicación de ese
+tenant.
+"""
+from django.utils import timezone
+
+from . import tenant_cache
+from .lazy import LazyModule
+from .models import Batch, Location
+
+# numpy se importa al calcular el primer informe, no al arrancar Django
+# (este módulo se carga desde InventoryConfig.ready() por sus señales)
+np = LazyModule("numpy")
+
+CACHE_NAMESPACE = "valuation"
+CACHE_TIMEOUT = 60 * 60
+
+# Tramos de antigüedad (días desde la entrada del lote)
+AGEING_EDGES = (30, 90, 180, 365)
+AGEING_LABELS = ("0-30", "31-90", "91-180", "181-365", "365+")
+
+# Días antes de caducar a partir de los cuales el valor empieza a depreciarse
+EXPIRY_HORIZON_DAYS = 30
+
+
+# =========================
+#  Carga en bloque
+# =========================
+
+def _to_day(d):
+    return np.datetime64(d, "D") if d else np.datetime64("NaT", "D")
+
+
+def load_frame(tenant_id):
+    """
+    Devuelve un dict de arrays con una fila por lote con stock del tenant.
+
+    El valor unitario es el del lote y, si no lo tiene, el del producto.
+    Las cadenas (categoría, marca) se guardan como códigos enteros sobre
+    un vector de etiquetas para poder agrupar con np.bincount.
+    """
+    frame, _ = tenant_cache.get_or_compute(
+        CACHE_NAMESPACE, tenant_id, (), lambda: _load_frame(tenant_id), timeout=CACHE_TIMEOUT
+    )
+    return frame
+
+
+def _load_frame(tenant_id):
+    rows = list(
+        Batch.objects.filter(tenant_id=tenant_id, quantity__gt=0).values_list(
+            "quantity",
+            "estimated_value",
+            "product__estimated_value",
+            "entry_date",
+            "expiration_date",
+            "product__location_id",
+            "product__category",
+            "brand",
+            "product__brand",
+        )
+    )
+    n = len(rows)
+    cols = list(zip(*rows)) if rows else [()] * 9
+
+    unit_value = np.fromiter(
+        (
+            float(b if b is not None else (p if p is not None else 0))
+            for b, p in zip(cols[1], cols[2])
+        ),
+        dtype=np.float64,
+        count=n,
+    )
+    valued = np.fromiter(
+        (b is not None or p is not None for b, p in zip(cols[1], cols[2])),
+        dtype=bool,
+        count=n,
+    )
+
+    category_labels, category_codes = np.unique(
+        np.array([c or "" for c in cols[6]], dtype=object), return_inverse=True
+    )
+    brand_labels, brand_codes = np.unique(
+        np.array([b or p or "" for b, p in zip(cols[7], cols[8])], dtype=object),
+        return_inverse=True,
+    )
+
+    locations = list(
+        Location.objects.filter(tenant_id=tenant_id).values_list("id", "parent_id", "name")
+    )
+
+    frame = {
+        "quantity": np.fromiter(cols[0], dtype=np.int64, count=n),
+        "unit_value": unit_value,
+        "valued": valued,
+        "entry_date": np.array([_to_day(d) for d in cols[3]], dtype="datetime64[D]"),
+        "expiration_date": np.array([_to_day(d) for d in cols[4]], dtype="datetime64[D]"),
+        "location_id": np.fromiter((l or 0 for l in cols[5]), dtype=np.int64, count=n),
+        "category_codes": category_codes.astype(np.int64),
+        "category_labels": category_labels,
+        "brand_codes": brand_codes.astype(np.int64),
+        "brand_labels": brand_labels,
+        "locations": locations,
+    }
+
+    return frame
+
+
+def invalidate(tenant_id):
+    """
+    Para escrituras sin señales (bulk_create, update, _raw_delete): invalida
+    el frame y el resto de la caché del tenant.
+    """
+    tenant_cache.bump(tenant_id)
+
+
+# =========================
+#  Árbol de ubicaciones
+# =========================
+
+def _location_index(locations):
+    """
+    A partir de filas (id, parent_id, name) devuelve:
+    - ids: array de ids
+    - parent_idx: índice del padre (-1 si es raíz)
+    - depth: profundidad de cada nodo
+    - paths: ruta completa 'A > B > C' de cada nodo
+    """
+    ids = np.array([l[0] for l in locations], dtype=np.int64)
+    pos = {loc_id: i for i, loc_id in enumerate(ids.tolist())}
+    parent_idx = np.array(
+        [pos.get(l[1], -1) if l[1] else -1 for l in locations], dtype=np.int64
+    )
+    names = [l[2] for l in locations]
+
+    depth = np.full(len(ids), -1, dtype=np.int64)
+    paths = [None] * len(ids)
+
+    def _resolve(i):
+        chain = []
+        while i != -1 and depth[i] == -1:
+            chain.append(i)
+            i = parent_idx[i]
+            if len(chain) > len(ids):
+                break  # ciclo: se corta
+        base_depth = depth[i] if i != -1 else -1
+        base_path = paths[i] if i != -1 else None
+        for j in reversed(chain):
+            base_depth += 1
+            depth[j] = base_depth
+            base_path = f"{base_path} > {names[j]}" if base_path else names[j]
+            paths[j] = base_path
+
+    for i in range(len(ids)):
+        if depth[i] == -1:
+            _resolve(i)
+
+    return ids, parent_idx, depth, paths
+
+
+def _rollup(values, parent_idx, depth):
+    """
+    Suma cada columna de `values` (n_locs x k) hacia sus ancestros,
+    nivel a nivel desde las hojas, para obtener totales de subárbol.
+    """
+    totals = values.copy()
+    for level in range(int(depth.max(initial=0)), 0, -1):
+        nodes = np.nonzero((depth == level) & (parent_idx >= 0))[0]
+        np.add.at(totals, parent_idx[nodes], totals[nodes])
+    return totals
+
+
+def subtree_mask(frame, location_id):
+    """
+    Máscara booleana de los lotes cuyo producto está en el subárbol
+    de `location_id` (incluida la propia ubicación).
+    """
+    ids, parent_idx, depth, _ = _location_index(frame["locations"])
+    if location_id not in set(ids.tolist()):
+        return np.zeros(len(frame["quantity"]), dtype=bool)
+
+    inside = ids == location_id
+    for level in range(int(depth.max(initial=0)) + 1):
+        nodes = np.nonzero((depth == level) & (parent_idx >= 0))[0]
+        inside[nodes] |= inside[parent_idx[nodes]]
+
+    return np.isin(frame["location_id"], ids[inside])
+
+
+# =========================
+#  Informe
+# =========================
+
+def _grouped(codes, labels, weights_by_name):
+    sums = {
+        name: np.bincount(codes, weights=w, minlength=len(labels))
+        for name, w in weights_by_name.items()
+    }
+    rows = []
+    for i, label in enumerate(labels):
+        if sums["quantity"][i] == 0:
+            continue
+        row = {"key": label or None}
+        for name, col in sums.items():
+            row[name] = _num(name, col[i])
+        rows.append(row)
+    rows.sort(key=lambda r: r["value"], reverse=True)
+    return rows
+
+
+def _num(name, x):
+    if name == "quantity":
+        return int(round(x))
+    return round(float(x), 2)
+
+
+def build_report(tenant_id, location_id=None, today=None, horizon_days=EXPIRY_HORIZON_DAYS):
+    """
+    Informe de valoración del tenant (opcionalmente limitado al subárbol
+    de `location_id`).
+
+    - value: cantidad * valor unitario estimado.
+    - expiry_weighted_value: el valor se deprecia linealmente durante los
+      últimos `horizon_days` antes de caducar y es 0 si ya ha caducado.
+      Los lotes sin caducidad cuentan al 100 %.
+    """
+    frame = load_frame(tenant_id)
+    today = np.datetime64(today or timezone.localdate(), "D")
+
+    mask = np.ones(len(frame["quantity"]), dtype=bool)
+    if location_id is not None:
+        mask = subtree_mask(frame, location_id)
+
+    qty = frame["quantity"][mask].astype(np.float64)
+    value = qty * frame["unit_value"][mask]
+    entry = frame["entry_date"][mask]
+    expiry = frame["expiration_date"][mask]
+
+    has_expiry = ~np.isnat(expiry)
+    days_left = np.where(
+        has_expiry, (expiry - today).astype("timedelta64[D]").astype(np.int64), 0
+    )
+    weight = np.where(
+        has_expiry, np.clip(days_left / float(max(horizon_days, 1)), 0.0, 1.0), 1.0
+    )
+    weighted = value * weight
+    expired = has_expiry & (days_left < 0)
+    at_risk = has_expiry & (days_left >= 0) & (days_left <= horizon_days)
+
+    ages = np.where(
+        np.isnat(entry), 0, (today - entry).astype("timedelta64[D]").astype(np.int64)
+    )
+    bucket = np.digitize(ages, AGEING_EDGES, right=True)
+
+    weights = {
+        "quantity": qty,
+        "value": value,
+        "expiry_weighted_value": weighted,
+    }
+
+    ageing_qty = np.bincount(bucket, weights=qty, minlength=len(AGEING_LABELS))
+    ageing_val = np.bincount(bucket, weights=value, minlength=len(AGEING_LABELS))
+
+    # --- Por ubicación (propia + subárbol) ---
+    ids, parent_idx, depth, paths = _location_index(frame["locations"])
+    by_location = []
+    if len(ids):
+        order = np.argsort(ids)
+        ids_sorted = ids[order]
+        pos = np.searchsorted(ids_sorted, frame["location_id"][mask])
+        pos = np.clip(pos, 0, len(ids) - 1)
+        known = ids_sorted[pos] == frame["location_id"][mask]
+        loc_pos = order[pos[known]]
+
+        own = np.zeros((len(ids), 3), dtype=np.float64)
+        for k, w in enumerate(weights.values()):
+            own[:, k] = np.bincount(loc_pos, weights=w[known], minlength=len(ids))
+        subtree = _rollup(own, parent_idx, depth)
+
+        for i in np.nonzero(subtree[:, 0] > 0)[0]:
+            by_location.append(
+                {
+                    "id": int(ids[i]),
+                    "path": paths[i],
+                    "quantity": _num("quantity", own[i, 0]),
+                    "value": _num("value", own[i, 1]),
+                    "expiry_weighted_value": _num("value", own[i, 2]),
+                    "subtree_quantity": _num("quantity", subtree[i, 0]),
+                    "subtree_value": _num("value", subtree[i, 1]),
+                    "subtree_expiry_weighted_value": _num("value", subtree[i, 2]),
+                }
+            )
+        by_location.sort(key=lambda r: r["path"] or "")
+
+    return {
+        "generated_at": timezone.now().isoformat(),
+        "as_of": str(today),
+        "expiry_horizon_days": horizon_days,
+        "totals": {
+            "batches": int(mask.sum()),
+            "quantity": _num("quantity", qty.sum()),
+            "value": _num("value", value.sum()),
+            "expiry_weighted_value": _num("value", weighted.sum()),
+            "expired_value": _num("value", value[expired].sum()),
+            "at_risk_value": _num("value", value[at_risk].sum()),
+            "unvalued_quantity": _num("quantity", qty[~frame["valued"][mask]].sum()),
+        },
+        "by_location": by_location,
+        "by_category": _grouped(
+            frame["category_codes"][mask],
+            frame["category_labels"],
+            weights,
+        ),
+        "by_brand": _grouped(
+            frame["brand_codes"][mask],
+            frame["brand_labels"],
+            weights,
+        ),
+        "ageing": [
+            {
+                "bucket": label,
+                "quantity": _num("quantity", ageing_qty[i]),
+                "value": _num("value", ageing_val[i]),
+            }
+            for i, label in enumerate(AGEING_LABELS)
+        ],
+    }
+
+
+# =========================
+#  Exportación CSV
+# =========================
+
+REPORT_SECTIONS = ("location", "category", "brand", "ageing")
+
+
+def report_rows(report, section):
+    """
+    Devuelve (cabecera, filas) de una sección del informe para volcarla a CSV.
+    """
+    if section == "location":
+        header = [
+            "id", "path", "quantity", "value", "expiry_weighted_value",
+            "subtree_quantity", "subtree_value", "subtree_expiry_weighted_value",
+        ]
+        rows = report["by_location"]
+    elif section == "ageing":
+        header = ["bucket", "quantity", "value"]
+        rows = report["ageing"]
+    else:
+        header = ["key", "quantity", "value", "expiry_weighted_value"]
+        rows = report[f"by_{section}"]
+
+    return header, [[r.get(h) for h in header] for r in rows]
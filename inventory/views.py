@@ -3,7 +3,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from .models import Location
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from .models import Product, Movement, Location, Batch, DEFAULT_TENANT
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
@@ -11,7 +11,9 @@ from django.contrib.auth import login as auth_login
 from django.contrib.auth import logout as auth_logout 
 from django.conf import settings
 from django.db import transaction
-import json, os
+import hashlib, hmac, json, os
+from functools import lru_cache
+from . import metrics
 
 @login_required
 def home_view(request):
@@ -38,6 +40,75 @@ def register(request):
 
     return render(request, "inventory/register.html", {"form": form})
 
+@lru_cache(maxsize=1)
+def _service_worker_version():
+    """Hash del propio service worker y de offline.js: cambia al actualizar la app."""
+    from django.contrib.staticfiles import finders
+    from django.template.loader import get_template
+
+    digest = hashlib.sha1()
+    digest.update(get_template("inventory/sw.js").template.source.encode("utf-8"))
+    offline_js = finders.find("js/offline.js")
+    if offline_js:
+        with open(offline_js, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def service_worker_view(request):
+    """
+    Service worker de la PWA. Se sirve desde la raíz (no desde /static/)
+    para que su alcance cubra toda la app, y sin caché HTTP para que el
+    navegador detecte las versiones nuevas.
+    """
+    response = render(
+        request,
+        "inventory/sw.js",
+        {"version": _service_worker_version()},
+        content_type="application/javascript",
+    )
+    response["Service-Worker-Allowed"] = "/"
+    response["Cache-Control"] = "no-cache"
+    return response
+
+# Cabeceras que añade un proxy inverso: con ellas REMOTE_ADDR es la del proxy
+PROXY_HEADERS = ("HTTP_X_FORWARDED_FOR", "HTTP_X_REAL_IP", "HTTP_FORWARDED")
+
+def _metrics_allowed(request):
+    """
+    Acceso a /metrics (ver METRICS_TOKEN y METRICS_ALLOWED_IPS en settings.py):
+    - "Authorization: Bearer <METRICS_TOKEN>", si hay token, desde cualquier IP;
+    - usuarios staff;
+    - las IP de METRICS_ALLOWED_IPS, solo si la petición no llega por un
+      proxy: detrás de un proxy en la misma máquina todas vendrían de
+      127.0.0.1.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        auth = request.META.get("HTTP_AUTHORIZATION", "")
+        if auth.startswith("Bearer ") and hmac.compare_digest(
+            auth[7:].strip().encode("utf-8"), token.encode("utf-8")
+        ):
+            return True
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    if any(header in request.META for header in PROXY_HEADERS):
+        return False
+    return request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+
+def metrics_view(request):
+    """
+    Métricas en formato de exposición de Prometheus (inventory/metrics.py).
+    Acceso: ver _metrics_allowed.
+    """
+    if not metrics.enabled():
+        return HttpResponse(status=404)
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden("Métricas solo accesibles desde la red local o con token.")
+    body = metrics.registry.render(getattr(settings, "METRICS_DIR", None))
+    response = HttpResponse(body, content_type=metrics.CONTENT_TYPE)
+    response["Cache-Control"] = "no-store"
+    return response
+
 def logout_view(request):
     """
     Cierra la sesión del usuario y lo manda a la pantalla de login.
@@ -83,27 +154,13 @@ def scan_view(request):
         loc.path = build_location_path(loc)
         locations.append(loc)
 
-    # categorías y unidades SOLO de productos de este tenant
-    categories = (
-        Product.objects.filter(tenant_id=tenant_id)
-        .values_list("category", flat=True)
-        .distinct()
-        .order_by("category")
-    )
-    units = (
-        Product.objects.filter(tenant_id=tenant_id)
-        .values_list("unit", flat=True)
-        .distinct()
-        .order_by("unit")
-    )
-
+    # Categorías y unidades: la plantilla no las usa; los clientes que las
+    # necesiten las tienen en /api/catalog/sync/
     return render(
         request,
         "inventory/scan.html",
         {
             "locations": locations,
-            "categories": categories,
-            "units": units,
         },
     )
 
@@ -0,0 +1,232 @@
+"""
+Escritor único con cola de comandos por tenant (group commit).
+
+En SQLite cada transacción de escritura bloquea toda la BD y
+select_for_update() no hace nada, así que varios escaneos IN/OUT a la vez
+acaban esperando al lock, fallando con "database is locked" o pisándose.
+
+Aquí las mutaciones se envían como comandos (una función y sus
+argumentos) a un único hilo escritor:
+
+- Cada tenant tiene su cola FIFO: sus cambios de stock se aplican en el
+  orden de llegada. Los tenants se atienden por turnos.
+- El hilo agrupa los comandos pendientes (hasta SCAN_WRITER_GROUP_SIZE) en
+  una transacción; cada comando va en su propio savepoint, de modo que si
+  uno falla solo se deshace ese.
+- El resultado (o la excepción) se entrega a quien envió el comando
+  cuando la transacción del grupo se ha confirmado.
+- Cada comando se ejecuta con el contexto (contextvars) de quien lo
+  envió: sus consultas cuentan para esa petición (inventory.querycount).
+- La espera en cola, el tamaño de los grupos y los fallos se publican en
+  /metrics (inventory/metrics.py).
+- Si quien espera agota su timeout, el comando se cancela y no llega a
+  aplicarse (WriterTimeout); si ya estaba aplicándose, se espera a que
+  termine para no responder un error de algo que sí se ha hecho.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import metrics
+
+
+class WriterBusy(Exception):
+    """La cola del tenant está llena."""
+
+
+class WriterTimeout(Exception):
+    """El comando no empezó a aplicarse a tiempo y se ha cancelado."""
+
+
+class _Command:
+    __slots__ = ("fn", "args", "kwargs", "future", "context", "enqueued")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.context = contextvars.copy_context()
+        self.enqueued = time.perf_counter()
+
+
+class CommandWriter:
+    def __init__(self, group_size=32, group_wait=0.002, max_pending=256):
+        self.group_size = group_size
+        self.group_wait = group_wait
+        self.max_pending = max_pending
+
+        self._queues = {}            # tenant_id -> deque[_Command]
+        self._turns = deque()        # tenants con comandos, por turno
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.groups = 0
+        self.commands = 0
+        self.failed = 0
+        self.largest_group = 0
+
+    # =========================
+    #  Envío
+    # =========================
+
+    def submit(self, tenant_id, fn, *args, **kwargs):
+        """
+        Encola fn(*args, **kwargs) y devuelve un concurrent.futures.Future.
+        Lanza WriterBusy si el tenant ya tiene max_pending comandos.
+        """
+        with self._cond:
+            queue = self._queues.get(tenant_id)
+            if queue is None:
+                queue = self._queues[tenant_id] = deque()
+                self._turns.append(tenant_id)
+            if len(queue) >= self.max_pending:
+                raise WriterBusy(tenant_id)
+
+            cmd = _Command(fn, args, kwargs)
+            queue.append(cmd)
+            self._ensure_thread()
+            self._cond.notify()
+        return cmd.future
+
+    def run(self, tenant_id, fn, *args, timeout=None, **kwargs):
+        """
+        Ejecuta el comando en el hilo escritor y espera su resultado.
+
+        Si quien llama ya está dentro de una transacción (p. ej. un
+        atomic() externo o un TestCase) se ejecuta aquí mismo: en otro hilo
+        no vería esos datos ni formaría parte de esa transacción.
+        """
+        if self.runs_inline():
+            return fn(*args, **kwargs)
+        future = self.submit(tenant_id, fn, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise WriterTimeout(tenant_id) from None
+            # Ya se está aplicando: su resultado es el que vale
+            return future.result()
+
+    def runs_inline(self):
+        """True si run() ejecutaría el comando en el hilo que llama."""
+        return connection.in_atomic_block or threading.current_thread() is self._thread
+
+    def pending(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def stats(self):
+        return {
+            "groups": self.groups,
+            "commands": self.commands,
+            "failed": self.failed,
+            "largest_group": self.largest_group,
+            "pending": self.pending(),
+        }
+
+    # =========================
+    #  Hilo escritor
+    # =========================
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._loop, name="inventory-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _take_group(self):
+        """
+        Saca hasta group_size comandos, uno por tenant en cada vuelta, para
+        que un tenant con mucha carga no deje esperando a los demás.
+        """
+        group = []
+        while self._turns and len(group) < self.group_size:
+            tenant_id = self._turns.popleft()
+            queue = self._queues[tenant_id]
+            group.append(queue.popleft())
+            if queue:
+                self._turns.append(tenant_id)
+            else:
+                del self._queues[tenant_id]
+        return group
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._turns:
+                    self._cond.wait()
+            # Pequeña espera para que se acumulen más comandos en el grupo
+            if self.group_wait:
+                time.sleep(self.group_wait)
+            with self._cond:
+                group = self._take_group()
+            if group:
+                self._apply(group)
+
+    def _apply(self, group):
+        # Los comandos cancelados (timeout en run()) no se aplican
+        group = [cmd for cmd in group if cmd.future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        try:
+            self._apply_group(group)
+        except Exception as e:
+            # Nunca dejar un Future sin resultado ni matar el hilo escritor
+            for cmd in group:
+                if not cmd.future.done():
+                    cmd.future.set_exception(e)
+
+    def _apply_group(self, group):
+        started = time.perf_counter()
+        for cmd in group:
+            metrics.WRITER_QUEUE_WAIT.observe(started - cmd.enqueued)
+        metrics.WRITER_GROUP_SIZE.observe(len(group))
+
+        results = []
+        try:
+            with transaction.atomic():
+                for cmd in group:
+                    try:
+                        with transaction.atomic():
+                            results.append(
+                                (cmd, True, cmd.context.run(cmd.fn, *cmd.args, **cmd.kwargs))
+                            )
+                    except Exception as e:
+                        results.append((cmd, False, e))
+        except Exception as e:
+            # Falló el COMMIT del grupo: no se ha aplicado ningún comando
+            connection.close()
+            self.failed += len(group)
+            metrics.WRITER_FAILED.inc(len(group))
+            for cmd in group:
+                cmd.future.set_exception(e)
+            return
+
+        self.groups += 1
+        self.commands += len(group)
+        self.largest_group = max(self.largest_group, len(group))
+        for cmd, ok, value in results:
+            if ok:
+                cmd.future.set_result(value)
+            else:
+                self.failed += 1
+                metrics.WRITER_FAILED.inc()
+                cmd.future.set_exception(value)
+
+
+writer = CommandWriter(
+    group_size=getattr(settings, "SCAN_WRITER_GROUP_SIZE", 32),
+    group_wait=getattr(settings, "SCAN_WRITER_GROUP_WAIT_MS", 2) / 1000,
+    max_pending=getattr(settings, "SCAN_WRITER_MAX_PENDING", 256),
+)
+
+
+def enabled():
+    return getattr(settings, "SCAN_WRITER", False)
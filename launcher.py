@@ -1,12 +1,13 @@
+import argparse
+import hashlib
+import json
 import os
 import sys
+import time
 import webbrowser
 import threading
 from pathlib import Path
 
-from django.db import connections
-from django.db.migrations.executor import MigrationExecutor
-
 
 # ============================================================
 # CONFIGURACIÓN BASE
@@ -14,6 +15,59 @@ from django.db.migrations.executor import MigrationExecutor
 
 APP_NAME = "SmartInventory"
 
+
+def parse_args(argv=None):
+    """
+    Modos:
+    - serve (por defecto): servidor WSGI multi-hilo, DEBUG desactivado.
+    - dev: runserver de Django con DEBUG (comportamiento anterior).
+    """
+    parser = argparse.ArgumentParser(prog=APP_NAME)
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=("serve", "dev"),
+        default=os.getenv("SMARTINV_MODE", "serve"),
+    )
+    parser.add_argument("--host", default=os.getenv("SMARTINV_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SMARTINV_PORT", "8000")))
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.getenv("SMARTINV_THREADS", "16")),
+        help="Hilos que atienden peticiones en modo serve.",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=int(os.getenv("SMARTINV_MAX_PENDING", "64")),
+        help="Conexiones en espera de un hilo libre; por encima se responde 503.",
+    )
+    parser.add_argument(
+        "--server",
+        choices=("auto", "waitress", "stdlib"),
+        default=os.getenv("SMARTINV_SERVER", "auto"),
+        help="auto = waitress si está instalado, si no el de la librería estándar.",
+    )
+    parser.add_argument("--no-browser", action="store_true")
+    parser.add_argument(
+        "--profile-imports",
+        action="store_true",
+        default=os.getenv("SMARTINV_PROFILE_IMPORTS", "").lower() in ("1", "true"),
+        help="Mide el tiempo de cada import del arranque (logs/import_profile.txt).",
+    )
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+ARGS = parse_args()
+
+# Se instala antes de importar Django para medir todo el arranque
+IMPORT_PROFILER = None
+if ARGS.profile_imports:
+    from smart_inventory.importprofile import ImportProfiler
+    IMPORT_PROFILER = ImportProfiler().install()
+
 # --- Carpeta de datos persistentes (Roaming) ---
 if sys.platform == "win32":
     APP_DATA_DIR = Path(os.environ["APPDATA"]) / APP_NAME
@@ -25,6 +79,7 @@ MEDIA_DIR = APP_DATA_DIR / "media"
 QR_DIR = MEDIA_DIR / "qr"
 LOGS_DIR = APP_DATA_DIR / "logs"
 BACKUP_DIR = APP_DATA_DIR / "backups"
+STAMP_FILE = DB_DIR / "startup.stamp.json"
 
 for d in (DB_DIR, MEDIA_DIR, QR_DIR, LOGS_DIR, BACKUP_DIR):
     d.mkdir(parents=True, exist_ok=True)
@@ -32,7 +87,7 @@ os.environ["SMARTINV_LOG_DIR"] = str(LOGS_DIR)
 
 os.environ["SMARTINV_MEDIA_DIR"] = str(MEDIA_DIR)
 
-os.environ["DEBUG"] = "true"
+os.environ["DEBUG"] = "true" if ARGS.mode == "dev" else "false"
 
 
 
@@ -58,10 +113,18 @@ MANAGE_PY = ROOT_DIR / "manage.py"
 # FUNCIONES DJANGO
 # ============================================================
 
+_DJANGO_READY = False
+
+
 def setup_django():
+    # django.setup() una sola vez por proceso
+    global _DJANGO_READY
+    if _DJANGO_READY:
+        return
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smart_inventory.settings")
     import django
     django.setup()
+    _DJANGO_READY = True
 
 
 def has_superuser():
@@ -73,6 +136,9 @@ def has_superuser():
 
 def has_pending_migrations():
     setup_django()
+    from django.db import connections
+    from django.db.migrations.executor import MigrationExecutor
+
     connection = connections["default"]
     executor = MigrationExecutor(connection)
     targets = executor.loader.graph.leaf_nodes()
@@ -80,10 +146,128 @@ def has_pending_migrations():
     return bool(plan)
 
 
-def django_cmd(args):
+def django_cmd(args, **options):
+    # call_command reutiliza el Django ya inicializado
+    # (execute_from_command_line volvería a llamar a django.setup())
     setup_django()
-    from django.core.management import execute_from_command_line
-    execute_from_command_line(["manage.py"] + args)
+    from django.core.management import call_command
+    call_command(*args, **options)
+
+
+# ============================================================
+# ARRANQUE RÁPIDO (stamp de migraciones/esquema)
+# ============================================================
+
+class PhaseTimer:
+    """Mide y acumula la duración de cada fase del arranque."""
+
+    def __init__(self):
+        self.phases = []
+
+    def __call__(self, name):
+        timer = self
+
+        class _Phase:
+            def __enter__(self):
+                self.t0 = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.phases.append((name, time.perf_counter() - self.t0))
+
+        return _Phase()
+
+    def report(self):
+        total = sum(d for _, d in self.phases)
+        parts = ", ".join(f"{name} {d * 1000:.0f} ms" for name, d in self.phases)
+        print(f"[launcher] arranque {total * 1000:.0f} ms ({parts})")
+
+
+def code_fingerprint():
+    """
+    Huella del conjunto de migraciones instaladas: nombres de los módulos
+    de migración de cada app (sin importarlos ni construir el grafo) y,
+    en el exe, la fecha/tamaño del propio ejecutable.
+    """
+    import importlib.util
+    import pkgutil
+    from django.apps import apps
+    from django.db.migrations.loader import MigrationLoader
+
+    h = hashlib.sha256()
+    if getattr(sys, "frozen", False):
+        st = os.stat(sys.executable)
+        h.update(f"exe:{st.st_mtime_ns}:{st.st_size}".encode())
+
+    for app_config in sorted(apps.get_app_configs(), key=lambda a: a.label):
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except ImportError:
+            spec = None
+        if spec is None or not spec.submodule_search_locations:
+            continue
+        names = sorted(
+            name
+            for _, name, is_pkg in pkgutil.iter_modules(spec.submodule_search_locations)
+            if not is_pkg and name[0] not in "_~"
+        )
+        h.update(f"{app_config.label}:{','.join(names)};".encode())
+    return h.hexdigest()
+
+
+def db_fingerprint():
+    """
+    Estado del esquema de la BD: ruta, PRAGMA schema_version (cambia con
+    cualquier DDL) y migraciones aplicadas. Son dos consultas triviales.
+    """
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("PRAGMA schema_version")
+            schema_version = cursor.fetchone()[0]
+        else:
+            schema_version = None
+        try:
+            cursor.execute("SELECT COUNT(*), MAX(id) FROM django_migrations")
+            applied = list(cursor.fetchone())
+        except Exception:
+            applied = None
+    return {
+        "db": str(connection.settings_dict["NAME"]),
+        "schema_version": schema_version,
+        "applied": applied,
+    }
+
+
+def read_stamp():
+    try:
+        return json.loads(STAMP_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_stamp(**data):
+    try:
+        STAMP_FILE.write_text(json.dumps(data), encoding="utf-8")
+    except OSError:
+        pass
+
+
+def report_import_profile():
+    # Incluye las URLs (vistas, DRF...), que Django carga en la 1ª petición
+    from django.conf import settings
+    from django.urls import get_resolver
+    get_resolver(settings.ROOT_URLCONF).url_patterns
+
+    IMPORT_PROFILER.uninstall()
+    report = IMPORT_PROFILER.report(top=30)
+    path = LOGS_DIR / "import_profile.txt"
+    path.write_text(report, encoding="utf-8")
+    print("\n".join(report.splitlines()[:15]))
+    print(f"[launcher] Perfil de importaciones completo en {path}")
 
 
 # ============================================================
@@ -91,36 +275,78 @@ def django_cmd(args):
 # ============================================================
 
 def main():
-    # 1️⃣ Migraciones (con backup previo)
-    if has_pending_migrations():
+    timer = PhaseTimer()
+
+    with timer("django.setup"):
+        setup_django()
+
+    # 1️⃣ Migraciones (con backup previo). Si la huella del código y de la
+    # BD coincide con la del último arranque, no se carga el grafo.
+    with timer("migraciones"):
+        stamp = read_stamp()
+        code_fp = code_fingerprint()
+        db_fp = db_fingerprint()
+        unchanged = stamp.get("code") == code_fp and stamp.get("db") == db_fp
+
+        if not unchanged and has_pending_migrations():
+            try:
+                from backup_db import backup_sqlite_db, rotate_backups
+                backup_sqlite_db(reason="pre_migrate", backup_dir=BACKUP_DIR, compress=True)
+                rotate_backups(BACKUP_DIR)
+            except Exception as e:
+                print(f"[launcher] No se pudo crear el backup previo a migrar: {e}")
+
+            django_cmd(["migrate"], interactive=False)
+            db_fp = db_fingerprint()
+
+    # 2️⃣ Crear superusuario si no existe (una vez creado, el stamp lo
+    # recuerda y no se vuelve a consultar mientras la BD no cambie)
+    superuser = unchanged and stamp.get("superuser", False)
+    with timer("superusuario"):
         try:
-            from backup_db import backup_sqlite_db
-            backup_sqlite_db(reason="pre_migrate", backup_dir=BACKUP_DIR)
+            if not superuser:
+                superuser = has_superuser()
+            if not superuser:
+                resp = input(
+                    "\nNo existe ningún administrador.\n"
+                    "¿Quieres crear uno ahora? (s/N): "
+                ).strip().lower()
+
+                if resp == "s":
+                    django_cmd(["createsuperuser"])
+                    superuser = has_superuser()
         except Exception:
             pass
 
-        django_cmd(["migrate", "--noinput"])
+    write_stamp(code=code_fp, db=db_fp, superuser=superuser)
+    timer.report()
 
-    # 2️⃣ Crear superusuario si no existe
-    try:
-        if not has_superuser():
-            resp = input(
-                "\nNo existe ningún administrador.\n"
-                "¿Quieres crear uno ahora? (s/N): "
-            ).strip().lower()
-
-            if resp == "s":
-                django_cmd(["createsuperuser"])
-    except Exception:
-        pass
+    if IMPORT_PROFILER:
+        report_import_profile()
 
     # 3️⃣ Arrancar servidor + abrir navegador
-    threading.Timer(
-        1.0,
-        lambda: webbrowser.open("http://127.0.0.1:8000")
-    ).start()
-
-    django_cmd(["runserver", "0.0.0.0:8000", "--noreload", "--insecure"])
+    if not ARGS.no_browser:
+        threading.Timer(
+            1.0,
+            lambda: webbrowser.open(f"http://127.0.0.1:{ARGS.port}")
+        ).start()
+
+    if ARGS.mode == "dev":
+        django_cmd(
+            ["runserver", f"{ARGS.host}:{ARGS.port}"],
+            use_reloader=False,
+            insecure_serving=True,
+        )
+        return
+
+    from smart_inventory.server import serve
+    serve(
+        host=ARGS.host,
+        port=ARGS.port,
+        threads=ARGS.threads,
+        backend=None if ARGS.server == "auto" else ARGS.server,
+        max_pending=ARGS.max_pending,
+    )
 
 
 if __name__ == "__main__":
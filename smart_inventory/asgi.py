@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_inventory.settings')
 
 application = get_asgi_application()
+
+# Límite por sentencia (PostgreSQL) solo al atender peticiones
+from inventory import db  # noqa: E402
+
+db.serve_requests()
@@ -0,0 +1,121 @@
+"""
+Perfil de tiempos de importación en el arranque.
+
+Equivalente a `python -X importtime`, pero funciona también dentro del exe
+de PyInstaller: un finder al principio de sys.meta_path envuelve el loader
+de cada módulo nuevo y mide cuánto tarda en ejecutarse (tiempo propio y
+acumulado, incluyendo los imports anidados).
+
+    profiler = ImportProfiler().install()
+    ...  # django.setup(), etc.
+    profiler.uninstall()
+    print(profiler.report(top=20))
+"""
+import sys
+import threading
+import time
+
+
+class _TimedLoader:
+    """Delega en el loader real y cronometra exec_module()."""
+
+    def __init__(self, loader, profiler, name):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit()
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.timings = {}  # nombre -> [propio, acumulado] (segundos)
+        self._stack = []
+        self._local = threading.local()
+        self._thread = threading.get_ident()
+
+    # --- Finder ---
+
+    def find_spec(self, fullname, path=None, target=None):
+        # Solo el hilo principal y sin recursión (los demás finders
+        # pueden importar a su vez)
+        if threading.get_ident() != self._thread or getattr(self._local, "busy", False):
+            return None
+        self._local.busy = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.busy = False
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        self.started = time.perf_counter()
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    # --- Cronometraje ---
+
+    def _enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        name, t0, children = self._stack.pop()
+        total = time.perf_counter() - t0
+        self.timings[name] = [total - children, total]
+        if self._stack:
+            self._stack[-1][2] += total
+
+    # --- Informe ---
+
+    def top(self, n=20, key="cumulative"):
+        idx = 1 if key == "cumulative" else 0
+        return sorted(self.timings.items(), key=lambda kv: kv[1][idx], reverse=True)[:n]
+
+    def by_package(self):
+        """Tiempo propio agregado por paquete de primer nivel."""
+        totals = {}
+        for name, (own, _) in self.timings.items():
+            root = name.split(".", 1)[0]
+            totals[root] = totals.get(root, 0.0) + own
+        return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+
+    def report(self, top=20):
+        lines = [
+            f"Importaciones: {len(self.timings)} módulos, "
+            f"{getattr(self, 'elapsed', 0) * 1000:.0f} ms en total",
+            "",
+            f"{'propio ms':>10} {'acum. ms':>10}  módulo",
+        ]
+        for name, (own, cum) in self.top(top):
+            lines.append(f"{own * 1000:10.1f} {cum * 1000:10.1f}  {name}")
+        lines += ["", "Por paquete (tiempo propio):"]
+        for root, own in self.by_package()[:top]:
+            lines.append(f"{own * 1000:10.1f}  {root}")
+        return "\n".join(lines)
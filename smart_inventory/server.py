@@ -0,0 +1,275 @@
+"""
+Servidor de producción para el lanzador (modo "serve").
+
+- Usa waitress si está instalado (opcional, Python puro, multi-hilo).
+- Si no, un WSGIServer de la librería estándar con un pool fijo de hilos
+  y una cola acotada: con `threads` peticiones en curso y `max_pending`
+  esperando, las conexiones nuevas reciben 503 con Retry-After en lugar
+  de acumularse sin límite en memoria.
+- Los estáticos y media se sirven desde un middleware WSGI con
+  Cache-Control, ETag/Last-Modified y respuestas 304, sin pasar por Django
+  y con DEBUG desactivado.
+"""
+import mimetypes
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from urllib.parse import unquote
+
+from django.conf import settings
+
+DEFAULT_THREADS = 16
+DEFAULT_MAX_PENDING = 64
+RETRY_AFTER_SECONDS = 2
+BLOCK_SIZE = 64 * 1024
+
+
+# =========================
+#  Estáticos y media
+# =========================
+
+def _safe_join(root, rel_path):
+    """Ruta absoluta dentro de `root` o None (evita '..' y rutas absolutas)."""
+    rel_path = posixpath.normpath(unquote(rel_path)).lstrip("/")
+    if rel_path.startswith("..") or not rel_path or rel_path == ".":
+        return None
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, *rel_path.split("/")))
+    if full != root and not full.startswith(root + os.sep):
+        return None
+    return full
+
+
+@lru_cache(maxsize=4096)
+def find_static(rel_path):
+    """
+    Busca un estático en STATIC_ROOT (collectstatic) y, si no existe,
+    con los finders de staticfiles (static/ del proyecto, admin, DRF...).
+    Los estáticos no cambian mientras corre el servidor: se cachea.
+    """
+    if settings.STATIC_ROOT:
+        full = _safe_join(settings.STATIC_ROOT, rel_path)
+        if full and os.path.isfile(full):
+            return full
+
+    from django.contrib.staticfiles import finders
+
+    rel_path = posixpath.normpath(unquote(rel_path)).lstrip("/")
+    if rel_path.startswith(".."):
+        return None
+    found = finders.find(rel_path)
+    return found if isinstance(found, str) else None
+
+
+def find_media(rel_path):
+    full = _safe_join(settings.MEDIA_ROOT, rel_path)
+    return full if full and os.path.isfile(full) else None
+
+
+class StaticFilesApp:
+    """
+    Middleware WSGI: responde /static/ y /media/ directamente y delega
+    el resto en la aplicación Django.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.mounts = [
+            (settings.STATIC_URL, find_static, settings.STATIC_CACHE_CONTROL),
+            (settings.MEDIA_URL, find_media, settings.MEDIA_CACHE_CONTROL),
+        ]
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        for prefix, finder, cache_control in self.mounts:
+            if prefix and path.startswith(prefix):
+                full = finder(path[len(prefix):])
+                if full is None:
+                    break
+                return self.serve(full, cache_control, environ, start_response)
+        return self.app(environ, start_response)
+
+    def serve(self, full, cache_control, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        if method not in ("GET", "HEAD"):
+            start_response("405 Method Not Allowed", [("Allow", "GET, HEAD")])
+            return [b""]
+
+        try:
+            st = os.stat(full)
+        except OSError:
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Not Found"]
+
+        etag = f'"{int(st.st_mtime):x}-{st.st_size:x}"'
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+        headers = [
+            ("Cache-Control", cache_control),
+            ("ETag", etag),
+            ("Last-Modified", last_modified),
+        ]
+
+        if self._not_modified(environ, etag, int(st.st_mtime)):
+            start_response("304 Not Modified", headers)
+            return [b""]
+
+        content_type, encoding = mimetypes.guess_type(full)
+        headers += [
+            ("Content-Type", content_type or "application/octet-stream"),
+            ("Content-Length", str(st.st_size)),
+        ]
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+
+        start_response("200 OK", headers)
+        if method == "HEAD":
+            return [b""]
+
+        f = open(full, "rb")
+        wrapper = environ.get("wsgi.file_wrapper")
+        if wrapper:
+            return wrapper(f, BLOCK_SIZE)
+        return iter(lambda: f.read(BLOCK_SIZE), b"")
+
+    @staticmethod
+    def _not_modified(environ, etag, mtime):
+        inm = environ.get("HTTP_IF_NONE_MATCH")
+        if inm:
+            return etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"
+        ims = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if ims:
+            try:
+                return mtime <= parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def get_application():
+    from smart_inventory.wsgi import application
+
+    return StaticFilesApp(application)
+
+
+# =========================
+#  Servidor
+# =========================
+
+def _pooled_server_class(threads, max_pending=DEFAULT_MAX_PENDING):
+    from django.core.servers.basehttp import WSGIServer
+
+    body = "Servidor saturado.\n".encode("utf-8")
+    busy_response = (
+        "HTTP/1.1 503 Service Unavailable\r\n"
+        f"Retry-After: {RETRY_AFTER_SECONDS}\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    ).encode("ascii") + body
+
+    class PooledWSGIServer(WSGIServer):
+        """
+        WSGIServer de Django atendiendo cada petición en un pool fijo de
+        hilos (ThreadingMixIn crea un hilo por conexión, sin límite).
+        Cada respuesta cierra la conexión, así un cliente no retiene un hilo.
+
+        La cola del pool está acotada con un semáforo de threads +
+        max_pending plazas: sin plaza libre, la conexión recibe un 503 y se
+        cierra desde el hilo que acepta, sin llegar al pool.
+        """
+
+        request_queue_size = 128
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+            self.slots = threading.BoundedSemaphore(threads + max_pending)
+
+        def process_request(self, request, client_address):
+            if not self.slots.acquire(blocking=False):
+                self._reject(request)
+                return
+            try:
+                self.pool.submit(self._process, request, client_address)
+            except RuntimeError:
+                # Pool ya cerrado (server_close)
+                self.slots.release()
+                self.shutdown_request(request)
+
+        def _process(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self.slots.release()
+
+        def _reject(self, request):
+            try:
+                request.settimeout(1)
+                request.sendall(busy_response)
+            except OSError:
+                pass
+            finally:
+                self.shutdown_request(request)
+
+        def server_close(self):
+            super().server_close()
+            self.pool.shutdown(wait=False)
+
+    return PooledWSGIServer
+
+
+def serve(
+    host="0.0.0.0",
+    port=8000,
+    threads=DEFAULT_THREADS,
+    backend=None,
+    max_pending=DEFAULT_MAX_PENDING,
+):
+    """
+    Arranca el servidor (bloqueante). `backend`: "waitress", "stdlib" o
+    None (waitress si está disponible). `max_pending`: conexiones que
+    pueden esperar a un hilo libre (en waitress, connection_limit es
+    threads + max_pending).
+    """
+    app = get_application()
+
+    if backend in (None, "waitress"):
+        try:
+            import waitress
+        except ImportError:
+            if backend == "waitress":
+                raise
+        else:
+            print(f"[serve] waitress en http://{host}:{port} ({threads} hilos)")
+            waitress.serve(
+                app,
+                host=host,
+                port=port,
+                threads=threads,
+                connection_limit=threads + max_pending,
+            )
+            return
+
+    from django.core.servers.basehttp import WSGIRequestHandler
+
+    server_cls = _pooled_server_class(threads, max_pending)
+    httpd = server_cls((host, port), WSGIRequestHandler, ipv6=":" in host)
+    httpd.set_app(app)
+    print(
+        f"[serve] servidor WSGI en http://{host}:{port} "
+        f"({threads} hilos, {max_pending} en espera como máximo)"
+    )
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
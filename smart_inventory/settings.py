@@ -59,6 +59,32 @@ LOGGING = {
             "class": "logging.FileHandler",
             "filename": LOG_DIR / "django_errors.log",
         },
+        "queries": {
+            "level": "WARNING",
+            "class": "logging.FileHandler",
+            "filename": LOG_DIR / "queries.log",
+            "delay": True,
+        },
+        # Una línea JSON por consulta lenta (inventory/slowlog.py)
+        "slow_queries": {
+            "level": "WARNING",
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOG_DIR / "slow_queries.log",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "encoding": "utf-8",
+            "delay": True,
+        },
+        # Una línea JSON por petición perfilada (inventory/profiling.py)
+        "profiling": {
+            "level": "INFO",
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOG_DIR / "profiling.log",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "encoding": "utf-8",
+            "delay": True,
+        },
     },
     "loggers": {
         "django": {
@@ -66,6 +92,23 @@ LOGGING = {
             "level": "ERROR",
             "propagate": True,
         },
+        # Presupuestos de consultas superados (inventory/querycount.py)
+        "inventory.queries": {
+            "handlers": ["queries"],
+            "level": "WARNING",
+            "propagate": True,
+        },
+        # Leído por `manage.py slow_query_report`
+        "inventory.slowqueries": {
+            "handlers": ["slow_queries"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+        "inventory.profiling": {
+            "handlers": ["profiling"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -86,16 +129,29 @@ INSTALLED_APPS = [
     # 3rd party
     "rest_framework",
     "corsheaders",
-    "django_extensions",   # útil en dev (runserver_plus, etc.)
 
     # Local
     "inventory",
 ]
 
+# Apps solo de desarrollo: no se cargan con DEBUG desactivado (modo serve
+# del lanzador) ni se empaquetan en el exe (ver SmartInventory.spec).
+DEV_APPS = ["django_extensions"]   # útil en dev (runserver_plus, etc.)
+
+if DEBUG:
+    import importlib.util
+
+    INSTALLED_APPS += [app for app in DEV_APPS if importlib.util.find_spec(app)]
+
 # ---------------------------------------------------------------------
 # Middleware
 # ---------------------------------------------------------------------
 MIDDLEWARE = [
+    "inventory.profiling.ProfilingMiddleware",     # solo con PROFILING=on
+    "inventory.querycount.QueryCountMiddleware",   # cuenta también sesión y usuario
+    "inventory.metrics.MetricsMiddleware",         # /metrics: peticiones y latencias
+    "inventory.slowlog.SlowQueryMiddleware",       # vista de cada consulta lenta
+    "inventory.replicas.ReplicaMiddleware",        # lectura de lo escrito con réplica
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",      # CORS antes de CommonMiddleware
@@ -144,6 +200,221 @@ DATABASES = {
     )
 }
 
+# --- Perfil SQLite (WAL + BEGIN IMMEDIATE) ---
+# Los PRAGMA se aplican en cada conexión nueva (inventory/db.py).
+# SQLITE_PROFILE=off vuelve al comportamiento por defecto de SQLite.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "on").lower() not in ("off", "0", "false")
+SQLITE_BUSY_TIMEOUT_MS = env.int("SQLITE_BUSY_TIMEOUT_MS", default=5000)
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    # Negativo = KiB (por defecto 64 MiB de caché de páginas)
+    "cache_size": -env.int("SQLITE_CACHE_SIZE_KIB", default=65536),
+    "mmap_size": env.int("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+} if SQLITE_PROFILE else {}
+
+if SQLITE_PROFILE and DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES["default"].setdefault("OPTIONS", {}).update(
+        {
+            # BEGIN IMMEDIATE: la transacción toma el lock de escritura al
+            # empezar, en vez de fallar al pasar de lectura a escritura.
+            "transaction_mode": os.getenv("SQLITE_TRANSACTION_MODE", "IMMEDIATE"),
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    )
+
+# --- Perfil PostgreSQL (conexiones persistentes o pool de psycopg 3) ---
+# Sin pool, cada hilo del servidor reutiliza su conexión durante
+# DB_CONN_MAX_AGE segundos y la comprueba antes de usarla tras un error o
+# un corte (CONN_HEALTH_CHECKS). Con POSTGRES_POOL=on las conexiones salen
+# de un pool de psycopg (pip install "psycopg[pool]"); POSTGRES_POOL_MAX_SIZE
+# debería cubrir los hilos del servidor (SMARTINV_THREADS).
+# .iterator() usa cursores de servidor (exportación CSV, rollups...), salvo
+# detrás de PgBouncer en modo transacción: POSTGRES_PGBOUNCER=on.
+# POSTGRES_STATEMENT_TIMEOUT_MS solo limita las conexiones que atienden
+# peticiones (WSGI/ASGI, ver inventory/db.py): migrate,
+# merge_product_duplicates, refresh_forecasts, backfills... van sin límite.
+# Comparativa: python -m benchmarks.pg_pooling --database-url postgres://...
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    _pg_options = DATABASES["default"].setdefault("OPTIONS", {})
+    _pg_options.setdefault("connect_timeout", env.int("POSTGRES_CONNECT_TIMEOUT", default=5))
+    _pg_options.setdefault("application_name", "smart-inventory")
+    POSTGRES_STATEMENT_TIMEOUT_MS = env.int("POSTGRES_STATEMENT_TIMEOUT_MS", default=30000)
+
+    # Con pool, Django comprueba cada conexión al sacarla (check_connection)
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    POSTGRES_POOL = env.bool("POSTGRES_POOL", default=False)
+    if POSTGRES_POOL:
+        # El pool reparte las conexiones: Django no debe retenerlas
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        _pg_options["pool"] = {
+            "min_size": env.int("POSTGRES_POOL_MIN_SIZE", default=2),
+            "max_size": env.int("POSTGRES_POOL_MAX_SIZE", default=20),
+            # Espera máxima por una conexión libre antes de fallar
+            "timeout": env.float("POSTGRES_POOL_TIMEOUT", default=10.0),
+            "max_idle": env.float("POSTGRES_POOL_MAX_IDLE", default=300.0),
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=600)
+
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = env.bool("POSTGRES_PGBOUNCER", default=False)
+
+# --- Réplica de lectura (inventory/replicas.py) ---
+# AUD, AUDTOTAL, búsqueda, árbol, listados, informes, analítica y
+# exportaciones leen del alias "replica":
+# - DATABASE_REPLICA_URL: réplica de la BD principal (p. ej. PostgreSQL en
+#   streaming), con el mismo perfil de conexión que la principal.
+# - Sin ella, con SQLite: una segunda conexión de solo lectura (query_only)
+#   al mismo fichero. SQLITE_READ_CONNECTION=off la desactiva.
+# Tras escribir, el cliente lee de la principal durante
+# DATABASE_REPLICA_PIN_SECONDS (cookie); la conexión SQLite no tiene retraso.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+SQLITE_READ_CONNECTION = env.bool("SQLITE_READ_CONNECTION", default=True)
+
+if DATABASE_REPLICA_URL:
+    _replica = dj_database_url.parse(DATABASE_REPLICA_URL)
+    if _replica["ENGINE"] == DATABASES["default"]["ENGINE"]:
+        for _key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "DISABLE_SERVER_SIDE_CURSORS"):
+            if _key in DATABASES["default"]:
+                _replica[_key] = DATABASES["default"][_key]
+        _replica["OPTIONS"] = {**DATABASES["default"].get("OPTIONS", {}), **_replica.get("OPTIONS", {})}
+        if "pool" in _replica["OPTIONS"]:
+            _replica["OPTIONS"]["pool"] = dict(_replica["OPTIONS"]["pool"])
+    DATABASES["replica"] = {**_replica, "READ_ONLY": True, "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICA_PIN_SECONDS = env.int("DATABASE_REPLICA_PIN_SECONDS", default=15)
+elif (
+    SQLITE_READ_CONNECTION
+    and DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+    and ":memory:" not in str(DATABASES["default"]["NAME"])
+):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        # Lectores en modo DEFERRED: no toman el lock de escritura
+        "OPTIONS": {
+            key: value
+            for key, value in DATABASES["default"].get("OPTIONS", {}).items()
+            if key != "transaction_mode"
+        },
+        "READ_ONLY": True,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICA_PIN_SECONDS = env.int("DATABASE_REPLICA_PIN_SECONDS", default=0)
+else:
+    DATABASE_REPLICA_PIN_SECONDS = 0
+
+# PRAGMA de la conexión de lectura SQLite (inventory/db.py)
+SQLITE_READ_PRAGMAS = {
+    **{
+        name: value
+        for name, value in SQLITE_PRAGMAS.items()
+        if name not in ("journal_mode", "synchronous")
+    },
+    "query_only": 1,
+}
+
+DATABASE_ROUTERS = ["inventory.replicas.ReplicaRouter"]
+
+# --- Escritor único para los escaneos (inventory/writer.py) ---
+# Las entradas/salidas se aplican en un hilo escritor con group commit.
+# Por defecto solo con SQLite (un único escritor por BD).
+SCAN_WRITER = os.getenv(
+    "SCAN_WRITER",
+    "on" if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3" else "off",
+).lower() in ("on", "1", "true")
+SCAN_WRITER_GROUP_SIZE = env.int("SCAN_WRITER_GROUP_SIZE", default=32)
+SCAN_WRITER_GROUP_WAIT_MS = env.int("SCAN_WRITER_GROUP_WAIT_MS", default=2)
+SCAN_WRITER_MAX_PENDING = env.int("SCAN_WRITER_MAX_PENDING", default=256)
+SCAN_WRITER_TIMEOUT = env.int("SCAN_WRITER_TIMEOUT", default=60)
+
+# Respuestas guardadas por Idempotency-Key en /api/scan/ (inventory/idempotency.py)
+IDEMPOTENCY_TTL_HOURS = env.int("IDEMPOTENCY_TTL_HOURS", default=24)
+IDEMPOTENCY_PURGE_INTERVAL = env.int("IDEMPOTENCY_PURGE_INTERVAL", default=3600)
+
+# Sincronización incremental del catálogo, /api/catalog/sync/ (inventory/catalog.py)
+CATALOG_SYNC_OVERLAP_SECONDS = env.int("CATALOG_SYNC_OVERLAP_SECONDS", default=30)
+CATALOG_TOMBSTONE_TTL_DAYS = env.int("CATALOG_TOMBSTONE_TTL_DAYS", default=30)
+CATALOG_TOMBSTONE_PURGE_INTERVAL = env.int("CATALOG_TOMBSTONE_PURGE_INTERVAL", default=3600)
+
+# Cabeceras X-Query-* y aviso de presupuesto superado (inventory/querycount.py)
+QUERY_COUNT_HEADERS = env.bool("QUERY_COUNT_HEADERS", default=DEBUG)
+
+# Perfilado por petición en logs/profiling.log (inventory/profiling.py)
+PROFILING = env.bool("PROFILING", default=False)
+PROFILING_SAMPLE_RATE = env.float("PROFILING_SAMPLE_RATE", default=1.0)
+# Fracción de peticiones bajo cProfile; se guardan las que superan PROFILING_SLOW_MS
+PROFILING_CPROFILE_RATE = env.float("PROFILING_CPROFILE_RATE", default=0.0)
+PROFILING_SLOW_MS = env.int("PROFILING_SLOW_MS", default=500)
+PROFILING_MAX_DUMPS = env.int("PROFILING_MAX_DUMPS", default=20)
+PROFILING_DIR = LOG_DIR / "profiles"
+
+# Consultas lentas con su EXPLAIN en logs/slow_queries.log (inventory/slowlog.py)
+# 0 desactiva el registro
+SLOW_QUERY_MS = env.int("SLOW_QUERY_MS", default=200)
+SLOW_QUERY_EXPLAIN = env.bool("SLOW_QUERY_EXPLAIN", default=True)
+SLOW_QUERY_EXPLAIN_TTL = env.int("SLOW_QUERY_EXPLAIN_TTL", default=300)
+
+# Métricas de Prometheus en /metrics (inventory/metrics.py)
+METRICS = env.bool("METRICS", default=True)
+# Acceso (inventory/views.py): staff, "Authorization: Bearer <METRICS_TOKEN>"
+# o las IP de METRICS_ALLOWED_IPS. Las IP no valen para las peticiones con
+# cabeceras de proxy (X-Forwarded-For, X-Real-IP, Forwarded): detrás de un
+# proxy en la misma máquina todas llegan desde 127.0.0.1. Si el proxy no
+# añade ninguna, dejar METRICS_ALLOWED_IPS vacío y usar el token.
+METRICS_ALLOWED_IPS = env.list("METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"])
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+# Con varios procesos: cada uno vuelca aquí sus métricas y /metrics las suma
+METRICS_DIR = env.str("METRICS_DIR", default="") or None
+METRICS_FLUSH_SECONDS = env.float("METRICS_FLUSH_SECONDS", default=5.0)
+
+# ---------------------------------------------------------------------
+# Caché de lecturas por tenant (inventory/tenant_cache.py)
+# ---------------------------------------------------------------------
+# Árbol, búsqueda rápida, AUD, AUDTOTAL y valoración. Se invalida por
+# versión del tenant al escribir ubicaciones, productos o lotes.
+# CACHE_BACKEND:
+# - locmem: en memoria, por proceso (servidor del lanzador, un proceso)
+# - file: ficheros en CACHE_DIR, compartida entre procesos
+# - redis: CACHE_REDIS_URL (pip install redis), compartida entre máquinas
+# - dummy: sin caché (p. ej. para medir con benchmarks.api_bench)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem").lower()
+CACHE_TIMEOUT = env.int("CACHE_TIMEOUT", default=300)
+CACHE_DIR = Path(os.environ.get("SMARTINV_CACHE_DIR", BASE_DIR / "cache"))
+
+_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "smart-inventory",
+        "OPTIONS": {"MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", default=1000)},
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(CACHE_DIR),
+        "OPTIONS": {"MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", default=1000)},
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+    "dummy": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+if CACHE_BACKEND not in _CACHE_BACKENDS:
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured(
+        f"CACHE_BACKEND={CACHE_BACKEND!r}: usa {', '.join(_CACHE_BACKENDS)}"
+    )
+
+CACHES = {
+    "default": {
+        **_CACHE_BACKENDS[CACHE_BACKEND],
+        "TIMEOUT": CACHE_TIMEOUT,
+        "KEY_PREFIX": "smartinv",
+    }
+}
+
 # ---------------------------------------------------------------------
 # Internacionalización
 # ---------------------------------------------------------------------
@@ -168,6 +439,11 @@ else:
     # Contexto build / dev (PyInstaller importa settings)
     MEDIA_ROOT = BASE_DIR / "media"
 
+# Cabeceras de caché cuando el lanzador sirve estáticos/media (modo serve,
+# ver smart_inventory/server.py). Los estáticos no llevan hash en el nombre.
+STATIC_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "public, max-age=86400")
+MEDIA_CACHE_CONTROL = os.getenv("MEDIA_CACHE_CONTROL", "private, max-age=3600")
+
 # ---------------------------------------------------------------------
 # DRF
 # ---------------------------------------------------------------------
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_inventory.settings')
 
 application = get_wsgi_application()
+
+# Límite por sentencia (PostgreSQL) solo al atender peticiones
+from inventory import db  # noqa: E402
+
+db.serve_requests()
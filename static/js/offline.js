@@ -0,0 +1,321 @@
+/*
+ * Smart Inventory — modo sin conexión (IndexedDB).
+ *
+ * Lo usan la página de escaneo y el service worker (importScripts):
+ *
+ * - Cola de escaneos IN/OUT hechos sin red. Cada operación lleva su
+ *   idempotency_key y se envía, en orden y por lotes, a /api/scan/bulk/.
+ *   Las aplicadas y las rechazadas (conflictos) salen de la cola; los
+ *   conflictos se guardan para mostrarlos. Las "retry" se quedan.
+ * - Copia local del catálogo (productos, ubicaciones, categorías y
+ *   unidades), actualizada de forma incremental con /api/catalog/sync/,
+ *   para buscar productos sin conexión.
+ *
+ * Las operaciones se guardan con el usuario que las hizo y solo se
+ * sincronizan con la sesión de ese usuario.
+ */
+(function (global) {
+  'use strict';
+
+  const DB_NAME = 'smart-inventory-offline';
+  const DB_VERSION = 1;
+  const API_BULK = '/api/scan/bulk/';
+  const API_CATALOG_SYNC = '/api/catalog/sync/';
+  const BATCH_SIZE = 200;
+  // Intentos con error del servidor antes de dar una operación por conflicto
+  const MAX_ATTEMPTS = 5;
+  const SYNC_TAG = 'scan-queue';
+
+  // =========================
+  //  IndexedDB
+  // =========================
+
+  let dbPromise = null;
+
+  function openDB() {
+    if (dbPromise) return dbPromise;
+    dbPromise = new Promise((resolve, reject) => {
+      const req = indexedDB.open(DB_NAME, DB_VERSION);
+      req.onupgradeneeded = () => {
+        const db = req.result;
+        db.createObjectStore('queue', { keyPath: 'seq', autoIncrement: true });
+        db.createObjectStore('conflicts', { keyPath: 'key' });
+        db.createObjectStore('products', { keyPath: 'id' });
+        db.createObjectStore('locations', { keyPath: 'id' });
+        db.createObjectStore('meta', { keyPath: 'name' });
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => { dbPromise = null; reject(req.error); };
+    });
+    return dbPromise;
+  }
+
+  function done(req) {
+    return new Promise((resolve, reject) => {
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  async function withStores(names, mode, fn) {
+    const db = await openDB();
+    const tx = db.transaction(names, mode);
+    const complete = new Promise((resolve, reject) => {
+      tx.oncomplete = resolve;
+      tx.onerror = () => reject(tx.error);
+      tx.onabort = () => reject(tx.error);
+    });
+    const result = await fn(...names.map(n => tx.objectStore(n)));
+    await complete;
+    return result;
+  }
+
+  async function getMeta(name) {
+    const row = await withStores(['meta'], 'readonly', s => done(s.get(name)));
+    return row ? row.value : undefined;
+  }
+
+  function setMeta(name, value) {
+    return withStores(['meta'], 'readwrite', s => done(s.put({ name, value })));
+  }
+
+  // Datos de la sesión que necesita el service worker para sincronizar
+  async function setSession({ user, csrftoken }) {
+    const previous = await getMeta('user');
+    if (previous !== undefined && previous !== (user || '')) {
+      // Otro usuario (otro tenant): el catálogo local se vuelve a descargar entero
+      await setMeta('catalog_watermark', null);
+    }
+    await setMeta('user', user || '');
+    if (csrftoken) await setMeta('csrftoken', csrftoken);
+  }
+
+  // =========================
+  //  Cola de escaneos
+  // =========================
+
+  async function enqueue(op) {
+    const user = (await getMeta('user')) || '';
+    const item = {
+      user,
+      op,
+      queued_at: new Date().toISOString(),
+      attempts: 0,
+    };
+    await withStores(['queue'], 'readwrite', s => done(s.add(item)));
+    await requestBackgroundSync();
+    return item;
+  }
+
+  async function queued(user) {
+    const items = await withStores(['queue'], 'readonly', s => done(s.getAll()));
+    return user === undefined ? items : items.filter(i => i.user === user);
+  }
+
+  async function pendingCount() {
+    const user = (await getMeta('user')) || '';
+    return (await queued(user)).length;
+  }
+
+  function conflicts() {
+    return withStores(['conflicts'], 'readonly', s => done(s.getAll()));
+  }
+
+  function dismissConflict(key) {
+    return withStores(['conflicts'], 'readwrite', s => done(s.delete(key)));
+  }
+
+  async function requestBackgroundSync() {
+    try {
+      const reg = global.registration ||
+        (global.navigator?.serviceWorker && await global.navigator.serviceWorker.getRegistration());
+      if (reg && reg.sync) await reg.sync.register(SYNC_TAG);
+    } catch (_e) {
+      // Sin Background Sync: se sincroniza al volver la conexión o al abrir la página
+    }
+  }
+
+  let syncing = null;
+
+  // Envía la cola en orden; devuelve { applied, conflict, pending }
+  function sync() {
+    if (!syncing) {
+      syncing = doSync().finally(() => { syncing = null; });
+    }
+    return syncing;
+  }
+
+  async function doSync() {
+    const user = (await getMeta('user')) || '';
+    const csrftoken = (await getMeta('csrftoken')) || '';
+    const totals = { applied: 0, conflict: 0, pending: 0 };
+
+    for (;;) {
+      const batch = (await queued(user)).slice(0, BATCH_SIZE);
+      if (!batch.length) break;
+
+      let res;
+      try {
+        res = await fetch(API_BULK, {
+          method: 'POST',
+          credentials: 'same-origin',
+          headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrftoken },
+          body: JSON.stringify({ operations: batch.map(i => i.op) }),
+        });
+      } catch (_e) {
+        break;  // sin red: se reintenta más tarde
+      }
+      if (!res.ok) break;  // sesión caducada, servidor ocupado...
+
+      const data = await res.json();
+      let retry = false;
+
+      await withStores(['queue', 'conflicts'], 'readwrite', (queue, conflictStore) => {
+        data.results.forEach((r, i) => {
+          const item = batch[i];
+          if (r.result === 'applied') {
+            totals.applied++;
+            queue.delete(item.seq);
+            return;
+          }
+          if (r.result === 'retry') {
+            retry = true;
+            if (r.status === null) return;  // no se llegó a intentar
+            item.attempts++;
+            if (item.attempts < MAX_ATTEMPTS) {
+              queue.put(item);
+              return;
+            }
+          }
+          totals.conflict++;
+          queue.delete(item.seq);
+          conflictStore.put({
+            key: item.op.idempotency_key || `seq-${item.seq}`,
+            op: item.op,
+            queued_at: item.queued_at,
+            status: r.status,
+            response: r.response,
+            failed_at: new Date().toISOString(),
+          });
+        });
+      });
+
+      if (retry) break;
+    }
+
+    totals.pending = (await queued(user)).length;
+    return totals;
+  }
+
+  // =========================
+  //  Catálogo local
+  // =========================
+
+  function normalize(text) {
+    return String(text || '')
+      .normalize('NFD')
+      .replace(/[\u0300-\u036f]/g, '')
+      .toLowerCase();
+  }
+
+  // Rutas 'Casa > Cocina > Estante' a partir de filas (id, parent_id, name)
+  function locationPaths(rows) {
+    const byId = new Map(rows.map(l => [l.id, l]));
+    const paths = new Map();
+    const pathOf = id => {
+      if (paths.has(id)) return paths.get(id);
+      const names = [];
+      const seen = new Set();
+      for (let l = byId.get(id); l && !seen.has(l.id); l = byId.get(l.parent_id)) {
+        seen.add(l.id);
+        names.push(l.name);
+      }
+      const path = names.reverse().join(' > ');
+      paths.set(id, path);
+      return path;
+    };
+    rows.forEach(l => pathOf(l.id));
+    return paths;
+  }
+
+  // Sincroniza la copia local con /api/catalog/sync/ (solo los cambios
+  // desde la última marca de agua; la primera vez, todo)
+  async function refreshCatalog() {
+    const since = await getMeta('catalog_watermark');
+    const url = since ? `${API_CATALOG_SYNC}?since=${encodeURIComponent(since)}` : API_CATALOG_SYNC;
+    const res = await fetch(url, { credentials: 'same-origin', cache: 'no-store' });
+    if (!res.ok) throw new Error('catalog_unavailable');
+    const data = await res.json();
+
+    await withStores(['products', 'locations', 'meta'], 'readwrite', (productStore, locationStore, meta) => {
+      if (data.full) {
+        productStore.clear();
+        locationStore.clear();
+      }
+      data.locations.upserts.forEach(l => locationStore.put(l));
+      data.locations.deleted.forEach(id => locationStore.delete(Number(id)));
+      data.products.upserts.forEach(p => productStore.put({
+        ...p,
+        search: normalize(`${p.name} ${p.sku || ''}`),
+      }));
+      data.products.deleted.forEach(id => productStore.delete(id));
+      if (data.categories) meta.put({ name: 'categories', value: data.categories });
+      if (data.units) meta.put({ name: 'units', value: data.units });
+      meta.put({ name: 'catalog_watermark', value: data.watermark });
+    });
+    return {
+      full: data.full,
+      products: data.products.upserts.length,
+      locations: data.locations.upserts.length,
+      deleted: data.products.deleted.length + data.locations.deleted.length,
+    };
+  }
+
+  // Misma forma de resultado que /api/products/search/
+  async function searchProducts(q, limit = 20) {
+    const needle = normalize(q).trim();
+    if (!needle) return [];
+    const [products, locationRows] = await withStores(['products', 'locations'], 'readonly',
+      (productStore, locationStore) => Promise.all([done(productStore.getAll()), done(locationStore.getAll())]));
+    const paths = locationPaths(locationRows);
+    return products
+      .filter(p => p.search.includes(needle))
+      .sort((a, b) => a.name.localeCompare(b.name))
+      .slice(0, limit)
+      .map(p => ({
+        id: p.id,
+        name: p.name,
+        sku: p.sku,
+        payload: p.qr_payload || `PRD:${p.id}`,
+        category: p.category,
+        location: p.location_id ? (paths.get(p.location_id) || null) : null,
+      }));
+  }
+
+  async function locations() {
+    const rows = await withStores(['locations'], 'readonly', s => done(s.getAll()));
+    const paths = locationPaths(rows);
+    return rows.map(l => ({ ...l, path: paths.get(l.id) }));
+  }
+
+  async function vocabulary() {
+    return {
+      categories: (await getMeta('categories')) || [],
+      units: (await getMeta('units')) || [],
+    };
+  }
+
+  global.SmartOffline = {
+    SYNC_TAG,
+    setSession,
+    enqueue,
+    pendingCount,
+    conflicts,
+    dismissConflict,
+    sync,
+    refreshCatalog,
+    searchProducts,
+    locations,
+    vocabulary,
+  };
+})(self);